@@ -1,28 +1,52 @@
-from .mind import CLEAN, CMD, DEFAULT_DB, Epoch, MEMORY, Mind, Order, \
-    PAGE_SIZE, Phase, QueryStuff, QueryTags, Stuff, add_content, do_add, \
-    do_forget, do_history, do_list, do_show, do_tick, setup_logging, \
-    update_state
+from .mind import CLEAN, CMD, Checker, DEFAULT_DB, DURABLE, Epoch, MEMORY, \
+    Mind, Order, PAGE_SIZE, PROFILES, Phase, QuerySearch, QueryStuff, \
+    QueryTagCounts, QueryTags, Stuff, Write, Writer, add_content, add_many, \
+    commit_writes, do_add, do_archive, do_check, do_forget, do_history, \
+    do_list, do_proof, do_rehash, do_root, do_search, do_show, do_tags, \
+    do_tick, do_verify, from_cursor, load_stuff, setup_logging, spawn_check, \
+    to_cursor, update_state
 
 __all__ = [
     "CLEAN",
     "CMD",
+    "Checker",
     "DEFAULT_DB",
+    "DURABLE",
     "Epoch",
     "MEMORY",
     "Mind",
     "Order",
     "PAGE_SIZE",
+    "PROFILES",
     "Phase",
+    "QuerySearch",
     "QueryStuff",
+    "QueryTagCounts",
     "QueryTags",
     "Stuff",
+    "Write",
+    "Writer",
     "add_content",
+    "add_many",
+    "commit_writes",
     "do_add",
+    "do_archive",
+    "do_check",
     "do_forget",
     "do_history",
     "do_list",
+    "do_proof",
+    "do_rehash",
+    "do_root",
+    "do_search",
     "do_show",
+    "do_tags",
     "do_tick",
+    "do_verify",
+    "from_cursor",
+    "load_stuff",
     "setup_logging",
+    "spawn_check",
+    "to_cursor",
     "update_state",
 ]
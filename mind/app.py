@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 import os
 import secrets
+import threading
 from contextlib import closing
 from dataclasses import dataclass
 from sqlite3 import IntegrityError, Connection
@@ -9,7 +10,7 @@ import sqlite3
 # type: ignore
 from flask_login import login_user, LoginManager, UserMixin, \
     login_required, logout_user, current_user, encode_cookie, decode_cookie
-from flask import Flask, jsonify, request, Response, send_file, \
+from flask import Flask, g, jsonify, request, Response, send_file, \
     render_template, redirect  # type: ignore
 from typing import Optional
 
@@ -19,9 +20,10 @@ from werkzeug.security import generate_password_hash, check_password_hash
 
 import json
 
-from mind import DEFAULT_DB, Epoch, QueryStuff, MEMORY, Mind, Order, \
-    PAGE_SIZE, Phase, add_content, setup_logging, update_state, Stuff, \
-    QueryTags
+from mind import DEFAULT_DB, DURABLE, Epoch, QueryStuff, MEMORY, Mind, Order, \
+    PAGE_SIZE, Phase, setup_logging, QuerySearch, \
+    QueryTagCounts, QueryTags, from_cursor, Checker, Write, Writer, \
+    commit_writes, load_stuff
 
 
 def create_app():
@@ -30,18 +32,33 @@ def create_app():
 
 app = create_app()
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key')
+app.config['MIND_PROFILE'] = os.environ.get('MIND_PROFILE', DURABLE)
+# Verify after responding rather than before, see Checker.
+app.config['MIND_BACKGROUND'] = os.environ.get('MIND_BACKGROUND') == '1'
+app.config['MIND_CHECK_INTERVAL'] = float(
+    os.environ.get('MIND_CHECK_INTERVAL', 3600))
+# Adds and ticks are committed in groups by one thread, see Writer.
+app.config['MIND_WRITER'] = os.environ.get('MIND_WRITER', '1') == '1'
+app.config['MIND_WRITE_TIMEOUT'] = float(
+    os.environ.get('MIND_WRITE_TIMEOUT', 30))
 
 login_manager = LoginManager(app)
 login_manager.login_view = 'serve_login'
 
 USERS_DB = 'users.db'
+ALERT_HEADER = 'X-Mind-Alert'
 
 ADD = 'add'
+AFTER = 'after'
+BEFORE = 'before'
+COUNTS = 'counts'
+LIMIT = 'limit'
 NUM = 'num'
 ORDER = 'order'
 PAGE = 'page'
 PHASE = 'phase'
 QUERY = 'query'
+SEARCH = 'search'
 TAG = 'tag'
 TICK = 'tick'
 UNTICK = 'untick'
@@ -111,8 +128,54 @@ def add_token() -> str:
         return token
 
 
+checker: Optional[Checker] = None
+writer: Optional[Writer] = None
+writer_lock = threading.Lock()
+
+
 def init_mind() -> Mind:
-    return Mind(MEMORY if app.config.get('TESTING', False) else DEFAULT_DB)
+    mnd = Mind(MEMORY if app.config.get('TESTING', False) else DEFAULT_DB,
+               profile=app.config['MIND_PROFILE'],
+               background=app.config['MIND_BACKGROUND'])
+    g.mind_alert = mnd.alert()
+    return mnd
+
+
+def request_check() -> None:
+    global checker
+    if checker is None:
+        checker = Checker(DEFAULT_DB, app.config['MIND_PROFILE'],
+                          app.config['MIND_CHECK_INTERVAL'])
+        checker.start()
+    checker.request()
+
+
+def write(mnd: Mind, pending: Write):
+    global writer
+    with writer_lock:
+        # A writer that could not open the mind has stopped, try a new one.
+        if (writer is None or not writer.is_alive()) and \
+                app.config['MIND_WRITER'] and not app.config.get('TESTING'):
+            writer = Writer(DEFAULT_DB, app.config['MIND_PROFILE'])
+            writer.start()
+        current = writer
+    if current is None:
+        commit_writes(mnd, [pending])
+    else:
+        current.submit(pending)
+    return pending.done.result(app.config['MIND_WRITE_TIMEOUT'])
+
+
+@app.after_request
+def after_mind(response: Response) -> Response:
+    if 'mind_alert' not in g:
+        return response
+    alert = g.pop('mind_alert')
+    if alert:
+        response.headers[ALERT_HEADER] = alert
+    if app.config['MIND_BACKGROUND'] and not app.config.get('TESTING'):
+        response.call_on_close(request_check)
+    return response
 
 
 @login_manager.user_loader
@@ -133,8 +196,18 @@ def handle_query(mnd, query):
     num = int(query[NUM]) if NUM in query else PAGE_SIZE + 1
     phase = Phase[query[PHASE]] if PHASE in query else Phase.ACTIVE
     tag = query[TAG] if TAG in query and query[TAG].isalnum() else None
-    return jsonify(QueryStuff(order=order, offset=(page - 1) * num,
-                              state=phase, tag=tag).fetchall(mnd))
+    if SEARCH in query:
+        stuff = QuerySearch(str(query[SEARCH]), limit=num + 1,
+                            offset=(page - 1) * num, state=phase,
+                            tag=tag).fetchall(mnd)
+        return jsonify({'stuff': stuff[:num], 'page': page,
+                        'more': len(stuff) > num})
+    after = from_cursor(query.get(AFTER))
+    before = from_cursor(query.get(BEFORE))
+    offset = 0 if after or before else (page - 1) * num
+    return jsonify(QueryStuff(order=order, limit=num, offset=offset,
+                              state=phase, tag=tag, after=after,
+                              before=before).page(mnd)._asdict())
 
 
 @app.route('/login', methods=['POST'])
@@ -226,6 +299,21 @@ def handle_errors(error):
     return redirect(f'error?code={error.code}')
 
 
+def handle_update(mnd: Mind, id: int, old: Phase, state: Phase):
+    # Listings only carry previews, the stored body is the one hashed.
+    stf = load_stuff(mnd, Epoch(id))
+    if stf is None:
+        return jsonify({'error': f'Stuff with ID {id} not found.'}), 404
+    # Ticked twice, or changed by another device since it was listed.
+    if stf.state != old:
+        return jsonify({'error': f'Stuff with ID {id} is not {old.name}.'}), \
+            409
+    try:
+        return jsonify({'updated': write(mnd, Write.update(stf, state))})
+    except ValueError as err:
+        return jsonify({'error': str(err)}), 409
+
+
 @app.route('/stuff', methods=['POST'])
 @login_required
 def handle_stuff():
@@ -233,17 +321,22 @@ def handle_stuff():
         app.logger.info(f'Processing request: {json.dumps(request.json)}')
         if QUERY in request.json:
             return handle_query(mnd, request.json[QUERY])
+        elif ADD in request.json and all(
+                isinstance(item, list) for item in request.json[ADD]):
+            # A list of items, each a list of lines like a single add.
+            added = write(mnd, Write.many(request.json[ADD]))
+            return jsonify({'added': [
+                {'tags': [t.tag for t in tags], 'stuff': stuff}
+                for stuff, tags in added]})
         elif ADD in request.json:
-            stuff, tags = add_content(mnd, request.json[ADD])
+            stuff, tags = write(mnd, Write.add(request.json[ADD]))
             return jsonify({'tags': [t.tag for t in tags], 'stuff': stuff})
         elif TICK in request.json:
-            stf = Stuff(Epoch(request.json[TICK]['id']),
-                        request.json[TICK]['body'], state=Phase.ACTIVE)
-            return jsonify({'updated': update_state(stf, mnd, Phase.DONE)})
+            return handle_update(mnd, request.json[TICK]['id'],
+                                 Phase.ACTIVE, Phase.DONE)
         elif UNTICK in request.json:
-            stf = Stuff(Epoch(request.json[UNTICK]['id']),
-                        request.json[UNTICK]['body'], state=Phase.DONE)
-            return jsonify({'updated': update_state(stf, mnd, Phase.ACTIVE)})
+            return handle_update(mnd, request.json[UNTICK]['id'],
+                                 Phase.DONE, Phase.ACTIVE)
         else:
             return Response(400)
 
@@ -251,6 +344,10 @@ def handle_stuff():
 @app.route('/tags', methods=['POST'])
 @login_required
 def handle_tags():
+    query = request.get_json(silent=True) or {}
+    if query.get(COUNTS):
+        counts = QueryTagCounts(limit=int(query.get(LIMIT, 15)))
+        return jsonify([c._asdict() for c in counts.execute(init_mind())])
     return jsonify(QueryTags(None, limit=3).execute(init_mind()))
 
 
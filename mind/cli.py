@@ -3,6 +3,7 @@ from typing import Callable, NamedTuple
 import argparse
 import logging
 import mind
+import os
 import sys
 
 
@@ -25,6 +26,77 @@ def add_list_cmd(sub_parsers, name, help):
                             help="How much stuff to list.")
     sub_parser.add_argument("-p", "--page", type=int, default=1,
                             help="Which page of results to list.")
+    return sub_parser
+
+
+def add_stuff_list_cmd(sub_parsers, name, help):
+    sub_parser = add_list_cmd(sub_parsers, name, help)
+    cursor = sub_parser.add_mutually_exclusive_group()
+    cursor.add_argument("--after", type=str,
+                        help="List stuff after this cursor.")
+    cursor.add_argument("--before", type=str,
+                        help="List stuff before this cursor.")
+
+
+def add_search_cmd(sub_parsers, name, help):
+    sub_parser = sub_parsers.add_parser(name, help=help)
+    sub_parser.add_argument(name, type=str, nargs="+",
+                            help="Words to search for, end with * to match "
+                                 "a prefix.")
+    sub_parser.add_argument("-t", "--tag", type=str,
+                            help="Only search stuff with this tag.")
+    sub_parser.add_argument("--phase", default="active",
+                            choices=["active", "done", "hidden"],
+                            help="Only search stuff in this phase.")
+    sub_parser.add_argument("-n", "--num", type=int, default=mind.PAGE_SIZE,
+                            help="How much stuff to list.")
+    sub_parser.add_argument("-p", "--page", type=int, default=1,
+                            help="Which page of results to list.")
+
+
+def add_archive_cmd(sub_parsers, name, help):
+    sub_parser = sub_parsers.add_parser(name, help=help)
+    sub_parser.add_argument("--days", type=int, default=30,
+                            help="Archive stuff older than this many days.")
+
+
+def add_tags_cmd(sub_parsers, name, help):
+    sub_parser = sub_parsers.add_parser(name, help=help)
+    sub_parser.add_argument("-n", "--num", type=int, default=15,
+                            help="How many tags to list.")
+
+
+def add_verify_cmd(sub_parsers, name, help):
+    sub_parser = sub_parsers.add_parser(name, help=help)
+    sub_parser.add_argument("-j", "--jobs", type=int,
+                            default=os.cpu_count() or 1,
+                            help="How many processes to verify with.")
+
+
+def add_root_cmd(sub_parsers, name, help):
+    sub_parser = sub_parsers.add_parser(name, help=help)
+    sub_parser.add_argument("--compare", type=str,
+                            help="Another DB file to compare with.")
+
+
+def add_proof_cmd(sub_parsers, name, help):
+    sub_parser = sub_parsers.add_parser(name, help=help)
+    proof = sub_parser.add_mutually_exclusive_group(required=True)
+    proof.add_argument(name, type=int, nargs="?",
+                       help="Which record, by its number in history.")
+    proof.add_argument("--check", type=str,
+                       help="Check a proof printed by another mind.")
+
+
+def add_check_cmd(sub_parsers, name, help):
+    sub_parsers.add_parser(name, help=help)
+
+
+def add_rehash_cmd(sub_parsers, name, help):
+    sub_parser = sub_parsers.add_parser(name, help=help)
+    sub_parser.add_argument("--algo", default="sha1",
+                            choices=["sha1", "blake2b"],
+                            help="Which hash to chain the history with.")
 
 
 def add_add_cmd(sub_parsers, name, help):
@@ -33,31 +105,63 @@ def add_add_cmd(sub_parsers, name, help):
     add_group.add_argument("--file", type=str, help="Add stuff from a file.")
     add_group.add_argument("-t", "--text", type=str,
                            help="Add text from the command line")
+    add.add_argument("--per-line", action="store_true",
+                     help="Add each line as separate stuff.")
 
 
 COMMANDS = {
     "add":      Command(do=mind.do_add, add=add_add_cmd,
                         help="Add stuff to mind."),
-    mind.CLEAN: Command(do=mind.do_list, add=add_list_cmd,
+    "archive":  Command(mind.do_archive, add_archive_cmd,
+                        "Move done and forgotten stuff to the archive."),
+    "check":    Command(mind.do_check, add_check_cmd,
+                        "Verify the changes since the last check."),
+    mind.CLEAN: Command(do=mind.do_list, add=add_stuff_list_cmd,
                         help="List oldest stuff, so you can clean it up ;)."),
-    "forget":   Command(mind.do_forget, add_command, "Which stuff to forget."),
+    "forget":   Command(mind.do_forget, add_command,
+                        "Which stuff to forget, e.g. 1,3 or 5-20 or #tag."),
     "history":  Command(mind.do_history, add_list_cmd,
                         help="Show history of changes."),
-    "list":     Command(mind.do_list, add_list_cmd, "List your latest stuff."),
+    "list":     Command(mind.do_list, add_stuff_list_cmd,
+                        "List your latest stuff."),
+    "proof":    Command(mind.do_proof, add_proof_cmd,
+                        "Prove a record is in the verified history."),
+    "rehash":   Command(mind.do_rehash, add_rehash_cmd,
+                        "Hash the whole history again, with another hash."),
+    "root":     Command(mind.do_root, add_root_cmd,
+                        "Show the Merkle root of the verified history."),
+    "search":   Command(mind.do_search, add_search_cmd,
+                        "Search your stuff for some words."),
     "show":     Command(mind.do_show, add_command, "Show stuff."),
-    "tick":     Command(mind.do_tick, add_command, "Mark stuff as complete."),
+    "tags":     Command(mind.do_tags, add_tags_cmd,
+                        "Count the active stuff for each tag."),
+    "tick":     Command(mind.do_tick, add_command,
+                        "Mark stuff as complete, e.g. 1,3 or 5-20 or #tag."),
+    "verify":   Command(mind.do_verify, add_verify_cmd,
+                        "Verify the whole history of changes."),
 }
 
 
+# These verify the chain themselves, opening them doesn't need to.
+SELF_CHECKING = ("check", "rehash", "verify")
+
+
 def run(args: argparse.Namespace) -> list[str]:
     logging.debug(f"Running with arguments: {args}")
-    with mind.Mind(args.db) as mnd:
+    profile = getattr(args, "profile", mind.DURABLE)
+    background = getattr(args, "background", False)
+    with mind.Mind(args.db, profile=profile, background=background or
+                   args.cmd in SELF_CHECKING) as mnd:
+        alert = mnd.alert()
         if args.cmd in COMMANDS:
-            return COMMANDS[args.cmd].do(mnd, args)
+            output = COMMANDS[args.cmd].do(mnd, args)
         else:
             args.num = mind.PAGE_SIZE
             args.page = 1
-            return mind.do_list(mnd, args)
+            output = mind.do_list(mnd, args)
+    if background and args.cmd not in SELF_CHECKING:
+        mind.spawn_check(args.db, profile)
+    return ([alert] if alert else []) + output
 
 
 def setup(argv) -> argparse.Namespace:
@@ -69,6 +173,12 @@ def setup(argv) -> argparse.Namespace:
         cmd.add(sub_parsers, name, cmd.help)
     parser.add_argument("--db", type=str, default=mind.DEFAULT_DB,
                         help=f"DB file, defaults to {mind.DEFAULT_DB}")
+    parser.add_argument("--profile", choices=mind.PROFILES.keys(),
+                        default=mind.DURABLE,
+                        help="Connection profile, trading durability for "
+                             f"speed. Defaults to {mind.DURABLE}.")
+    parser.add_argument("--background", action="store_true",
+                        help="Verify in a separate process after answering.")
     parser.add_argument("-v", "--verbose",  action="store_true",
                         help="Enable verbose output.")
     return parser.parse_args(argv)
@@ -1,14 +1,29 @@
 #! /usr/bin/env python3
 from datetime import datetime as dt, timezone as tz
 from enum import IntEnum, Enum
+from bisect import bisect_left
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import closing, contextmanager
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
-from sqlite3 import Cursor, PARSE_DECLTYPES
+from random import sample
+from sqlite3 import Cursor
 from textwrap import shorten
-from typing import NamedTuple, Callable, Optional, NewType, Union
+from typing import Any, NamedTuple, Callable, Generator, Iterable, \
+    Iterator, Optional, NewType, Union
 import argparse
 import hashlib
+import json
 import logging
+import lzma
+import queue
 import sqlite3
+import struct
+import subprocess
+import sys
+import threading
+import zlib
 
 
 CLEAN = "clean"
@@ -20,23 +35,103 @@ NEWLINE = "\n"
 SPACE = " "
 STUFF = "stuff"
 TAGS = "tags"
+TAG_NAMES = "tag_names"
+TAG_STATS = "tag_stats"
+LOG = "log"
+CHECKPOINTS = "checkpoints"
+MARKS = "marks"
+MERKLE = "merkle"
+SPOTS = "spots"
+EPOCHS = "epochs"
+VERIFIED = "verified"
+FAILED = "failed"
+SEARCH = "search"
+ARCHIVE = "archive"
+ALL_STUFF = "all_stuff"
+ARCHIVED = "archived_stuff"
+OLD_ROWS = "old_rows"  # The batch a schema upgrade is rebuilding.
+SEARCH_TABLE = f"CREATE VIRTUAL TABLE {SEARCH} USING fts5(body, content='')"
+TAGGED = "LEFT JOIN tags ON stuff.id = tags.id " \
+         "LEFT JOIN tag_names ON tags.tag_id = tag_names.tag_id "
+TAG_ID = "SELECT tag_id FROM tag_names WHERE name = :tag"
+IN_IDS = "IN (SELECT value FROM json_each(:ids))"
+ACTIVE = 2  # Phase.ACTIVE, for SQL.
+# Keep the counts in tag_stats current for every write path, tags are only
+# ever added and stuff only changes state.
+TAG_STATS_TRIGGERS = [
+    "CREATE TRIGGER tags_stats AFTER INSERT ON tags BEGIN "
+    "INSERT INTO tag_stats (tag_id, latest, active, total) VALUES "
+    f"(new.tag_id, new.id, IFNULL((SELECT state = {ACTIVE} FROM stuff "
+    "WHERE id = new.id), 0), 1) ON CONFLICT (tag_id) DO UPDATE SET "
+    "latest = max(latest, excluded.latest), "
+    "active = active + excluded.active, total = total + 1; END",
+    "CREATE TRIGGER stuff_stats AFTER UPDATE OF state ON stuff "
+    f"WHEN (old.state = {ACTIVE}) != (new.state = {ACTIVE}) BEGIN "
+    f"UPDATE tag_stats SET active = active + iif(new.state = {ACTIVE}, 1, -1) "
+    "WHERE tag_id IN (SELECT tag_id FROM tags WHERE id = new.id); END"]
+FULL_BODY = "iif(stuff.codec, unpack(stuff.codec, stuff.body), stuff.body)"
+PREVIEW_BODY = "iif(stuff.codec, stuff.preview, stuff.body)"
+# The log joins each side on its own index, the union view would be read
+# whole for every query.
+LOGGED = f"LEFT JOIN main.{STUFF} AS hot ON log.stuff = hot.id " \
+         f"LEFT JOIN {ARCHIVED} AS cold ON log.stuff = cold.id " \
+         "AND hot.id IS NULL " \
+         "LEFT JOIN tags ON log.stuff = tags.id " \
+         "LEFT JOIN tag_names ON tags.tag_id = tag_names.tag_id "
+
+
+def logged(column: str) -> str:
+    # The hot row when there is one, otherwise the archived one.
+    return f"iif(hot.id IS NULL, {column.replace('stuff.', 'cold.')}, " \
+           f"{column.replace('stuff.', 'hot.')})"
+
+
+FULL_RECORD = f"SELECT log.*, {logged('stuff.id')}, {logged(FULL_BODY)}, " \
+              f"{logged('stuff.state')}, group_concat(tag_names.name) " \
+              f"FROM log {LOGGED}"
 PAGE_SIZE = 9
+MAX_COMPOUND = 250
+STATEMENT_CACHE = 256
+DURABLE = "durable"
+FAST_WAL = "fast-wal"
+BULK_LOAD = "bulk-load"
+READ_ONLY = "read-only"
+MEGABYTE = 1024 * 1024
+LEGACY_VERSION = 7
+REBUILT_VERSION = 17
+SCHEMA_VERSION = 18
+CHECKPOINT_EVERY = 1_000
+QUICK_DEPTH = 10
+SECONDS_PER_DAY = 86_400
+COMPRESS_AT = 1024
+LZMA_AT = 64 * 1024
+PREVIEW_WIDTH = 200
 H_RULE = "-" * 80
+ENCODE_CHUNK = 64 * 1024
 
 
 Phase = IntEnum("Phase", "ABSENT ACTIVE DONE HIDDEN")
+Codec = IntEnum("Codec", "PLAIN ZLIB LZMA", start=0)
+# TEXT_SHA1 hashes the canonical() strings, the rest the binary encoding.
+HashAlgo = IntEnum("HashAlgo", "TEXT_SHA1 SHA1 BLAKE2B", start=0)
 FilterType = Enum("FilterType", (("ALL", None), ("TAG", "#")))
 sqlite3.register_adapter(Phase, lambda s: s.value)
-sqlite3.register_converter("PHASE", lambda b: Phase(int(b)))
+sqlite3.register_adapter(Codec, lambda c: c.value)
+sqlite3.register_adapter(HashAlgo, lambda a: a.value)
 Sequence = NewType('Sequence', int)
 Params = Union[dict, tuple]
-Operation = tuple[str, Params]
+Body = Union[str, bytes]
+# With a row count, the statement must change exactly that many rows.
+Operation = Union[tuple[str, Params], tuple[str, Params, int]]
 
 
 class Order(Enum):
     LATEST = "DESC"
     OLDEST = "ASC"
 
+    def flip(self):
+        return Order.OLDEST if self == Order.LATEST else Order.LATEST
+
 
 def to_order(latest: bool) -> Order:
     return Order.LATEST if latest else Order.OLDEST
@@ -75,7 +170,14 @@ class Epoch(int):
 
 
 sqlite3.register_adapter(Epoch, lambda e: e)
-sqlite3.register_converter("EPOCH", lambda b: Epoch(int(b)))
+
+
+class Digest(str):
+    pass
+
+
+# Digests are hex in the chain, the DB keeps the raw bytes.
+sqlite3.register_adapter(Digest, bytes.fromhex)
 
 
 def insert(table: str, row):
@@ -86,10 +188,15 @@ def insert(table: str, row):
 
 # None / Null not included here as there are no optional columns (yet)
 # Optional[int|str] could be mapped to removing the 'NOT NULL' constraint
-TYPE_MAP: dict[type, Callable[[str], str]] = {
+TYPE_MAP: dict[Any, Callable[[str], str]] = {
     Phase: lambda n: f"PHASE NOT NULL CHECK ({n} BETWEEN 1 AND 4)",
+    Codec: lambda n: f"INTEGER NOT NULL CHECK ({n} BETWEEN 0 AND 2)",
+    HashAlgo: lambda n: f"INTEGER NOT NULL DEFAULT 0 "
+                        f"CHECK ({n} BETWEEN 0 AND 2)",
+    Body: lambda n: "BLOB NOT NULL",
     Sequence: lambda n: "INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL",
-    Epoch: lambda n: "EPOCH NOT NULL",
+    Epoch: lambda n: "INTEGER NOT NULL",
+    Digest: lambda n: "BLOB NOT NULL",
     int: lambda n: "INTEGER NOT NULL",
     float: lambda n: "REAL NOT NULL",
     str: lambda n: "TEXT NOT NULL",
@@ -99,11 +206,12 @@ TYPE_MAP: dict[type, Callable[[str], str]] = {
 
 class Record(NamedTuple):
     sn: Sequence = Sequence(0)
-    hash: str = ""
+    hash: Digest = Digest("")
     stuff: Epoch = Epoch(0)
     stamp: Epoch = Epoch(0)
     old_state: Phase = Phase.ABSENT
     new_state: Phase = Phase.HIDDEN
+    algo: HashAlgo = HashAlgo.TEXT_SHA1
 
     def __str__(self):
         return f"Record [{self.sn}, {self.stamp}, {self.hash}, " \
@@ -116,6 +224,14 @@ class Record(NamedTuple):
     def constraints(self) -> list[str]:
         return []
 
+    @classmethod
+    def indexes(self) -> list[tuple[str, ...]]:
+        return [("stuff",)]
+
+    @classmethod
+    def without_rowid(self) -> bool:
+        return False
+
     def next(self):
         return Sequence(self.sn + 1)
 
@@ -133,10 +249,69 @@ class Tag(NamedTuple):
     id: Epoch
     tag: str
 
+
+class TagName(NamedTuple):
+    tag_id: int
+    name: str
+
     @classmethod
     def constraints(self) -> list[str]:
+        return ["PRIMARY KEY (tag_id)", "UNIQUE (name)"]
+
+    @classmethod
+    def indexes(self) -> list[tuple[str, ...]]:
         return []
 
+    @classmethod
+    def without_rowid(self) -> bool:
+        return False
+
+
+class TagRef(NamedTuple):
+    id: Epoch
+    tag_id: int
+
+    @classmethod
+    def constraints(self) -> list[str]:
+        return ["PRIMARY KEY (tag_id, id)"]
+
+    @classmethod
+    def indexes(self) -> list[tuple[str, ...]]:
+        return [("id",)]
+
+    @classmethod
+    def without_rowid(self) -> bool:
+        return True
+
+
+class TagStats(NamedTuple):
+    tag_id: int
+    latest: Epoch
+    active: int
+    total: int
+
+    @classmethod
+    def constraints(self) -> list[str]:
+        return ["PRIMARY KEY (tag_id)"]
+
+    @classmethod
+    def indexes(self) -> list[tuple[str, ...]]:
+        return [("latest",), ("active",)]
+
+    @classmethod
+    def without_rowid(self) -> bool:
+        return False
+
+
+class TagCount(NamedTuple):
+    tag: str
+    latest: Epoch
+    active: int
+    total: int
+
+    def __str__(self):
+        return f"#{self.tag} ({self.active}/{self.total})"
+
 
 class Tags(list[Tag]):
 
@@ -154,10 +329,6 @@ class Stuff(NamedTuple):
     body: str
     state: Phase = Phase.ACTIVE
 
-    @classmethod
-    def constraints(self) -> list[str]:
-        return ["PRIMARY KEY (id)"]
-
     def preview(self, width=40):
         return shorten(self.body.splitlines()[0], width=width,
                        placeholder=" ...") if self.body else "EMPTY"
@@ -182,45 +353,479 @@ class Stuff(NamedTuple):
         return hashlib.sha1(self.__repr__().encode('utf8')).hexdigest()
 
 
+def codec_for(size: int) -> Codec:
+    if size < COMPRESS_AT:
+        return Codec.PLAIN
+    return Codec.LZMA if size >= LZMA_AT else Codec.ZLIB
+
+
+def pack(codec: int, body: str) -> Body:
+    if codec == Codec.ZLIB:
+        return zlib.compress(body.encode("utf-8"), 9)
+    elif codec == Codec.LZMA:
+        return lzma.compress(body.encode("utf-8"))
+    return body
+
+
+def unpack(codec: int, body: Body) -> str:
+    if isinstance(body, str):
+        return body
+    raw = lzma.decompress(body) if codec == Codec.LZMA else \
+        zlib.decompress(body)
+    return raw.decode("utf-8")
+
+
+def body_preview(body: str) -> str:
+    return body.splitlines()[0][:PREVIEW_WIDTH] if body else ""
+
+
+class PackedStuff(NamedTuple):
+    id: Epoch
+    body: Body
+    state: Phase
+    codec: Codec
+    preview: str  # Listings read this for packed bodies, never the body.
+
+    @classmethod
+    def constraints(self) -> list[str]:
+        return ["PRIMARY KEY (id)"]
+
+    @classmethod
+    def indexes(self) -> list[tuple[str, ...]]:
+        return [("state", "id")]
+
+    @classmethod
+    def without_rowid(self) -> bool:
+        return False
+
+    @classmethod
+    def pack(cls, stuff: Stuff):
+        codec = codec_for(len(stuff.body.encode("utf-8")))
+        preview = body_preview(stuff.body) if codec else ""
+        return cls(stuff.id, pack(codec, stuff.body), stuff.state, codec,
+                   preview)
+
+
+HASHERS: dict[HashAlgo, Callable[[], Any]] = {
+    HashAlgo.TEXT_SHA1: hashlib.sha1,
+    HashAlgo.SHA1: hashlib.sha1,
+    # Cut to 20 bytes, the size of every other hash in the log.
+    HashAlgo.BLAKE2B: lambda: hashlib.blake2b(digest_size=20,
+                                              person=b"mind-change"),
+}
+DEFAULT_ALGO = HashAlgo.SHA1
+
+
 class Change(NamedTuple):
     parent: Record
     stuff: Stuff
     act: Transition
     stamp: Epoch
     tags: Tags = Tags()
+    algo: HashAlgo = DEFAULT_ALGO
 
     def canonical(self) -> str:
         parts = [self.parent.canonical(), self.stuff.canonical(
             self.act.value[1]), repr(self.act), self.tags.canonical()]
         return "Change [{}]".format(",".join(parts))
 
-    def hash(self) -> str:
-        return hashlib.sha1(self.canonical().encode("utf-8")).hexdigest()
+    def encode(self) -> Iterator[bytes]:
+        # The same parts as canonical(), length prefixed, with the body fed
+        # a chunk at a time rather than copied into one big string.
+        phase = self.act.value[1]
+        body = self.stuff.body if phase == Phase.ACTIVE else ""
+        parent = bytes.fromhex(self.parent.hash)
+        yield struct.pack(">BqBqBBQ", self.algo, self.parent.sn,
+                          len(parent), self.stuff.id, self.act.value[0],
+                          phase, len(body))
+        yield parent
+        for start in range(0, len(body), ENCODE_CHUNK):
+            yield body[start:start + ENCODE_CHUNK].encode("utf-8")
+        tags = sorted(tag.tag.encode("utf-8") for tag in self.tags)
+        yield struct.pack(">Q", len(tags))
+        for tag in tags:
+            yield struct.pack(">Q", len(tag)) + tag
+
+    def hash(self) -> Digest:
+        hasher = HASHERS[self.algo]()
+        if self.algo == HashAlgo.TEXT_SHA1:
+            hasher.update(self.canonical().encode("utf-8"))
+        else:
+            for part in self.encode():
+                hasher.update(part)
+        return Digest(hasher.hexdigest())
 
     def record(self) -> Record:
         return Record(self.parent.next(), self.hash(), self.stuff.id,
-                      self.stamp, self.act.value[0], self.act.value[1])
+                      self.stamp, self.act.value[0], self.act.value[1],
+                      self.algo)
 
 
-class Mind:
-    tables: dict[str, type] = {STUFF: Stuff, TAGS: Tag, "log": Record}
+class Mark(NamedTuple):
+    name: str
+    sn: int
+    hash: Digest
+
+    @classmethod
+    def constraints(self) -> list[str]:
+        return ["PRIMARY KEY (name)"]
+
+    @classmethod
+    def indexes(self) -> list[tuple[str, ...]]:
+        return []
+
+    @classmethod
+    def without_rowid(self) -> bool:
+        return True
+
+
+class Node(NamedTuple):
+    level: int
+    pos: int
+    hash: Digest
+
+    @classmethod
+    def constraints(self) -> list[str]:
+        return ["PRIMARY KEY (level, pos)"]
+
+    @classmethod
+    def indexes(self) -> list[tuple[str, ...]]:
+        return []
+
+    @classmethod
+    def without_rowid(self) -> bool:
+        return True
+
+
+def merkle_hash(left: Digest, right: Digest) -> Digest:
+    return Digest(hashlib.sha1(bytes.fromhex(left) + bytes.fromhex(right))
+                  .hexdigest())
+
+
+def merkle_peaks(size: int) -> list[tuple[int, int]]:
+    # The (level, pos) of each perfect subtree over the first size records.
+    peaks, offset = [], 0
+    for level in reversed(range(size.bit_length())):
+        if size & (1 << level):
+            peaks.append((level, offset >> level))
+            offset += 1 << level
+    return peaks
+
+
+def bag_peaks(peaks: list[Digest]) -> Digest:
+    root = peaks[-1] if peaks else Digest("")
+    for peak in reversed(peaks[:-1]):
+        root = merkle_hash(peak, root)
+    return root
+
+
+class Proof(NamedTuple):
+    sn: int
+    size: int
+    hash: Digest
+    path: list[Digest]
+    peaks: list[Digest]
+    root: Digest
+
+    def __str__(self):
+        return json.dumps(self._asdict())
+
+    @classmethod
+    def parse(cls, raw: str):
+        return cls(**json.loads(raw))
+
+    def computed_root(self) -> Digest:
+        index = self.sn - 1
+        node = self.hash
+        for level, sibling in enumerate(self.path):
+            node = merkle_hash(sibling, node) if (index >> level) & 1 \
+                else merkle_hash(node, sibling)
+        peaks = list(self.peaks)
+        for i, (level, pos) in enumerate(merkle_peaks(self.size)):
+            if index >> level == pos and level == len(self.path):
+                peaks[i] = node
+                return bag_peaks(peaks)
+        return Digest("")
+
+    def check(self) -> bool:
+        return 0 < self.sn <= self.size and \
+            self.computed_root() == self.root
+
+
+class Spots(NamedTuple):
+    day: int
+    checks: int
+    size: int
+    seconds: float
+
+    @classmethod
+    def constraints(self) -> list[str]:
+        return ["PRIMARY KEY (day)"]
+
+    @classmethod
+    def indexes(self) -> list[tuple[str, ...]]:
+        return []
+
+    @classmethod
+    def without_rowid(self) -> bool:
+        return False
+
+
+class Reserved(NamedTuple):
+    # The last id of any connection's block, see Mind.new_epochs.
+    name: str
+    last: Epoch
+
+    @classmethod
+    def constraints(self) -> list[str]:
+        return ["PRIMARY KEY (name)"]
+
+    @classmethod
+    def indexes(self) -> list[tuple[str, ...]]:
+        return []
+
+    @classmethod
+    def without_rowid(self) -> bool:
+        return True
+
+
+class Coverage(NamedTuple):
+    checks: int
+    days: int
+    size: int
+
+    def __str__(self):
+        return f"Spot checked {self.checks} records over {self.days} days, " \
+               f"about {self.ratio():.1%} of {self.size} covered"
+
+    def ratio(self) -> float:
+        # Samples are uniform, so each record is missed with (1 - 1/n)^k.
+        return 1 - (1 - 1 / self.size) ** self.checks if self.size else 0
+
+
+class Checkpoint(NamedTuple):
+    sn: int
+    hash: Digest
+    seal: Digest
+
+    @classmethod
+    def constraints(self) -> list[str]:
+        return ["PRIMARY KEY (sn)"]
+
+    @classmethod
+    def indexes(self) -> list[tuple[str, ...]]:
+        return []
+
+    @classmethod
+    def without_rowid(self) -> bool:
+        return False
+
+    @classmethod
+    def after(cls, parent: Optional["Checkpoint"], record: Record):
+        # Each seal covers the one before, so checkpoints form a chain too.
+        seal = parent.seal if parent else ""
+        canonical = f"Checkpoint [{record.sn},{record.hash},{seal}]"
+        return cls(record.sn, record.hash,
+                   Digest(hashlib.sha1(canonical.encode("utf-8"))
+                          .hexdigest()))
+
+
+PHASES: tuple[Optional[Phase], ...] = (None,) + tuple(Phase)
+CONVERTERS: dict[type, Callable[[Any], Any]] = {
+    Epoch: Epoch,
+    Phase: PHASES.__getitem__,
+    Digest: lambda raw: Digest(raw.hex()),
+    HashAlgo: HashAlgo,
+}
+
+
+def lazy_field(index: int, convert: Callable[[Any], Any]) -> property:
+    return property(lambda row: convert(tuple.__getitem__(row, index)))
+
 
-    def __init__(self, filename: str | Path, strict: bool = False) -> None:
+def row_type(schema: type) -> type:
+    # Rows keep the raw values sqlite returned, Epoch and Phase fields are
+    # only built when they are read. Indexing gives the raw value.
+    fields = {name: lazy_field(i, CONVERTERS[kind]) for i, (name, kind)
+              in enumerate(schema.__annotations__.items())
+              if kind in CONVERTERS}
+    name = f"{schema.__name__}Row"
+    return type(name, (schema,), {"__slots__": (), "__module__": __name__,
+                                  "__qualname__": name, **fields})
+
+
+StuffRow = row_type(Stuff)
+TagRow = row_type(Tag)
+TagCountRow = row_type(TagCount)
+RecordRow = row_type(Record)
+RECORD_WIDTH = len(Record._fields)
+CheckpointRow = row_type(Checkpoint)
+MarkRow = row_type(Mark)
+NodeRow = row_type(Node)
+
+
+def to_rows(row: type, cur: Cursor) -> list:
+    return [tuple.__new__(row, values) for values in cur]
+
+
+def to_row(row: type, values: Optional[tuple]):
+    return tuple.__new__(row, values) if values else None
+
+
+def full_record(row: tuple) -> tuple[Record, Stuff, Tags]:
+    stuff = to_row(StuffRow, row[RECORD_WIDTH:RECORD_WIDTH + 3])
+    return (to_row(RecordRow, row[:RECORD_WIDTH]), stuff,
+            Tags.from_grouped(stuff.id, row[RECORD_WIDTH + 3]))
+
+
+class Profile(NamedTuple):
+    journal_mode: Optional[str]
+    synchronous: str
+    mmap_size: int
+    cache_size: int  # Negative values are in KiB, see sqlite docs.
+    temp_store: str
+    read_only: bool = False
+
+    def pragmas(self) -> dict[str, Union[str, int]]:
+        fields = self._asdict()
+        fields.pop("read_only")
+        return {name: val for name, val in fields.items() if val is not None}
+
+
+PROFILES: dict[str, Profile] = {
+    # Durable keeps the file's journal mode, the web app may hold it in WAL.
+    DURABLE: Profile(None, "FULL", 0, -2_000, "DEFAULT"),
+    FAST_WAL: Profile("WAL", "NORMAL", 256 * MEGABYTE, -16_000, "MEMORY"),
+    BULK_LOAD: Profile("WAL", "OFF", 256 * MEGABYTE, -64_000, "MEMORY"),
+    READ_ONLY: Profile(None, "OFF", 1024 * MEGABYTE, -16_000, "MEMORY",
+                       read_only=True),
+}
+
+
+def connect(path: Union[str, Path], profile: Profile) -> sqlite3.Connection:
+    if profile.read_only and path != MEMORY:
+        con = sqlite3.connect(f"{Path(path).as_uri()}?mode=ro", uri=True,
+                              cached_statements=STATEMENT_CACHE)
+    else:
+        con = sqlite3.connect(path, cached_statements=STATEMENT_CACHE)
+    for name, value in profile.pragmas().items():
+        try:
+            con.execute(f"PRAGMA {name} = {value}")
+        except sqlite3.OperationalError as err:
+            # Leaving WAL needs the only connection, keep the current mode.
+            logging.warning(f"Unable to set {name}={value}: {err}")
+    con.execute("PRAGMA foreign_keys = ON")
+    con.create_function("unpack", 2, unpack, deterministic=True)
+    return con
+
+
+class Progress(NamedTuple):
+    version: int
+    done: int
+    total: int
+    seconds: float
+
+    def __str__(self):
+        rate = self.done / self.seconds if self.seconds else 0
+        return f"Migrated {self.done}/{self.total} rows from schema " \
+               f"v{self.version} ({rate:.0f} rows/sec)"
+
+
+class Rebuild(NamedTuple):
+    table: str
+    schema: type
+    select: str  # Reads the rows being moved from OLD_ROWS.
+
+
+class Audited(NamedTuple):
+    done: int
+    total: int
+    seconds: float
+
+    def __str__(self):
+        rate = self.done / self.seconds if self.seconds else 0
+        return f"Verified {self.done}/{self.total} records " \
+               f"({rate:.0f} records/sec)"
+
+
+def report_progress(progress: Union[Progress, Audited]) -> None:
+    logging.info(str(progress))
+
+
+def tracing() -> bool:
+    return logging.getLogger().isEnabledFor(logging.DEBUG)
+
+
+class Mind:
+    tables: dict[str, type] = {STUFF: PackedStuff, TAG_NAMES: TagName,
+                               TAGS: TagRef, TAG_STATS: TagStats, LOG: Record,
+                               CHECKPOINTS: Checkpoint, MARKS: Mark,
+                               MERKLE: Node, SPOTS: Spots,
+                               EPOCHS: Reserved}
+    inserts: dict[str, str] = {name: insert(name, schema)
+                               for name, schema in tables.items()}
+    # Tags are written by name, they are keyed through the tag dictionary.
+    inserts[TAG_NAMES] = f"INSERT OR IGNORE INTO {TAG_NAMES} (name) " \
+                         "VALUES (:tag)"
+    inserts[TAGS] = f"INSERT INTO {TAGS} (id, tag_id) SELECT :id, tag_id " \
+                    f"FROM {TAG_NAMES} WHERE name = :tag"
+    inserts[SEARCH] = f"INSERT INTO {SEARCH} (rowid, body) " \
+                      "VALUES (:id, :body)"
+    inserts[MARKS] = f"INSERT OR REPLACE INTO {MARKS} (name, sn, hash) " \
+                     "VALUES (:name, :sn, :hash)"
+    # A block starts after the last one handed out and no earlier than now.
+    inserts[EPOCHS] = f"INSERT INTO {EPOCHS} (name, last) VALUES (:name, " \
+                      ":start + :size - 1) ON CONFLICT (name) DO UPDATE SET " \
+                      "last = max(last + 1, :start) + :size - 1 RETURNING last"
+    inserts[SPOTS] = f"{inserts[SPOTS]} ON CONFLICT (day) DO UPDATE SET " \
+                     "checks = checks + excluded.checks, " \
+                     "size = excluded.size, " \
+                     "seconds = seconds + excluded.seconds"
+    migrate_batch: int = 10_000
+    add_batch: int = 10_000
+    archive_batch: int = 1_000
+    checkpoint_every: int = CHECKPOINT_EVERY
+    verify_batch: int = 1_000
+    audit_chunk: int = 10_000
+    spot_checks: int = 8
+    catch_up: int = 1_000
+    spot_budget: float = 0.02
+    hash_algo: HashAlgo = DEFAULT_ALGO
+    epoch_batch: int = 100_000
+
+    def __init__(self, filename: str | Path, strict: bool = False,
+                 profile: str = DURABLE, background: bool = False) -> None:
         self.strict = strict
+        self.trace = tracing()
+        self.profile = PROFILES[profile]
         if filename == MEMORY:
             exists = False
-            path = filename
+            path: str | Path = filename
         else:
-            path = Path(filename).expanduser()
+            # Absolute, so URIs and child processes find the same file.
+            path = Path(filename).expanduser().resolve()
             exists = path.exists() and path.stat().st_size > 0
-        logging.debug(f"Opening DB {path}, exists: {exists}")
-        self.con = sqlite3.connect(path, detect_types=PARSE_DECLTYPES)
-        self.con.execute("PRAGMA foreign_keys = ON")
+        logging.debug(f"Opening DB {path}, exists: {exists}, "
+                      f"profile: {profile}")
+        self.path = None if path == MEMORY else Path(path)
+        self.con = connect(path, self.profile)
+        self.cached: Optional[tuple[int, Record]] = None
+        self.next_epoch = 0
+        self.reserved = -1
+        self.epoch_block = 0
+        self.spotted: list[Spots] = []
         if not exists:
-            for name, schema in self.tables.items():
-                self.con.execute(build_create_table_cmd(name, schema))
+            self.create()
             add_content(self, [""], state=Phase.HIDDEN, parent=Record())
-        self.verify() if self.strict else self.verify(10)
+        if not self.profile.read_only:
+            self.upgrade()
+        self.archived = self.attach()
+        # New records follow the chain, legacy text hashes move to the default.
+        head = self.head()
+        if head and head.algo != HashAlgo.TEXT_SHA1:
+            self.hash_algo = head.algo
+        if not background:
+            self.verify_on_open()
 
     def __enter__(self):
         return self
@@ -233,61 +838,910 @@ class Mind:
             self.con.close()
             raise exc
 
+    def schema(self) -> list[str]:
+        return [cmd for name, schema in self.tables.items() for cmd in
+                [build_create_table_cmd(name, schema)] +
+                build_create_index_cmds(name, schema)] + [SEARCH_TABLE] + \
+            TAG_STATS_TRIGGERS
+
+    def upgrades(self) -> dict[int, list[Union[str, Rebuild]]]:
+        return {8: [cmd for name in (STUFF, TAGS, LOG)
+                    for cmd in build_create_index_cmds(name,
+                                                       self.tables[name])],
+                9: [SEARCH_TABLE, f"INSERT INTO {SEARCH} (rowid, body) "
+                                  f"SELECT id, body FROM {STUFF}"],
+                10: [build_create_table_cmd(TAG_NAMES, TagName),
+                     f"INSERT INTO {TAG_NAMES} (name) SELECT tag FROM {TAGS} "
+                     "GROUP BY tag ORDER BY MIN(id)",
+                     Rebuild(TAGS, TagRef,
+                             f"SELECT DISTINCT {OLD_ROWS}.id, tag_id FROM "
+                             f"{OLD_ROWS} INNER JOIN {TAG_NAMES} ON "
+                             f"{OLD_ROWS}.tag = {TAG_NAMES}.name "
+                             "WHERE true ON CONFLICT DO NOTHING"),
+                     Rebuild(LOG, Record,
+                             "SELECT sn, unhex(hash), stuff, stamp, "
+                             f"old_state, new_state, 0 FROM {OLD_ROWS}")],
+                11: [Rebuild(STUFF, PackedStuff,
+                             "SELECT id, pack(codec, body), state, codec, "
+                             "iif(codec, body_preview(body), '') FROM "
+                             "(SELECT *, codec_for(length(CAST(body AS "
+                             f"BLOB))) AS codec FROM {OLD_ROWS})")],
+                12: [build_create_table_cmd(TAG_STATS, TagStats),
+                     *build_create_index_cmds(TAG_STATS, TagStats),
+                     f"INSERT INTO {TAG_STATS} SELECT tag_id, MAX(tags.id), "
+                     f"COUNT(CASE WHEN state = {ACTIVE} THEN 1 END), COUNT(*) "
+                     f"FROM {TAGS} LEFT JOIN {STUFF} ON {STUFF}.id = tags.id "
+                     "GROUP BY tag_id", *TAG_STATS_TRIGGERS],
+                13: [build_create_table_cmd(CHECKPOINTS, Checkpoint)],
+                14: [build_create_table_cmd(MARKS, Mark)],
+                15: [build_create_table_cmd(MERKLE, Node)],
+                16: [build_create_table_cmd(SPOTS, Spots)],
+                17: [Rebuild(LOG, Record,
+                             "SELECT sn, hash, stuff, stamp, old_state, "
+                             f"new_state, 0 FROM {OLD_ROWS}")],
+                18: [build_create_table_cmd(EPOCHS, Reserved),
+                     f"INSERT INTO {EPOCHS} SELECT '{STUFF}', "
+                     f"IFNULL(MAX(id), 0) FROM {STUFF}"]}
+
+    def create(self) -> None:
+        with self.con:
+            self.con.execute("BEGIN")
+            [self.con.execute(stmt) for stmt in self.schema()]
+            self.con.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def upgrade(self) -> None:
+        version = schema_version(self.con)
+        if 0 < version < LEGACY_VERSION:
+            self.begin_migration(version)
+            version = SCHEMA_VERSION
+        if version < LEGACY_VERSION:
+            logging.debug(f"Not upgrading unknown schema v{version}")
+            return
+        start = version
+        # Used by the upgrade statements to rebuild tables in SQL.
+        functions: dict[str, tuple[int, Callable[..., Any]]] = {
+            "unhex": (1, bytes.fromhex), "pack": (2, pack),
+            "codec_for": (1, codec_for), "body_preview": (1, body_preview)}
+        for name, (args, func) in functions.items():
+            self.con.create_function(name, args, func, deterministic=True)
+        for target, steps in sorted(self.upgrades().items()):
+            if target > version:
+                logging.debug(f"Upgrading schema v{version} -> v{target}")
+                self.upgrade_to(version, target, steps)
+                version = target
+        if start < REBUILT_VERSION <= version:
+            # Hand the pages freed by the rebuilt tables back to the disk.
+            self.con.execute("VACUUM")
+        for legacy in legacy_versions(self.con):
+            self.migrate(legacy)
+
+    def upgrade_to(self, version: int, target: int,
+                   steps: list[Union[str, Rebuild]]) -> None:
+        # Statements run first, together with creating the tables that are
+        # rebuilt, so a new_ table left behind means they already ran.
+        rebuilds = [step for step in steps if isinstance(step, Rebuild)]
+        new = [f"new_{rebuild.table}" for rebuild in rebuilds]
+        if not rebuilds or not self.con.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND "
+                "name = :name", {"name": new[0]}).fetchone():
+            with self.con:
+                self.con.execute("BEGIN")
+                for stmt in steps:
+                    if isinstance(stmt, str):
+                        self.con.execute(stmt)
+                for name, rebuild in zip(new, rebuilds):
+                    self.con.execute(build_create_table_cmd(name,
+                                                            rebuild.schema))
+                if not rebuilds:
+                    self.con.execute(f"PRAGMA user_version = {target}")
+        if not rebuilds:
+            return
+        for rebuild in rebuilds:
+            self.rebuild(version, rebuild)
+        with self.con:
+            self.con.execute("BEGIN")
+            for name, rebuild in zip(new, rebuilds):
+                self.con.execute(f"DROP TABLE {rebuild.table}")
+                self.con.execute(f"ALTER TABLE {name} RENAME TO "
+                                 f"{rebuild.table}")
+                for cmd in build_create_index_cmds(rebuild.table,
+                                                   rebuild.schema):
+                    self.con.execute(cmd)
+            self.con.execute(f"PRAGMA user_version = {target}")
+
+    def rebuild(self, version: int, rebuild: Rebuild) -> None:
+        # Each batch of rows is deleted from the old table as it is copied,
+        # an interrupted upgrade carries on with the rows that are left.
+        old, new = rebuild.table, f"new_{rebuild.table}"
+        batch = f"SELECT rowid FROM {old} ORDER BY rowid LIMIT :batch"
+        copy = f"WITH {OLD_ROWS} AS (SELECT * FROM {old} WHERE rowid IN " \
+               f"({batch})) INSERT INTO {new} {rebuild.select}"
+        params = {"batch": self.migrate_batch}
+        total = self.con.execute(f"SELECT COUNT(*) FROM {old}").fetchone()[0]
+        done, start = 0, dt.now()
+        while True:
+            with self.con:
+                self.con.execute("BEGIN")
+                self.query(copy, params)
+                count = self.query(f"DELETE FROM {old} WHERE rowid IN "
+                                   f"({batch})", params).rowcount
+            if not count:
+                break
+            done += count
+            seconds = (dt.now() - start).total_seconds()
+            report_progress(Progress(version, done, total, seconds))
+
+    def archive_path(self) -> Optional[Path]:
+        if self.path is None:
+            return None
+        return self.path.with_name(f"{self.path.stem}.{ARCHIVE}"
+                                   f"{self.path.suffix}")
+
+    def attach(self, create: bool = False) -> bool:
+        # Non-active stuff may live in the archive file, queries that can see
+        # it read the union view.
+        path = self.archive_path()
+        attach = path is not None and (create or path.exists())
+        if path and attach and ARCHIVE not in attached(self.con):
+            uri = f"{path.as_uri()}?mode=ro" if self.profile.read_only \
+                else str(path)
+            self.con.execute(f"ATTACH DATABASE ? AS {ARCHIVE}", (uri,))
+            if not self.con.execute(f"SELECT 1 FROM {ARCHIVE}.sqlite_master "
+                                    "WHERE name = :name",
+                                    {"name": STUFF}).fetchone():
+                with self.con:
+                    self.con.execute("BEGIN")
+                    self.con.execute(build_create_table_cmd(
+                        f"{ARCHIVE}.{STUFF}", PackedStuff))
+                    for cmd in build_create_index_cmds(STUFF, PackedStuff,
+                                                       ARCHIVE):
+                        self.con.execute(cmd)
+                    self.con.execute(f"PRAGMA {ARCHIVE}.user_version = "
+                                     f"{SCHEMA_VERSION}")
+        union = f" UNION ALL SELECT * FROM {ARCHIVE}.{STUFF}" if attach else ""
+        cold = f"{ARCHIVE}.{STUFF}" if attach else f"main.{STUFF} WHERE 0"
+        for view, select in ((ALL_STUFF, f"main.{STUFF}{union}"),
+                             (ARCHIVED, cold)):
+            self.con.execute(f"DROP VIEW IF EXISTS temp.{view}")
+            self.con.execute(f"CREATE TEMP VIEW {view} AS SELECT * FROM "
+                             f"{select}")
+        return attach
+
+    def reattach(self) -> bool:
+        # Another connection may have archived since this one was opened.
+        path = self.archive_path()
+        if not self.archived and path is not None and path.exists():
+            self.archived = self.attach()
+        return self.archived
+
+    def archive(self, before: Epoch) -> int:
+        self.archived = self.attach(create=True)
+        if not self.archived:
+            return 0
+        pick = f"SELECT id FROM main.{STUFF} WHERE state = :state AND " \
+               "id < :before ORDER BY id LIMIT :batch"
+        moved = 0
+        for state in (Phase.DONE, Phase.HIDDEN):
+            params = {"state": state, "before": before,
+                      "batch": self.archive_batch}
+            while True:
+                with self.con:
+                    self.con.execute("BEGIN")
+                    self.query(f"INSERT OR REPLACE INTO {ARCHIVE}.{STUFF} "
+                               f"SELECT * FROM main.{STUFF} WHERE id IN "
+                               f"({pick})", params)
+                    count = self.query(f"DELETE FROM main.{STUFF} WHERE id IN "
+                                       f"({pick})", params).rowcount
+                moved += count
+                if count < self.archive_batch:
+                    break
+        if moved:
+            # Give the freed pages back so the hot file stays small.
+            self.con.execute("VACUUM main")
+        return moved
+
+    def begin_migration(self, version: int) -> None:
+        # Park the old tables under a versioned name next to fresh ones, the
+        # rows are then moved across in batches by migrate().
+        logging.info(f"Migrating schema v{version} -> v{SCHEMA_VERSION}")
+        with self.con:
+            self.con.execute("BEGIN")
+            for name in legacy_tables(self.con):
+                self.con.execute(f"ALTER TABLE {name} "
+                                 f"RENAME TO v{version}_{name}")
+            self.con.execute(f"CREATE INDEX v{version}_{TAGS}_id "
+                             f"ON v{version}_{TAGS}(id)")
+            [self.con.execute(stmt) for stmt in self.schema()]
+            self.con.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def migrate(self, version: int) -> None:
+        stuff, tags = f"v{version}_{STUFF}", f"v{version}_{TAGS}"
+        if not self.con.execute(f"SELECT 1 FROM {LOG}").fetchone():
+            add_content(self, [""], state=Phase.HIDDEN, parent=Record())
+        select = "SELECT s.rowid, s.id, s.body, s.state, " \
+                 "group_concat(t.tag) FROM (SELECT rowid, * FROM " \
+                 f"{stuff} ORDER BY rowid LIMIT :batch) s LEFT JOIN {tags} " \
+                 "t ON t.id = s.id GROUP BY s.rowid ORDER BY s.rowid"
+        total = self.con.execute(f"SELECT COUNT(*) FROM {stuff}").fetchone()[0]
+        done, start = 0, dt.now()
+        while rows := self.query(select, {"batch": self.migrate_batch}) \
+                .fetchall():
+            parent = self.head()
+            migrated = [legacy_stuff(version, *row[1:]) for row in rows]
+            records: list[Record] = []
+            for new, new_tags in migrated:
+                for change in legacy_changes(parent, new, new_tags,
+                                             self.hash_algo):
+                    parent = change.record()
+                    records.append(parent)
+            with self.writing(parent):
+                self.con.executemany(self.inserts[STUFF],
+                                     [PackedStuff.pack(new)._asdict()
+                                      for new, _ in migrated])
+                self.con.executemany(self.inserts[SEARCH],
+                                     [new._asdict() for new, _ in migrated])
+                named = [t._asdict() for _, ts in migrated for t in ts]
+                self.con.executemany(self.inserts[TAG_NAMES], named)
+                self.con.executemany(self.inserts[TAGS], named)
+                self.con.executemany(self.inserts[LOG],
+                                     [r._asdict() for r in records])
+                last = {"last": rows[-1][0]}
+                self.con.execute(f"DELETE FROM {tags} WHERE id IN (SELECT id "
+                                 f"FROM {stuff} WHERE rowid <= :last)", last)
+                self.con.execute(f"DELETE FROM {stuff} WHERE rowid <= :last",
+                                 last)
+            done += len(rows)
+            seconds = (dt.now() - start).total_seconds()
+            report_progress(Progress(version, done, total, seconds))
+        # The old log stays as v{N}_log, it is the only history from before.
+        with self.con:
+            self.con.execute("BEGIN")
+            for name in (STUFF, TAGS):
+                self.con.execute(f"DROP TABLE IF EXISTS v{version}_{name}")
+
     def query(self, sql: str, params: Params) -> Cursor:
-        logging.debug(f"Executing SQL   :{sql}")
-        logging.debug(f"Executing PARAMS:{params}")
+        if self.trace:
+            logging.debug(f"Executing SQL   :{sql}")
+            logging.debug(f"Executing PARAMS:{params}")
         return self.con.execute(sql, params)
 
-    def tx(self, operations: list[Operation]) -> None:
+    def run(self, operation: Operation) -> None:
+        sql, params, *rows = operation
+        changed = self.query(sql, params).rowcount
+        if rows and changed != rows[0]:
+            raise sqlite3.IntegrityError(f"Changed {changed} rows, expected "
+                                         f"{rows[0]}: {sql}")
+
+    @contextmanager
+    def writing(self, head: Optional[Record] = None) -> Iterator[None]:
+        # The new head is only cached once its transaction has committed.
+        version = self.cached[0] if self.cached else -1
         with self.con:
-            logging.debug("Entered transaction.")
-            [self.query(*op) for op in operations]
+            yield
+            self.save_spots()
+        if head is not None:
+            self.cached = version, head
+
+    def tx(self, operations: list[Operation],
+           head: Optional[Record] = None) -> None:
+        with self.writing(head):
+            if self.trace:
+                logging.debug("Entered transaction.")
+            for op in operations:
+                self.run(op)
 
     def get_full_record(self, sn) -> tuple[Record, Stuff, Tags]:
-        row = self.query("SELECT log.*, stuff.*, group_concat(tags.tag) "
-                         "FROM log INNER JOIN stuff ON log.stuff = stuff.id "
-                         "LEFT JOIN tags ON stuff.id = tags.id "
-                         "WHERE log.sn = :sn",
-                         {"sn": sn}).fetchone()
-        stuff = Stuff(*row[6:9])
-        return (Record(*row[:6]), stuff, Tags.from_grouped(stuff.id, row[9]))
+        return full_record(self.query(f"{FULL_RECORD}WHERE log.sn = :sn",
+                                      {"sn": sn}).fetchone())
+
+    def stream(self, low: int, high: int) \
+            -> Generator[tuple[Record, Stuff, Tags], None, None]:
+        # One cursor in sn order, read in batches to keep memory flat.
+        cur = self.query(f"{FULL_RECORD}WHERE log.sn BETWEEN :low AND :high "
+                         "GROUP BY log.sn ORDER BY log.sn",
+                         {"low": low, "high": high})
+        try:
+            while rows := cur.fetchmany(self.verify_batch):
+                yield from (full_record(row) for row in rows)
+        finally:
+            cur.close()
+
+    def new_epochs(self, count: int = 1) -> list[Epoch]:
+        # Stuff ids follow the clock and never repeat. Each connection takes
+        # a block of them from the epochs table, so no other one uses it.
+        # Blocks start at what was asked for and double for callers that keep
+        # asking, so a short lived connection leaves no gap ahead of the clock.
+        start = max(self.next_epoch, Epoch.now())
+        if start + count - 1 > self.reserved:
+            size = max(count, min(2 * self.epoch_block, self.epoch_batch))
+            self.epoch_block = size
+            with self.con:
+                self.reserved = self.con.execute(self.inserts[EPOCHS], {
+                    "name": STUFF, "start": start, "size": size}).fetchone()[0]
+            start = self.reserved - size + 1
+        self.next_epoch = start + count
+        return [Epoch(start + i) for i in range(count)]
 
     def head(self) -> Record:
+        # Commits on this connection keep the cache current, data_version
+        # only moves when another connection commits.
+        version = self.con.execute("PRAGMA data_version").fetchone()[0]
+        if self.cached is None or self.cached[0] != version:
+            self.cached = version, self.load_head()
+        return self.cached[1]
+
+    def load_head(self) -> Record:
         cmd = "SELECT * FROM log ORDER BY sn DESC LIMIT 1"
-        return Record(*self.query(cmd, ()).fetchone())
+        return to_row(RecordRow, self.query(cmd, ()).fetchone())
 
-    def _verify(self, record: Record, stuff: Stuff,
-                tags: Tags) -> tuple[Record, Stuff, Tags]:
-        logging.debug(f"Verifying {record}, {stuff}")
+    def log_hash(self, sn: int) -> Optional[Digest]:
+        row = self.query("SELECT hash FROM log WHERE sn = :sn",
+                         {"sn": sn}).fetchone()
+        return Digest(row[0].hex()) if row else None
+
+    def mark(self, name: str) -> Optional[Mark]:
+        return to_row(MarkRow, self.query(f"SELECT * FROM {MARKS} "
+                                          "WHERE name = :name",
+                                          {"name": name}).fetchone())
+
+    def set_mark(self, name: str, record: Record) -> None:
+        if not self.profile.read_only:
+            with self.writing():
+                self.query(self.inserts[MARKS],
+                           Mark(name, record.sn, record.hash)._asdict())
+
+    def alert(self) -> Optional[str]:
+        failed = self.mark(FAILED)
+        return f"Integrity error at record {failed.sn}, found by a " \
+               "background check. Run 'verify' for details." if failed \
+            else None
+
+    def verify_on_open(self) -> None:
+        if self.strict:
+            self.verify()
+        else:
+            # Spot checks first, so their counts go in with the marks.
+            self.spot_check()
+            self.verify(QUICK_DEPTH)
+
+    def spot_check(self) -> int:
+        # Random records below the tail that verify(QUICK_DEPTH) covers,
+        # until spot_checks are done or spot_budget runs out.
+        head = self.load_head()
+        below = range(2, max(head.sn - QUICK_DEPTH, 1) + 1)
+        start, checks = dt.now(), 0
+        for sn in sample(below, min(self.spot_checks, len(below))):
+            try:
+                self.verify_range(sn, sn - 1)
+            except IntegrityError as err:
+                raise err
+            except Exception as exc:
+                raise IntegrityError(f"Unknown error {exc}")
+            checks += 1
+            if (dt.now() - start).total_seconds() > self.spot_budget:
+                break
+        if checks:
+            # Kept until the next write rather than committed on every open.
+            self.spotted.append(Spots(
+                int(dt.now().timestamp() // SECONDS_PER_DAY), checks,
+                head.sn, (dt.now() - start).total_seconds()))
+        return checks
+
+    def save_spots(self) -> None:
+        if self.spotted and not self.profile.read_only:
+            self.con.executemany(self.inserts[SPOTS],
+                                 [spots._asdict() for spots in self.spotted])
+        self.spotted = []
+
+    def coverage(self) -> Coverage:
+        days = dict(self.query(f"SELECT day, checks FROM {SPOTS}", ()))
+        for spots in self.spotted:
+            days[spots.day] = days.get(spots.day, 0) + spots.checks
+        return Coverage(sum(days.values()), len(days), self.head().sn)
+
+    def check(self) -> Optional[Sequence]:
+        # The open time verify, run later with the result kept in a mark.
+        try:
+            self.verify_on_open()
+            with self.con:
+                self.save_spots()
+            return None
+        except IntegrityError as err:
+            logging.error(f"Background check failed: {err}")
+        failed = self.audit() or self.head().sn
+        self.set_mark(FAILED, Record(failed, self.log_hash(failed) or
+                                     Digest("")))
+        return failed
+
+    def verified(self, head: Record) -> None:
+        self.set_mark(VERIFIED, head)
+        self.grow_merkle(head)
+
+    def node(self, level: int, pos: int) -> Optional[Digest]:
+        if level == 0:
+            return self.log_hash(pos + 1)
+        row = self.query(f"SELECT hash FROM {MERKLE} WHERE level = :level "
+                         "AND pos = :pos", {"level": level, "pos": pos})\
+            .fetchone()
+        return Digest(row[0].hex()) if row else None
+
+    def merkle_size(self) -> int:
+        mark = self.mark(MERKLE)
+        return mark.sn if mark else 0
+
+    def merkle_root(self, size: Optional[int] = None) -> Digest:
+        size = self.merkle_size() if size is None else size
+        return bag_peaks([self.node(*peak) or Digest("")
+                          for peak in merkle_peaks(size)])
+
+    def grow_merkle(self, head: Record) -> None:
+        # Only verified records are added, a pair of subtrees is hashed
+        # into their parent as soon as the right one is complete.
+        if self.profile.read_only:
+            return
+        with self.con:
+            # Read the size under the write lock, so that minds opened at the
+            # same time don't add the same nodes.
+            self.con.execute("BEGIN IMMEDIATE")
+            size = self.merkle_size()
+            if head.sn <= size:
+                return
+            peaks = [Node(level, pos, self.node(level, pos) or Digest(""))
+                     for level, pos in merkle_peaks(size)]
+            added = []
+            for sn, raw in self.query(
+                    "SELECT sn, hash FROM log WHERE sn > :size AND "
+                    "sn <= :head ORDER BY sn",
+                    {"size": size, "head": head.sn}).fetchall():
+                node = Node(0, sn - 1, Digest(raw.hex()))
+                while peaks and peaks[-1].level == node.level:
+                    left = peaks.pop()
+                    node = Node(node.level + 1, left.pos // 2,
+                                merkle_hash(left.hash, node.hash))
+                    added.append(node._asdict())
+                peaks.append(node)
+            root = bag_peaks([peak.hash for peak in peaks])
+            self.con.executemany(self.inserts[MERKLE], added)
+            self.query(self.inserts[MARKS],
+                       Mark(MERKLE, head.sn, root)._asdict())
+
+    def prove(self, sn: int) -> Optional[Proof]:
+        size = self.merkle_size()
+        if not 0 < sn <= size:
+            return None
+        index = sn - 1
+        peaks = merkle_peaks(size)
+        height = next(level for level, pos in peaks if index >> level == pos)
+        path = [self.node(level, (index >> level) ^ 1) or Digest("")
+                for level in range(height)]
+        hashes = [self.node(*peak) or Digest("") for peak in peaks]
+        return Proof(sn, size, self.log_hash(sn) or Digest(""), path, hashes,
+                     bag_peaks(hashes))
+
+    def _verify(self, parent: Record, record: Record, stuff: Stuff,
+                tags: Tags) -> None:
+        if self.trace:
+            logging.debug(f"Verifying {record}, {stuff}")
+        if record.parent() != parent.sn:
+            raise IntegrityError(f"Missing record\nRetrieved: {record}\n"
+                                 f"After: {parent}")
         is_active = record.new_state == Phase.ACTIVE
         tags = tags if is_active else Tags()
-        parent, p_stuff, p_tags = self.get_full_record(record.parent())
-        change = Change(parent, stuff, record.act(), record.stamp, tags)
+        change = Change(parent, stuff, record.act(), record.stamp, tags,
+                        record.algo)
         calc_hash = change.hash()
-        computed = f"{calc_hash} <- {change.canonical()}"
-        logging.debug(computed)
-        if calc_hash == record.hash:
-            logging.debug(f"Verified: {record}")
-        else:
+        if calc_hash != record.hash:
             raise IntegrityError(f"Hash mismatch\nRetrieved: {record}\n"
-                                 f"Computed: {computed}")
-        return parent, p_stuff, p_tags
+                                 f"Computed: {calc_hash} <- "
+                                 f"{change.canonical()}")
+        elif self.trace:
+            logging.debug(f"Verified: {record}")
+
+    def verify_range(self, top: int, stop: int) -> Record:
+        # Verifies the records after stop up to top, returns the one at stop.
+        records = self.stream(stop, top)
+        first = next(records, None)
+        if first is None or first[0].sn != stop:
+            raise IntegrityError(f"Missing record {stop}")
+        anchor = parent = first[0]
+        for record, stuff, tags in records:
+            self._verify(parent, record, stuff, tags)
+            parent = record
+        if parent.sn != top:
+            raise IntegrityError(f"Missing records after {parent}")
+        return anchor
+
+    def checkpoints(self) -> list[Checkpoint]:
+        points = to_rows(CheckpointRow, self.query(
+            f"SELECT * FROM {CHECKPOINTS} ORDER BY sn", ()))
+        for parent, point in zip([None] + points, points):
+            sealed = Checkpoint.after(parent, Record(point.sn, point.hash))
+            if sealed.seal != point.seal:
+                raise IntegrityError(f"Checkpoint seal mismatch at {point.sn}")
+        return points
+
+    def checkpoint(self, head: Record) -> None:
+        # Only called once the chain up to head has been verified.
+        points = self.checkpoints()
+        parent = points[-1] if points else None
+        start = (parent.sn if parent else 0) + self.checkpoint_every
+        added = []
+        for sn in range(start, head.sn + 1, self.checkpoint_every):
+            record = to_row(RecordRow, self.query(
+                "SELECT * FROM log WHERE sn = :sn", {"sn": sn}).fetchone())
+            parent = Checkpoint.after(parent, record)
+            added.append(parent._asdict())
+        if added:
+            with self.con:
+                self.con.executemany(self.inserts[CHECKPOINTS], added)
 
     def verify(self, depth: Optional[int] = None) -> None:
+        # Records up to the verified mark were checked on an earlier open.
         try:
-            head = self.head()
-            stop = max(head.sn - depth if depth else 1, 1)
-            record, stuff, tags = self.get_full_record(head.sn)
-            for i in range(head.sn, stop, -1):
-                record, stuff, tags = self._verify(record, stuff, tags)
+            head = self.load_head()
+            mark = self.mark(VERIFIED)
+            if mark and self.log_hash(mark.sn) != mark.hash:
+                logging.warning(f"Verified mark at {mark.sn} no longer "
+                                "matches the log, verifying it all.")
+                mark, depth = None, None
+            top = head
+            if mark and depth and head.sn - mark.sn > depth:
+                # Quick checks stay quick, they check the tail and carry the
+                # mark on by at most catch_up records each time.
+                self.verify_range(head.sn, head.sn - depth)
+                top = to_row(RecordRow, self.query(
+                    "SELECT * FROM log WHERE sn = :sn",
+                    {"sn": mark.sn + max(depth, self.catch_up)}).fetchone()) \
+                    or head
+            points = self.checkpoints() if depth is None and not mark else []
+            trusted: Optional[Union[Mark, Checkpoint]] = \
+                mark or (points[-1] if points else None)
+            stop = trusted.sn if trusted else \
+                max(head.sn - depth, 1) if depth else 1
+            anchor = self.verify_range(top.sn, stop)
+            if trusted and anchor.hash != trusted.hash:
+                raise IntegrityError(f"Chain mismatch\nRetrieved: "
+                                     f"{anchor}\nExpected: {trusted.hash}")
         except IntegrityError as err:
             raise err
         except Exception as exc:
             raise IntegrityError(f"Unknown error {exc}")
+        if depth is None and not self.profile.read_only:
+            self.checkpoint(head)
+        if (trusted or stop == 1) and (not mark or mark.sn != top.sn):
+            self.verified(top)
+
+    def rehash(self, algo: HashAlgo) -> int:
+        # Re-chains the whole log with algo in one transaction, each record
+        # is verified with its old hash first. Everything built from the old
+        # hashes is dropped and built again.
+        head = self.load_head()
+        old_parent = parent = Record()
+        updates = []
+        with self.con, closing(self.stream(1, head.sn)) as records:
+            for record, stuff, tags in records:
+                self._verify(old_parent, record, stuff, tags)
+                tags = tags if record.new_state == Phase.ACTIVE else Tags()
+                parent = Change(parent, stuff, record.act(), record.stamp,
+                                tags, algo).record()
+                old_parent = record
+                updates.append({"sn": parent.sn, "hash": parent.hash,
+                                "algo": algo})
+                if len(updates) >= self.verify_batch:
+                    self.con.executemany(f"UPDATE {LOG} SET hash = :hash, "
+                                         "algo = :algo WHERE sn = :sn",
+                                         updates)
+                    updates.clear()
+            self.con.executemany(f"UPDATE {LOG} SET hash = :hash, "
+                                 "algo = :algo WHERE sn = :sn", updates)
+            if parent.sn != head.sn:
+                raise IntegrityError(f"Missing records after {parent}")
+            for table in (CHECKPOINTS, MERKLE, MARKS):
+                self.con.execute(f"DELETE FROM {table}")
+        self.cached = None
+        self.hash_algo = algo
+        self.checkpoint(parent)
+        self.verified(parent)
+        return parent.sn
+
+    def first_failure(self, low: int, high: int) -> Optional[Sequence]:
+        parent = None
+        with closing(self.stream(max(low, 1), high)) as records:
+            for record, stuff, tags in records:
+                if parent:
+                    try:
+                        self._verify(parent, record, stuff, tags)
+                    except IntegrityError:
+                        return parent.next()
+                parent = record
+        if parent is None or parent.sn != high:
+            return Sequence(parent.next() if parent else max(low, 1))
+        return None
+
+    def audit(self, jobs: int = 1) -> Optional[Sequence]:
+        # A rewritten chain changes every hash after the first bad record, so
+        # the checkpoints it passed are found by bisecting them.
+        head = self.load_head()
+        try:
+            points = self.checkpoints()
+        except IntegrityError:
+            points = []
+        diverged = bisect_left(points, True, key=lambda point:
+                               self.log_hash(point.sn) != point.hash)
+        end = points[diverged].sn if diverged < len(points) else head.sn
+        # Each record only needs its stored parent, so ranges are independent.
+        ranges = [(low, min(low + self.audit_chunk, end))
+                  for low in range(0, end, self.audit_chunk)]
+        pool = ProcessPoolExecutor(jobs, initializer=open_auditor,
+                                   initargs=(str(self.path.resolve()),)) \
+            if jobs > 1 and self.path else None
+        results = pool.map(audit_range, ranges) if pool else \
+            (self.first_failure(*bounds) for bounds in ranges)
+        start = dt.now()
+        try:
+            for (low, high), failed in zip(ranges, results):
+                if failed:
+                    return failed
+                seconds = (dt.now() - start).total_seconds()
+                report_progress(Audited(high, end, seconds))
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+        if diverged < len(points):
+            # Rewritten consistently since the last checkpoint that matches,
+            # every record checks against its parent but not against the seal.
+            return Sequence(points[diverged - 1].sn + 1 if diverged else 1)
+        self.verified(head)
+        if not self.profile.read_only:
+            with self.con:
+                self.query(f"DELETE FROM {MARKS} WHERE name = :name",
+                           {"name": FAILED})
+        return None
+
+
+class Checker(threading.Thread):
+    # Runs Mind.check off the request path, when asked and on a schedule.
+    def __init__(self, filename: str | Path, profile: str = DURABLE,
+                 interval: float = 3600) -> None:
+        super().__init__(name="mind-checker", daemon=True)
+        self.filename = filename
+        self.profile = profile
+        self.interval = interval
+        self.wanted = threading.Event()
+        self.checked = threading.Event()
+
+    def request(self) -> None:
+        self.wanted.set()
+
+    def run(self) -> None:
+        while True:
+            self.wanted.wait(self.interval)
+            self.wanted.clear()
+            try:
+                with Mind(self.filename, profile=self.profile,
+                          background=True) as mind:
+                    mind.check()
+            except Exception as exc:
+                logging.error(f"Background check crashed: {exc}")
+            self.checked.set()
+
+
+class Write(NamedTuple):
+    # An add of content when stuff is None, otherwise stuff moving to state.
+    # With items it is a bulk add, which commits in batches of its own.
+    state: Phase
+    content: Optional[list[str]]
+    stuff: Optional[Stuff]
+    done: Future
+    items: Optional[list[list[str]]] = None
+
+    @classmethod
+    def add(cls, content: list[str]):
+        return cls(Phase.ACTIVE, content, None, Future())
+
+    @classmethod
+    def many(cls, items: list[list[str]]):
+        return cls(Phase.ACTIVE, None, None, Future(), items)
+
+    @classmethod
+    def update(cls, stuff: Stuff, state: Phase):
+        return cls(state, None, stuff, Future())
+
+
+def plan_write(mind: Mind, parent: Record,
+               write: Write) -> tuple[Record, list[Operation], Any]:
+    if write.stuff is None:
+        change = add_change(mind, parent, write.content or [], write.state,
+                            mind.new_epochs()[0])
+        record = change.record()
+        return record, add_ops(mind, change.stuff, change.tags, record), \
+            (change.stuff, change.tags)
+    # Re-read, the request may have loaded it before another write landed.
+    stuff = load_stuff(mind, write.stuff.id)
+    if stuff is None or stuff.state != write.stuff.state:
+        raise ValueError(f"Stuff with ID {write.stuff.id} has changed.")
+    record = state_change(mind, parent, stuff, write.state).record()
+    ops = state_ops(mind, [stuff], write.state)
+    ops.append((mind.inserts[LOG], record._asdict()))
+    return record, ops, state_message(write.stuff, write.state)
+
+
+def commit_writes(mind: Mind, writes: list[Write]) -> None:
+    # The records are chained in order and committed together, each write
+    # gets its result once the group is in.
+    for write in writes:
+        if write.items is not None:
+            try:
+                write.done.set_result(add_many(mind, write.items,
+                                               write.state))
+            except Exception as exc:
+                write.done.set_exception(exc)
+    writes = [write for write in writes if write.items is None]
+    if not writes:
+        return
+    parent = mind.head()
+    ops: list[Operation] = []
+    planned: list[tuple[Write, Any]] = []
+    for write in writes:
+        try:
+            parent, write_ops, result = plan_write(mind, parent, write)
+        except Exception as exc:
+            write.done.set_exception(exc)
+            continue
+        ops.extend(write_ops)
+        planned.append((write, result))
+    try:
+        mind.tx(ops, parent)
+    except sqlite3.Error as exc:
+        if len(planned) > 1:
+            # One bad write fails its group, so they go in one at a time.
+            for write, _ in planned:
+                commit_writes(mind, [write])
+        else:
+            for write, _ in planned:
+                write.done.set_exception(exc)
+        return
+    for write, result in planned:
+        write.done.set_result(result)
+
+
+class Writer(threading.Thread):
+    # The one thread that writes for the web app. Writes queue up while a
+    # group commits, then all those waiting go in the next transaction.
+    def __init__(self, filename: str | Path, profile: str = DURABLE,
+                 group: int = 256) -> None:
+        super().__init__(name="mind-writer", daemon=True)
+        self.filename = filename
+        self.profile = profile
+        self.group = group
+        self.pending: queue.Queue[Optional[Write]] = queue.Queue()
+        self.failed: Optional[Exception] = None
+
+    def submit(self, write: Write) -> Future:
+        self.pending.put(write)
+        if self.failed is not None:
+            self.fail_pending()
+        return write.done
+
+    def fail_pending(self) -> None:
+        # Once the writer is down nothing would ever answer what is queued.
+        while True:
+            try:
+                write = self.pending.get_nowait()
+            except queue.Empty:
+                return
+            if write is not None and self.failed is not None:
+                write.done.set_exception(self.failed)
+
+    def stop(self) -> None:
+        self.pending.put(None)
+        self.join()
+
+    def take(self) -> list[Optional[Write]]:
+        # Wait for one write, then take whatever else is already waiting.
+        writes = [self.pending.get()]
+        while len(writes) < self.group and not self.pending.empty():
+            writes.append(self.pending.get_nowait())
+        return writes
+
+    def run(self) -> None:
+        try:
+            mind = Mind(self.filename, profile=self.profile, background=True)
+        except Exception as exc:
+            logging.error(f"Writer could not open {self.filename}: {exc}")
+            self.failed = exc
+            self.fail_pending()
+            return
+        with mind:
+            running = True
+            while running:
+                writes = self.take()
+                running = None not in writes
+                group = [write for write in writes if write is not None]
+                if not group:
+                    continue
+                try:
+                    commit_writes(mind, group)
+                except Exception as exc:
+                    logging.error(f"Group commit crashed: {exc}")
+                    for write in group:
+                        if not write.done.done():
+                            write.done.set_exception(exc)
+
+
+def spawn_check(filename: str | Path,
+                profile: str = DURABLE) -> subprocess.Popen:
+    # A detached process, so the CLI can exit as soon as it has answered. It
+    # runs from the package's parent so that mind.cli imports from anywhere.
+    path = Path(filename).expanduser().resolve()
+    return subprocess.Popen([sys.executable, "-m", "mind.cli", "--db",
+                             str(path), "--profile", profile, "check"],
+                            cwd=Path(__file__).resolve().parent.parent,
+                            stdin=subprocess.DEVNULL,
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+auditor: Optional[Mind] = None
+
+
+def open_auditor(path: str) -> None:
+    global auditor
+    # The audit is the check, verifying on open would fail on a bad tail.
+    auditor = Mind(path, profile=READ_ONLY, background=True)
+
+
+def audit_range(bounds: tuple[int, int]) -> Optional[Sequence]:
+    assert auditor is not None, "Audit worker without a mind."
+    return auditor.first_failure(*bounds)
 
 
 def parse_item(args: str) -> list[int]:
-    return [int(arg) for arg in args.split(',')]
+    items: list[int] = []
+    for arg in args.split(','):
+        first, sep, last = arg.partition('-')
+        items.extend(range(int(first), int(last) + 1) if sep else [int(arg)])
+    return list(dict.fromkeys(items))
+
+
+def to_cursor(id: Epoch) -> str:
+    return repr(id)
+
+
+def from_cursor(cursor: Optional[str]) -> Optional[Epoch]:
+    try:
+        return Epoch(int(cursor, 16)) if cursor else None
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def stuff_table(state: Phase) -> str:
+    # Only the hot table holds active stuff, the rest may be archived.
+    return STUFF if state == Phase.ACTIVE else ALL_STUFF
+
+
+STUFF_CMDS: dict[tuple[bool, ...], str] = {}
+LATEST = Order.LATEST  # Enum lookups are slow.
+
+
+def stuff_cmd(order: Order, scan: Order, tag: bool, after: bool,
+              before: bool, full: bool = False, table: str = STUFF) -> str:
+    join1 = "INNER JOIN tags ON stuff.id = tags.id" if tag else ""
+    join2 = f"AND tags.tag_id = ({TAG_ID})" if tag else ""
+    ahead, behind = ("<", ">") if order == Order.LATEST else (">", "<")
+    seek1 = f"AND stuff.id {ahead} :after" if after else ""
+    seek2 = f"AND stuff.id {behind} :before" if before else ""
+    body = FULL_BODY if full else PREVIEW_BODY
+    return f"SELECT stuff.id, {body}, stuff.state FROM {table} AS stuff " \
+           f"{join1} " \
+           f"WHERE stuff.state = :state {join2} {seek1} {seek2} " \
+           f"ORDER BY stuff.id {scan.value} LIMIT :limit OFFSET :offset"
+
+
+class Page(NamedTuple):
+    stuff: list[Stuff]
+    after: Optional[str] = None
+    before: Optional[str] = None
 
 
 class QueryStuff(NamedTuple):
@@ -296,22 +1750,133 @@ class QueryStuff(NamedTuple):
     offset: int = 0
     state: Phase = Phase.ACTIVE
     tag: Optional[str] = None
+    after: Optional[Epoch] = None
+    before: Optional[Epoch] = None
+    full: bool = False  # Packed bodies are listed by their preview.
+
+    def scan(self) -> Order:
+        # Seeking backwards from a cursor reads the rows closest to it first.
+        backwards = self.before is not None and self.after is None
+        return self.order.flip() if backwards else self.order
 
     def cmd(self):
-        join1 = "INNER JOIN tags ON stuff.id = tags.id" if self.tag else ""
-        join2 = "AND tags.tag = :tag" if self.tag else ""
-        return f"SELECT stuff.id, stuff.body FROM stuff {join1} "\
-               f"WHERE stuff.state = :state {join2} " \
-               f"ORDER BY stuff.id {self.order.value} LIMIT :limit OFFSET " \
-               f":offset"
+        # Keyed on plain values, hashing the enums costs more than the format.
+        key = (self.order is LATEST, bool(self.tag), bool(self.after),
+               bool(self.before), self.full, self.state == ACTIVE)
+        try:
+            return STUFF_CMDS[key]
+        except KeyError:
+            cmd = STUFF_CMDS[key] = stuff_cmd(
+                self.order, self.scan(), *key[1:5], stuff_table(self.state))
+            return cmd
 
     def fetchall(self, mind: Mind) -> list[Stuff]:
         cur = mind.query(self.cmd(), self._asdict())
-        return [Stuff(*row) for row in cur.fetchall()]
+        rows = to_rows(StuffRow, cur)
+        return rows if self.scan() == self.order else rows[::-1]
+
+    def page(self, mind: Mind) -> Page:
+        rows = self._replace(limit=self.limit + 1).fetchall(mind)
+        more = len(rows) > self.limit
+        if self.scan() == self.order:
+            rows = rows[:self.limit]
+            after, before = more, bool(self.after or self.offset)
+        else:
+            rows = rows[max(len(rows) - self.limit, 0):]
+            after, before = True, more
+        return Page(rows, to_cursor(rows[-1].id) if rows and after else None,
+                    to_cursor(rows[0].id) if rows and before else None)
 
     def fetchone(self, mind: Mind) -> Optional[Stuff]:
         row = mind.query(self.cmd(), self._asdict()).fetchone()
-        return Stuff(*row) if row else None
+        return to_row(StuffRow, row)
+
+
+@lru_cache
+def positions_cmd(order: Order, runs: int, table: str = STUFF) -> str:
+    # Each run of positions skips along the (state, id) index only, the
+    # bodies are looked up for the rows that are actually picked.
+    pick = f"SELECT {{0}} AS run, id, {FULL_BODY}, state FROM {table} AS " \
+           "stuff WHERE id IN " \
+           f"(SELECT id FROM {table} WHERE state = :state ORDER BY id {{1}} " \
+           "LIMIT :count{0} OFFSET :first{0} - 1)"
+    picks = [pick.format(i, order.value) for i in range(runs)]
+    return f"{' UNION ALL '.join(picks)} ORDER BY run, id {order.value}"
+
+
+class QueryPositions(NamedTuple):
+    positions: list[int]
+    order: Order = Order.LATEST
+    state: Phase = Phase.ACTIVE
+
+    def runs(self) -> list[list[int]]:
+        runs: list[list[int]] = []
+        for position in sorted(p for p in set(self.positions) if p > 0):
+            if runs and sum(runs[-1]) == position:
+                runs[-1][1] += 1
+            else:
+                runs.append([position, 1])
+        return runs
+
+    def cmd(self, runs: int):
+        return positions_cmd(self.order, runs, stuff_table(self.state))
+
+    def fetch(self, mind: Mind) -> dict[int, Stuff]:
+        found: dict[int, Stuff] = {}
+        runs = self.runs()
+        for chunk in range(0, len(runs), MAX_COMPOUND):
+            batch = runs[chunk:chunk + MAX_COMPOUND]
+            params: dict = {"state": self.state}
+            for i, (first, count) in enumerate(batch):
+                params.update({f"first{i}": first, f"count{i}": count})
+            seen = [0] * len(batch)
+            for row in mind.query(self.cmd(len(batch)), params):
+                run = row[0]
+                found[batch[run][0] + seen[run]] = to_row(StuffRow, row[1:])
+                seen[run] += 1
+        return found
+
+
+def search_terms(terms: str) -> str:
+    # Quote every word so FTS5 syntax in the terms matches literally, a
+    # trailing * still asks for a prefix.
+    words: list[str] = []
+    for word in terms.split():
+        quoted = '"' + word.rstrip("*").replace('"', '""') + '"'
+        if quoted != '""':
+            words.append(quoted + "*" if word.endswith("*") else quoted)
+    return SPACE.join(words)
+
+
+@lru_cache
+def search_cmd(tag: bool, full: bool = False, table: str = STUFF) -> str:
+    join1 = "INNER JOIN tags ON stuff.id = tags.id" if tag else ""
+    join2 = f"AND tags.tag_id = ({TAG_ID})" if tag else ""
+    body = FULL_BODY if full else PREVIEW_BODY
+    return f"SELECT stuff.id, {body}, stuff.state FROM {SEARCH} " \
+           f"INNER JOIN {table} AS stuff ON stuff.id = {SEARCH}.rowid " \
+           f"{join1} " \
+           f"WHERE {SEARCH} MATCH :match AND stuff.state = :state {join2} " \
+           f"ORDER BY {SEARCH}.rank LIMIT :limit OFFSET :offset"
+
+
+class QuerySearch(NamedTuple):
+    terms: str
+    limit: int = PAGE_SIZE + 1
+    offset: int = 0
+    state: Phase = Phase.ACTIVE
+    tag: Optional[str] = None
+    full: bool = False
+
+    def cmd(self):
+        return search_cmd(bool(self.tag), self.full, stuff_table(self.state))
+
+    def fetchall(self, mind: Mind) -> list[Stuff]:
+        match = search_terms(self.terms)
+        if not match:
+            return []
+        cur = mind.query(self.cmd(), self._asdict() | {"match": match})
+        return to_rows(StuffRow, cur)
 
 
 class QueryTags(NamedTuple):
@@ -320,14 +1885,28 @@ class QueryTags(NamedTuple):
 
     def cmd(self):
         if self.id:
-            return "SELECT * FROM tags WHERE id=:id ORDER BY tag ASC"
+            return "SELECT tags.id, name FROM tags INNER JOIN tag_names " \
+                   "USING (tag_id) WHERE tags.id=:id ORDER BY name ASC"
         else:
-            return "SELECT MAX(id), tag FROM tags GROUP BY tag " \
-                   "ORDER BY id DESC LIMIT :limit"
+            return "SELECT latest, name FROM tag_stats INNER JOIN " \
+                   "tag_names USING (tag_id) ORDER BY latest DESC, name " \
+                   "LIMIT :limit"
 
     def execute(self, mind: Mind) -> Tags:
         cur = mind.query(self.cmd(), self._asdict())
-        return Tags([Tag(*row) for row in cur.fetchall()])
+        return Tags(to_rows(TagRow, cur))
+
+
+class QueryTagCounts(NamedTuple):
+    limit: int = 15
+
+    def cmd(self):
+        return "SELECT name, latest, active, total FROM tag_stats " \
+               "INNER JOIN tag_names USING (tag_id) WHERE active > 0 " \
+               "ORDER BY active DESC, name LIMIT :limit"
+
+    def execute(self, mind: Mind) -> list[TagCount]:
+        return to_rows(TagCountRow, mind.query(self.cmd(), self._asdict()))
 
 
 def build_create_table_cmd(table_name: str, schema) -> str:
@@ -335,7 +1914,92 @@ def build_create_table_cmd(table_name: str, schema) -> str:
     columns = [SPACE.join((col[0], TYPE_MAP[col[1]](col[0]))) for col in cols]
     const = schema.constraints()
     c_clauses = ", " + ", ".join(const) if const else ""
-    return f"CREATE TABLE {table_name}({', '.join(columns)}{c_clauses})"
+    options = " WITHOUT ROWID" if schema.without_rowid() else ""
+    return f"CREATE TABLE {table_name}({', '.join(columns)}{c_clauses})" \
+           f"{options}"
+
+
+def build_create_index_cmd(table_name: str, columns: tuple[str, ...],
+                           database: Optional[str] = None) -> str:
+    name = "_".join((table_name,) + columns)
+    prefix = f"{database}." if database else ""
+    return f"CREATE INDEX IF NOT EXISTS {prefix}{name} " \
+           f"ON {table_name}({', '.join(columns)})"
+
+
+def build_create_index_cmds(table_name: str, schema,
+                            database: Optional[str] = None) -> list[str]:
+    return [build_create_index_cmd(table_name, c, database)
+            for c in schema.indexes()]
+
+
+def attached(con: sqlite3.Connection) -> list[str]:
+    return [row[1] for row in con.execute("PRAGMA database_list")]
+
+
+def legacy_tables(con: sqlite3.Connection) -> dict[str, str]:
+    cur = con.execute("SELECT name, sql FROM sqlite_master WHERE type = "
+                      "'table' AND name IN (:stuff, :tags, :log)",
+                      {"stuff": STUFF, "tags": TAGS, "log": LOG})
+    return dict(cur.fetchall())
+
+
+def legacy_versions(con: sqlite3.Connection) -> list[int]:
+    cur = con.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                      "AND name GLOB 'v[0-9]_stuff'")
+    return sorted(int(row[0][1]) for row in cur.fetchall())
+
+
+def schema_version(con: sqlite3.Connection) -> int:
+    version = con.execute("PRAGMA user_version").fetchone()[0]
+    if version:
+        return version
+    tables = legacy_tables(con)
+    if STUFF not in tables:
+        return 0
+    elif LOG not in tables:
+        return 1
+    columns = [row[1] for row in con.execute(f"PRAGMA table_info({LOG})")]
+    if "new_state" in columns:
+        return LEGACY_VERSION
+    elif "prior_state" in columns:
+        return 6
+    elif "hash" in columns:
+        return 5 if "CHECK" in tables[STUFF] else 4
+    else:
+        return 3 if "stuff" in columns else 2
+
+
+def legacy_epoch(value: Union[int, str]) -> Epoch:
+    try:
+        return Epoch(int(value))
+    except ValueError:
+        return Epoch(dt.fromisoformat(str(value)).timestamp() * MICROS)
+
+
+def legacy_stuff(version: int, id: Union[int, str], body: str, state: int,
+                 grouped: Optional[str]) -> tuple[Stuff, Tags]:
+    # Before v5 the phases were numbered from -1 (see mind/README.md).
+    try:
+        phase = Phase(int(state) + 2 if version < 5 else int(state))
+    except ValueError:
+        raise IntegrityError(f"Unknown state {state} for stuff {id}")
+    epoch = legacy_epoch(id)
+    return Stuff(epoch, body, phase), Tags.from_grouped(epoch, grouped)
+
+
+def legacy_changes(parent: Record, stuff: Stuff, tags: Tags,
+                   algo: HashAlgo = DEFAULT_ALGO) -> list[Change]:
+    # Old logs can't be verified against today's canonical form, so each
+    # item is replayed as an ADD plus one transition to its current phase.
+    added = Change(parent, stuff, Transition.ADD, stuff.id, tags, algo)
+    if stuff.state == Phase.ACTIVE:
+        return [added]
+    try:
+        act = Transition((Phase.ACTIVE, stuff.state))
+    except ValueError:
+        raise IntegrityError(f"Can't migrate stuff {stuff!r}")
+    return [added, Change(added.record(), stuff, act, stuff.id, Tags(), algo)]
 
 
 def is_tag(word: str) -> Optional[str]:
@@ -355,9 +2019,9 @@ def extract_tags(raw_line: str) -> tuple[str, set[str]]:
     return SPACE.join(content), tags
 
 
-def new_stuff(hunks: list[str], state: Phase,
-              joiner=NEWLINE) -> tuple[Stuff, Tags, Epoch]:
-    now = Epoch.now()
+def new_stuff(hunks: list[str], state: Phase, joiner=NEWLINE,
+              now: Optional[Epoch] = None) -> tuple[Stuff, Tags, Epoch]:
+    now = Epoch.now() if now is None else now
     cleaned: list[str] = []
     all_tags: set[str] = set()
     for hunk in hunks:
@@ -403,43 +2067,131 @@ def do_list(mind: Mind, args: argparse.Namespace) -> list[str]:
     order, filter_arg = order_and_filter(args)
     filter = parse_filter(filter_arg)
     logging.debug(f"Listing {order.name} filter: {filter}")
-    offset = (args.page - 1) * args.num
-    fetched = QueryStuff(order=order, tag=filter.val, offset=offset,
-                         limit=args.num+1).fetchall(mind)
+    after = from_cursor(getattr(args, "after", None))
+    before = from_cursor(getattr(args, "before", None))
+    offset = 0 if after or before else (args.page - 1) * args.num
+    page = QueryStuff(order=order, tag=filter.val, offset=offset,
+                      limit=args.num, after=after, before=before).page(mind)
     output = [f" # Currently minding [{order.name.lower()}] [{filter}] "
               f"[num={args.num}]...", H_RULE]
-    if fetched:
-        for index, row in enumerate(fetched[:args.num], 1):
+    if page.before:
+        output.append(f"    And before... (--before {page.before})")
+    if page.stuff:
+        for index, row in enumerate(page.stuff, 1):
             output.append(f" {index}. {row}")
     else:
         output.append("  Hmm, couldn't find anything here.")
-    if len(fetched) > args.num:
-        output.append("    And more...")
+    if page.after:
+        output.append(f"    And more... (--after {page.after})")
     tags = ", ".join([t.tag for t in QueryTags(id=None).execute(mind)])
     shortened = shorten(f"Latest tags: {tags}", width=70,
                         placeholder=" ...")
     return output + [H_RULE, "  " + shortened, H_RULE]
 
 
+def do_tags(mind: Mind, args: argparse.Namespace) -> list[str]:
+    counts = QueryTagCounts(limit=args.num).execute(mind)
+    output = [f" # Tags on active stuff [num={args.num}]...", H_RULE]
+    output.extend(f" {count}" for count in counts)
+    if not counts:
+        output.append("  Hmm, couldn't find anything here.")
+    return output + [H_RULE]
+
+
+def do_archive(mind: Mind, args: argparse.Namespace) -> list[str]:
+    before = Epoch(Epoch.now() - args.days * 24 * 60 * 60 * MICROS)
+    moved = mind.archive(before)
+    return [f"Archived {moved} done and forgotten items from before {before} "
+            f"to {mind.archive_path()}"]
+
+
+def do_search(mind: Mind, args: argparse.Namespace) -> list[str]:
+    terms = SPACE.join(args.search)
+    state = Phase[args.phase.upper()]
+    logging.debug(f"Searching {state.name} for: {terms}")
+    rows = QuerySearch(terms, limit=args.num + 1, offset=(args.page - 1) *
+                       args.num, state=state, tag=args.tag).fetchall(mind)
+    output = [f" # Searching [{state.name.lower()}] for [{terms}] "
+              f"[num={args.num}]...", H_RULE]
+    if rows:
+        output.extend(f" * {row}" for row in rows[:args.num])
+    else:
+        output.append("  Hmm, couldn't find anything here.")
+    if len(rows) > args.num:
+        output.append(f"    And more... (--page {args.page + 1})")
+    return output + [H_RULE]
+
+
+def state_change(mind: Mind, parent: Record, stuff: Stuff,
+                 new_state: Phase) -> Change:
+    # Changes to an active phase hash the tags, as an add does.
+    tags = QueryTags(id=stuff.id).execute(mind) \
+        if new_state == Phase.ACTIVE else Tags()
+    change = Change(parent, stuff, Transition((stuff.state, new_state)),
+                    Epoch.now(), tags, mind.hash_algo)
+    if mind.trace:
+        logging.debug(f"Canonical update: {change.canonical()}")
+    return change
+
+
+def state_ops(mind: Mind, stuffs: list[Stuff],
+              new_state: Phase) -> list[Operation]:
+    # Each row must still be in the phase its record moves it from.
+    params = {"ids": json.dumps([stuff.id for stuff in stuffs])}
+    ops: list[Operation] = []
+    for old in sorted({stuff.state for stuff in stuffs}):
+        ids = [stuff.id for stuff in stuffs if stuff.state == old]
+        ops.append((f"UPDATE {STUFF} SET state = :state WHERE state = :old "
+                    f"AND id {IN_IDS}", {"ids": json.dumps(ids), "old": old,
+                                         "state": new_state}, len(ids)))
+    if new_state == Phase.ACTIVE and mind.reattach():
+        ops[:0] = [(f"INSERT OR IGNORE INTO main.{STUFF} SELECT * FROM "
+                    f"{ARCHIVE}.{STUFF} WHERE id {IN_IDS}", params),
+                   (f"DELETE FROM {ARCHIVE}.{STUFF} WHERE id {IN_IDS}",
+                    params)]
+    return ops
+
+
+def state_message(stuff: Stuff, new_state: Phase) -> str:
+    return f"{new_state.name.capitalize()}: {stuff}"
+
+
+def update_states(mind: Mind, stuffs: list[Stuff],
+                  new_state: Phase) -> list[str]:
+    # One head read and one transaction for the lot, the records are chained
+    # in memory and the stuff rows move with one statement.
+    parent = mind.head()
+    records = []
+    for stuff in stuffs:
+        parent = state_change(mind, parent, stuff, new_state).record()
+        records.append(parent._asdict())
+    ops = state_ops(mind, stuffs, new_state)
+    with mind.writing(parent):
+        for op in ops:
+            mind.run(op)
+        mind.con.executemany(mind.inserts[LOG], records)
+    return [state_message(stuff, new_state) for stuff in stuffs]
+
+
 def update_state(old_stuff: Stuff, mind: Mind, new_state: Phase) -> str:
-    change = Change(mind.head(), old_stuff,
-                    Transition((old_stuff.state, new_state)), Epoch.now())
-    logging.debug(f"Canonical update: {change.canonical()}")
-    rcd = change.record()
-    ops: list[Operation] = [("UPDATE stuff SET state=:state WHERE id=:id",
-                             {"id": old_stuff.id, "state": new_state}),
-                            (insert("log", rcd), rcd._asdict())]
-    mind.tx(ops)
-    return f"{new_state.name.capitalize()}: {old_stuff}"
+    return update_states(mind, [old_stuff], new_state)[0]
+
+
+def load_stuff(mind: Mind, id: Epoch) -> Optional[Stuff]:
+    return to_row(StuffRow, mind.query(
+        f"SELECT id, {FULL_BODY}, state FROM {ALL_STUFF} AS stuff "
+        "WHERE id = :id", {"id": id}).fetchone())
 
 
 def find_by_ids(mind: Mind, id_arg: str) -> tuple[list[Stuff], list[str]]:
-    found: list[Stuff] = []
-    not_found: list[str] = []
-    for id in parse_item(id_arg):
-        stuff = QueryStuff(limit=1, offset=id-1).fetchone(mind)
-        fail_msg = f"Stuff with ID {id} not found."
-        found.append(stuff) if stuff else not_found.append(fail_msg)
+    if tag := is_tag(id_arg):
+        tagged = QueryStuff(limit=-1, tag=tag, full=True).fetchall(mind)
+        return tagged, [] if tagged else [f"No stuff tagged #{tag}."]
+    ids = parse_item(id_arg)
+    by_position = QueryPositions(ids).fetch(mind)
+    found = [by_position[id] for id in ids if id in by_position]
+    not_found = [f"Stuff with ID {id} not found." for id in ids
+                 if id not in by_position]
     return found, not_found
 
 
@@ -462,7 +2214,7 @@ def prepare_change(mind: Mind, id_arg: str,
 def do_forget(mind: Mind, args: argparse.Namespace) -> list[str]:
     changes, not_found = prepare_change(mind, args.forget, "forget")
     if changes:
-        return [update_state(stuff, mind, Phase.HIDDEN) for stuff in changes]
+        return update_states(mind, changes, Phase.HIDDEN)
     else:
         return not_found
 
@@ -470,55 +2222,107 @@ def do_forget(mind: Mind, args: argparse.Namespace) -> list[str]:
 def do_tick(mind: Mind, args: argparse.Namespace) -> list[str]:
     changes, not_found = prepare_change(mind, args.tick, "tick")
     if changes:
-        return [update_state(stuff, mind, Phase.DONE) for stuff in changes]
+        return update_states(mind, changes, Phase.DONE)
     else:
         return not_found
 
 
 def do_show(mind: Mind, args: argparse.Namespace) -> list[str]:
     output = []
-    for id in parse_item(args.show):
-        rows = QueryStuff(limit=1, offset=id-1).fetchall(mind)
-        any(map(lambda r: logging.debug(f"Returned: {r.__repr__()}"), rows))
-        if rows:
-            output.extend(rows[0].show(QueryTags(id=rows[0].id).execute(mind)))
+    ids = parse_item(args.show)
+    by_position = QueryPositions(ids).fetch(mind)
+    for id in ids:
+        if id in by_position:
+            stuff = by_position[id]
+            logging.debug(f"Returned: {stuff!r}")
+            output.extend(stuff.show(QueryTags(id=stuff.id).execute(mind)))
         else:
             output.append(f"Stuff [{id}] not found.")
     return output
 
 
-def hist_row(row: tuple[int, str, Epoch, Epoch, Phase, Phase, str,
-                        Optional[str]]) -> str:
-    stuff = Stuff(id=row[2], body=row[6], state=row[5]).preview()
-    tags = "Tags [{}]".format(row[7] or " ")
-    command = Transition((row[4], row[5]))
-    return f"{row[0]}. {row[1][:6]} {command:>7} {row[3]} -> {stuff} {tags}"
+def hist_row(row: tuple) -> str:
+    # The log columns, then the body preview and the grouped tags.
+    rcd = to_row(RecordRow, row[:RECORD_WIDTH])
+    stuff = Stuff(id=rcd.stuff, body=row[RECORD_WIDTH],
+                  state=rcd.new_state).preview()
+    tags = "Tags [{}]".format(row[RECORD_WIDTH + 1] or " ")
+    return f"{rcd.sn}. {rcd.hash[:6]} {rcd.act():>7} {rcd.stamp} -> " \
+           f"{stuff} {tags}"
 
 
 def do_history(mind: Mind, args: argparse.Namespace) -> list[str]:
-    cur = mind.query("SELECT log.*, stuff.body, group_concat(tags.tag) "
-                     "FROM log INNER JOIN stuff ON log.stuff = stuff.id "
-                     "LEFT JOIN tags ON stuff.id = tags.id "
+    cur = mind.query(f"SELECT log.*, {logged(PREVIEW_BODY)}, "
+                     f"group_concat(tag_names.name) FROM log {LOGGED}"
                      "GROUP BY log.sn ORDER BY log.sn DESC "
                      "LIMIT :limit OFFSET :offset ",
                      {"offset": (args.page - 1) * args.num, "limit": args.num})
     return [hist_row(row) for row in cur.fetchall()]
 
 
+def add_change(mind: Mind, parent: Record, content: list[str],
+               state: Phase = Phase.ACTIVE,
+               now: Optional[Epoch] = None) -> Change:
+    stuff, tags, timestamp = new_stuff(content, state, now=now)
+    change = Change(parent, stuff, Transition((Phase.ABSENT, state)),
+                    timestamp, tags, mind.hash_algo)
+    if mind.trace:
+        logging.debug(f"Adding: {stuff.preview()} tags:{tags}")
+        logging.debug(f"Canonical change: {change.canonical()}")
+    return change
+
+
+def add_ops(mind: Mind, stuff: Stuff, tags: Tags,
+            record: Record) -> list[Operation]:
+    if mind.trace:
+        logging.debug(f"New record: {record}")
+    ops: list[Operation] = [(mind.inserts[name], t._asdict()) for t in tags
+                            for name in (TAG_NAMES, TAGS)]
+    ops[:0] = [(mind.inserts[STUFF], PackedStuff.pack(stuff)._asdict()),
+               (mind.inserts[SEARCH], stuff._asdict())]
+    ops.append((mind.inserts[LOG], record._asdict()))
+    return ops
+
+
 def add_content(mind: Mind, content: list[str], state: Phase = Phase.ACTIVE,
                 parent: Optional[Record] = None) -> tuple[Stuff, Tags]:
-    stuff, tags, timestamp = new_stuff(content, state)
-    logging.debug(f"Adding: {stuff.preview()} tags:{tags}")
-    change = Change(mind.head() if parent is None else parent, stuff,
-                    Transition((Phase.ABSENT, state)), timestamp, tags)
-    logging.debug(f"Canonical change: {change.canonical()}")
+    change = add_change(mind, mind.head() if parent is None else parent,
+                        content, state, mind.new_epochs()[0])
     record = change.record()
-    logging.debug(f"New record: {record}")
-    ops: list[Operation] = [(insert(TAGS, t), t._asdict()) for t in tags]
-    ops.insert(0, (insert(STUFF, stuff), stuff._asdict()))
-    ops.append((insert("log", record), record._asdict()))
-    mind.tx(ops)
-    return stuff, tags
+    mind.tx(add_ops(mind, change.stuff, change.tags, record), record)
+    return change.stuff, change.tags
+
+
+def add_many(mind: Mind, items: Iterable[list[str]],
+             state: Phase = Phase.ACTIVE) -> list[tuple[Stuff, Tags]]:
+    # The head is read once and the chain is carried on in memory, each
+    # batch goes in with executemany in a single transaction.
+    parent = mind.head()
+    act = Transition((Phase.ABSENT, state))
+    added: list[tuple[Stuff, Tags]] = []
+    items = iter(items)
+    while batch := list(islice(items, mind.add_batch)):
+        done = len(added)
+        records = []
+        for hunks, now in zip(batch, mind.new_epochs(len(batch))):
+            stuff, tags, timestamp = new_stuff(hunks, state, now=now)
+            parent = Change(parent, stuff, act, timestamp, tags,
+                            mind.hash_algo).record()
+            records.append(parent._asdict())
+            added.append((stuff, tags))
+        if mind.trace:
+            logging.debug(f"Adding {len(batch)} stuff up to: {parent}")
+        new = added[done:]
+        tag_rows = [tag._asdict() for _, tags in new for tag in tags]
+        with mind.writing(parent):
+            mind.con.executemany(mind.inserts[STUFF], (
+                PackedStuff.pack(stuff)._asdict() for stuff, _ in new))
+            mind.con.executemany(mind.inserts[SEARCH],
+                                 (stuff._asdict() for stuff, _ in new))
+            mind.con.executemany(mind.inserts[TAG_NAMES], tag_rows)
+            mind.con.executemany(mind.inserts[TAGS], tag_rows)
+            mind.con.executemany(mind.inserts[LOG], records)
+    return added
 
 
 def get_content(args: argparse.Namespace) -> list[str]:
@@ -531,10 +2335,80 @@ def get_content(args: argparse.Namespace) -> list[str]:
 
 
 def do_add(mind: Mind, args: argparse.Namespace) -> list[str]:
+    if getattr(args, "per_line", False):
+        lines = get_content(args)
+        added = add_many(mind, ([line] for line in lines if line.strip()))
+        return [f"Added {len(added)} stuff."]
     stuff, tags = add_content(mind, get_content(args))
     return [f"Added {stuff} {tags.canonical()}"]
 
 
+def first_difference(mind: Mind, other: Mind) -> Optional[Sequence]:
+    # Equal subtrees are skipped whole, so this is O(log n) lookups.
+    size = min(mind.merkle_size(), other.merkle_size())
+    for level, pos in merkle_peaks(size):
+        if mind.node(level, pos) != other.node(level, pos):
+            while level:
+                level, pos = level - 1, pos * 2
+                if mind.node(level, pos) == other.node(level, pos):
+                    pos += 1
+            return Sequence(pos + 1)
+    return None
+
+
+def do_root(mind: Mind, args: argparse.Namespace) -> list[str]:
+    size = mind.merkle_size()
+    output = [f"Root of {size} verified records: {mind.merkle_root(size)}"]
+    if args.compare:
+        if not Path(args.compare).expanduser().exists():
+            return output + [f"No mind at {args.compare}."]
+        with Mind(args.compare, profile=READ_ONLY, background=True) as other:
+            diff = first_difference(mind, other)
+            shared = min(size, other.merkle_size())
+            output.append(f"Minds differ from record {diff}." if diff else
+                          f"Minds match over {shared} records.")
+    return output
+
+
+def do_proof(mind: Mind, args: argparse.Namespace) -> list[str]:
+    if args.check:
+        try:
+            proof = Proof.parse(args.check)
+        except (ValueError, TypeError) as err:
+            return [f"Not a proof: {err}"]
+        ours = proof.size <= mind.merkle_size() and \
+            mind.merkle_root(proof.size) == proof.root
+        return [f"Record {proof.sn} is in this mind." if proof.check() and ours
+                else f"Proof for record {proof.sn} does not match."]
+    proof = mind.prove(int(args.proof))
+    return [str(proof)] if proof else \
+        [f"Record {args.proof} is not verified yet, try 'verify'."]
+
+
+def do_check(mind: Mind, args: argparse.Namespace) -> list[str]:
+    failed = mind.check()
+    return [f"Integrity error at record {failed}."] if failed else \
+        [f"Verified up to record {mind.head().sn}.", str(mind.coverage())]
+
+
+def do_rehash(mind: Mind, args: argparse.Namespace) -> list[str]:
+    algo = HashAlgo[args.algo.upper()]
+    start = dt.now()
+    done = mind.rehash(algo)
+    seconds = (dt.now() - start).total_seconds()
+    return [f"Rehashed {done} records with {algo.name} in {seconds:.1f}s."]
+
+
+def do_verify(mind: Mind, args: argparse.Namespace) -> list[str]:
+    start = dt.now()
+    failed = mind.audit(jobs=args.jobs)
+    if failed:
+        return [f"Integrity error at record {failed}."]
+    done = mind.head().sn
+    seconds = (dt.now() - start).total_seconds()
+    return [str(Audited(done, done, seconds))]
+
+
 def setup_logging(verbose: bool = False):
     fmt = "%(levelname)s: %(message)s" if verbose else "%(message)s"
     lvl = logging.DEBUG if verbose else logging.INFO
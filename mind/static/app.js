@@ -4,11 +4,16 @@ TAGS = '/tags'
 COUNTERS = {}
 
 async function apiCall(path, query) {
-    return (await fetch(path, {
+    const response = await fetch(path, {
         method: 'POST',
         headers: {'Content-Type': 'application/json'},
         body: JSON.stringify(query)
-    })).json()
+    })
+    const warning = response.headers.get('X-Mind-Alert')
+    if (warning) {
+        alert(warning)
+    }
+    return response.json()
 }
 
 function buildItem(tagName, record) {
@@ -20,7 +25,7 @@ function buildItem(tagName, record) {
     input.id = `${id}-${tagName}-input`
     input.onchange = async (e) =>  {
         operation = input.checked ? 'tick' : 'untick'
-        await apiCall(STUFF, {[operation]: {'id': record[0], 'body': record[1]}})
+        await apiCall(STUFF, {[operation]: {'id': record[0]}})
     }
     label.appendChild(document.createTextNode(record[1]));
     label.id = `${id}-${tagName}-label`
@@ -49,7 +54,7 @@ function linkEnterKey(input, button) {
 }
 
 async function addArticle(tagName) {
-    const items = await apiCall(STUFF, {'query': {'tag': tagName}});
+    const items = (await apiCall(STUFF, {'query': {'tag': tagName}})).stuff;
     if (items.length === 0) {
         return false;
     }
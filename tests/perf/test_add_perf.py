@@ -0,0 +1,32 @@
+from tempfile import NamedTemporaryFile
+from timeit import Timer
+from unittest import TestCase
+
+from mind.mind import DURABLE, Mind, add_content, add_many
+from tests import setup_context, word
+
+
+class TestAddPerf(TestCase):
+    profile = DURABLE
+    SINGLE = 500
+    BULK = 50_000
+
+    def setUp(self):
+        tmp = setup_context(self, NamedTemporaryFile(suffix='.db'))
+        self.sesh = setup_context(self, Mind(tmp.name, profile=self.profile))
+        self.lines = [[f"{word()} {word()} #tag{i % 20}"]
+                      for i in range(self.BULK)]
+
+    def test_bulk_add(self):
+        # Given
+        singles = iter(self.lines)
+        # When
+        before = Timer(lambda: add_content(self.sesh, next(singles))).timeit(
+            self.SINGLE) / self.SINGLE
+        after = Timer(lambda: add_many(self.sesh, self.lines)).timeit(1) \
+            / self.BULK
+        # Then over ten thousand a second, in a chain that still verifies.
+        self.sesh.verify()
+        self.assertEqual(self.sesh.head().sn, 1 + self.SINGLE + self.BULK)
+        self.assertLess(after, before / 5)
+        self.assertLess(after, 1 / 10_000)
@@ -0,0 +1,54 @@
+from argparse import Namespace
+from os import stat
+from tempfile import TemporaryDirectory
+from timeit import Timer
+from pathlib import Path
+from unittest import TestCase
+
+from mind.mind import Epoch, Mind, Phase, QueryStuff, add_content, \
+    add_many, do_history, update_state, update_states
+from tests import line, setup_context
+
+
+class TestArchivePerf(TestCase):
+    ITEMS = 2_000
+    ARCHIVED = 50_000
+
+    def setUp(self) -> None:
+        self.tmp = setup_context(self, TemporaryDirectory())
+        self.path = Path(self.tmp) / "mind.db"
+
+    def test_hot_db_shrinks(self):
+        # Given most of the stuff is done.
+        with Mind(self.path) as sesh:
+            for i in range(self.ITEMS):
+                add_content(sesh, [line(words=30, tags=1)])
+            for stuff in QueryStuff(limit=self.ITEMS * 9 // 10,
+                                    offset=100).fetchall(sesh):
+                update_state(stuff, sesh, Phase.DONE)
+            before = stat(self.path).st_size
+            # When
+            sesh.archive(Epoch.now())
+        # Then
+        self.assertLess(stat(self.path).st_size, before * 0.75)
+        with Mind(self.path, strict=True) as sesh:
+            self.assertEqual(len(QueryStuff(limit=10, state=Phase.DONE)
+                                 .fetchall(sesh)), 10)
+
+    def test_open_after_archive(self):
+        # Given
+        with Mind(self.path) as sesh:
+            add_many(sesh, ([f"entry {i} #tag{i % 20}"]
+                            for i in range(self.ARCHIVED)))
+            update_states(sesh, QueryStuff(limit=-1).fetchall(sesh),
+                          Phase.DONE)
+            sesh.archive(Epoch.now())
+            sesh.verify()
+
+        def open_mind():
+            with Mind(self.path) as sesh:
+                do_history(sesh, Namespace(page=1, num=10))
+        # When
+        took = Timer(open_mind).timeit(10) / 10
+        # Then the log finds each archived item, it never reads them all.
+        self.assertLess(took, 0.02)
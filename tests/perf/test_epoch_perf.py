@@ -0,0 +1,41 @@
+from concurrent.futures import ProcessPoolExecutor
+from tempfile import NamedTemporaryFile
+from timeit import Timer
+from unittest import TestCase
+
+from mind.mind import Epoch, Mind
+from tests import setup_context
+
+IDS = 50_000
+
+
+def allocate(path: str) -> list[int]:
+    with Mind(path, background=True) as mind:
+        return [mind.new_epochs()[0] for _ in range(IDS)]
+
+
+class TestEpochPerf(TestCase):
+    PROCESSES = 4
+
+    def setUp(self):
+        self.tmp = setup_context(self, NamedTemporaryFile(suffix='.db'))
+        self.sesh = setup_context(self, Mind(self.tmp.name))
+
+    def test_ids_at_clock_speed(self):
+        # Given
+        clock = Timer(Epoch.now).timeit(IDS)
+        # When
+        allocated = Timer(self.sesh.new_epochs).timeit(IDS)
+        # Then the blocks soon grow to epoch_batch and rarely hit the DB.
+        self.assertLess(allocated, clock * 5)
+
+    def test_ids_across_processes(self):
+        # When
+        with ProcessPoolExecutor(self.PROCESSES) as pool:
+            allocated = list(pool.map(allocate,
+                                      [self.tmp.name] * self.PROCESSES))
+        # Then
+        ids = [id for ids in allocated for id in ids]
+        self.assertEqual(len(set(ids)), len(ids))
+        for ids in allocated:
+            self.assertListEqual(ids, sorted(ids))
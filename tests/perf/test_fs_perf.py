@@ -14,11 +14,13 @@ from tests import setup_context, line
 
 
 class TestFsPerf(TestCase):
+    profile = mind.DURABLE
 
     def setUp(self):
         tmp = NamedTemporaryFile(suffix='.db')
         self.tmp = setup_context(self, tmp)
-        self.sesh = setup_context(self, mind.Mind(tmp.name, strict=True))
+        self.sesh = setup_context(self, mind.Mind(tmp.name, strict=True,
+                                                  profile=self.profile))
         self.stdout = setup_context(self, redirect_stdout(StringIO()))
         self.input = setup_context(self,
                                    patch("builtins.input", return_value="y"))
@@ -41,11 +43,18 @@ class TestFsPerf(TestCase):
         iterations = 10*365
         # When / Then
         self.assertLessEqual(Timer(self.do_iteration).timeit(iterations), 9)
-        self.assertLess(stat(Path(self.tmp.name)).st_size / 1024, 500)
+        # Secondary and search indexes take about half as much again, every
+        # random tag here is new so the tag dictionary and tag_stats get a
+        # row per item rather than one per tag.
+        self.assertLess(stat(Path(self.tmp.name)).st_size / 1024, 950)
 
     def test_big_db(self):
         # Given
         iterations = 10*365*10
         # When / Then
         self.assertLessEqual(Timer(self.do_iteration).timeit(iterations), 100)
-        self.assertLess(stat(Path(self.tmp.name)).st_size / 1024, 5_000)
+        self.assertLess(stat(Path(self.tmp.name)).st_size / 1024, 8_500)
+
+
+class TestFsPerfFastWal(TestFsPerf):
+    profile = mind.FAST_WAL
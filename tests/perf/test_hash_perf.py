@@ -0,0 +1,32 @@
+from timeit import Timer
+from tracemalloc import get_traced_memory, start, stop
+from unittest import TestCase
+
+from mind.mind import Change, Epoch, HashAlgo, Record, Stuff, Transition
+
+
+class TestHashPerf(TestCase):
+    BODY = "some body " * 800_000  # 8MB
+
+    def peak(self, func) -> int:
+        start()
+        func()
+        peak = get_traced_memory()[1]
+        stop()
+        return peak
+
+    def change(self, algo: HashAlgo) -> Change:
+        return Change(Record(), Stuff(Epoch(1), self.BODY), Transition.ADD,
+                      Epoch(2), algo=algo)
+
+    def test_streamed_hash(self):
+        # Given
+        text = self.change(HashAlgo.TEXT_SHA1)
+        binary = self.change(HashAlgo.SHA1)
+        # When
+        before = Timer(text.hash).timeit(5)
+        after = Timer(binary.hash).timeit(5)
+        # Then
+        self.assertLess(after, before)
+        self.assertLess(self.peak(binary.hash), len(self.BODY) / 20)
+        self.assertGreater(self.peak(text.hash), len(self.BODY) * 2)
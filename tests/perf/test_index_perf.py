@@ -0,0 +1,71 @@
+from argparse import Namespace
+from timeit import Timer
+from unittest import TestCase
+
+from mind.mind import TAG_NAMES, TAGS, Epoch, Mind, Order, Phase, \
+    QueryStuff, QueryTags, do_history
+from tests import setup_context
+
+
+class TestIndexPerf(TestCase):
+    MEM = ":memory:"
+    SMALL = 1_000
+    LARGE = 100_000
+
+    def setUp(self) -> None:
+        self.sesh = setup_context(self, Mind(self.MEM, strict=False))
+        self.size = 0
+
+    def grow(self, size: int) -> None:
+        # Bypass add_content, only the query plans matter here.
+        start = Epoch.now()
+        ids = range(start + self.size, start + size)
+        self.sesh.con.executemany(
+            "INSERT INTO stuff (id, body, state, codec, preview) "
+            "VALUES (?, ?, ?, 0, '')",
+            ((i, f"body {i}", Phase.ACTIVE if i % 3 else Phase.DONE)
+             for i in ids))
+        self.sesh.con.executemany(self.sesh.inserts[TAG_NAMES],
+                                  ({"tag": f"tag{i}"} for i in range(50)))
+        self.sesh.con.executemany(self.sesh.inserts[TAGS],
+                                  ({"id": i, "tag": f"tag{i % 50}"}
+                                   for i in ids))
+        self.sesh.con.executemany(
+            "INSERT INTO log (hash, stuff, stamp, old_state, new_state) "
+            "VALUES (zeroblob(20), ?, ?, 1, 2)", ((i, i) for i in ids))
+        self.sesh.con.commit()
+        self.size = size
+
+    def timings(self) -> list[float]:
+        history = Namespace(page=1, num=10)
+        return [Timer(func).timeit(200) for func in (
+            lambda: QueryStuff().fetchall(self.sesh),
+            lambda: QueryStuff(tag="tag7").fetchall(self.sesh),
+            lambda: do_history(self.sesh, history),
+            lambda: QueryTags(id=None).execute(self.sesh))]
+
+    def test_flat_latency(self):
+        # Given
+        self.grow(self.SMALL)
+        small = self.timings()
+        # When
+        self.grow(self.LARGE)
+        large = self.timings()
+        # Then list, tag filter, history and tags don't grow with the DB.
+        for name, before, after in zip(("list", "tag", "history", "tags"),
+                                       small, large):
+            with self.subTest(name):
+                self.assertLess(after, before * 3 + 0.05)
+
+    def test_deep_page_with_cursor(self):
+        # Given
+        self.grow(self.LARGE)
+        last = QueryStuff(order=Order.OLDEST, limit=1).fetchone(self.sesh)
+        first_page = QueryStuff(limit=10)
+        deep_page = QueryStuff(limit=10, before=Epoch(last.id + 30))
+        # When
+        first = Timer(lambda: first_page.page(self.sesh)).timeit(200)
+        deep = Timer(lambda: deep_page.page(self.sesh)).timeit(200)
+        # Then
+        self.assertEqual(len(deep_page.page(self.sesh).stuff), 10)
+        self.assertLess(deep, first * 3 + 0.05)
@@ -0,0 +1,43 @@
+from timeit import Timer
+from unittest import TestCase
+
+from mind.mind import Mind
+from tests import setup_context
+
+
+class TestMerklePerf(TestCase):
+    MEM = ":memory:"
+    SMALL = 1_000
+    LARGE = 100_000
+
+    def setUp(self) -> None:
+        self.sesh = setup_context(self, Mind(self.MEM, strict=False))
+
+    def grow(self, size: int) -> None:
+        # Bypass add_content, only the log hashes matter here. Rows written
+        # straight to the connection skip the cached head, so read the log.
+        with self.sesh.con:
+            self.sesh.con.executemany(
+                "INSERT INTO log (hash, stuff, stamp, old_state, new_state) "
+                "VALUES (randomblob(20), 1, 1, 1, 2)",
+                ((),) * (size - self.sesh.load_head().sn))
+        self.sesh.grow_merkle(self.sesh.load_head())
+
+    def test_flat_proofs(self):
+        # Given
+        self.grow(self.SMALL)
+        small = Timer(lambda: self.sesh.prove(self.SMALL // 3)).timeit(200)
+        # When
+        self.grow(self.LARGE)
+        large = Timer(lambda: self.sesh.prove(self.LARGE // 3)).timeit(200)
+        # Then a proof reads one node per level.
+        self.assertTrue(self.sesh.prove(self.LARGE // 3).check())
+        self.assertLess(large, small * 3 + 0.05)
+
+    def test_incremental_growth(self):
+        # Given
+        build = Timer(lambda: self.grow(self.LARGE)).timeit(1)
+        # When
+        step = Timer(lambda: self.grow(self.LARGE + 10)).timeit(1)
+        # Then only the new records are hashed.
+        self.assertLess(step, build / 20)
@@ -0,0 +1,29 @@
+from os import stat
+from random import randint
+from tempfile import NamedTemporaryFile
+from unittest import TestCase
+
+from mind.mind import Mind, add_content
+from tests import line, setup_context
+
+
+class TestPackPerf(TestCase):
+    NOTES = 200
+
+    def setUp(self) -> None:
+        self.tmp = setup_context(self, NamedTemporaryFile(suffix='.db'))
+        self.sesh = setup_context(self, Mind(self.tmp.name, strict=True))
+
+    def test_long_notes_packed(self):
+        # Given notes of thousands of words, like test_add_complex_stuff.
+        raw = 0
+        for i in range(self.NOTES):
+            lines = [line(words=randint(12, 16), tags=0) * randint(40, 100)
+                     for _ in range(5)]
+            raw += sum(len(x) for x in lines)
+            add_content(self.sesh, lines)
+        # When
+        size = stat(self.tmp.name).st_size
+        # Then
+        self.assertLess(size, raw / 4)
+        self.sesh.verify()
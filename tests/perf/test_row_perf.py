@@ -0,0 +1,35 @@
+from timeit import Timer
+from unittest import TestCase
+
+from mind.mind import Epoch, Mind, Phase, Stuff, StuffRow, to_rows
+from tests import setup_context
+
+
+class TestRowPerf(TestCase):
+    MEM = ":memory:"
+    ROWS = 50_000
+
+    def setUp(self) -> None:
+        self.sesh = setup_context(self, Mind(self.MEM, strict=False))
+        start = Epoch.now()
+        self.sesh.con.executemany(
+            "INSERT INTO stuff (id, body, state, codec, preview) "
+            "VALUES (?, ?, ?, 0, '')",
+            ((start + i, f"body {i}", Phase.ACTIVE)
+             for i in range(self.ROWS)))
+
+    def select(self):
+        return self.sesh.con.execute("SELECT id, body, state FROM stuff")
+
+    def test_lazy_rows(self):
+        # Given what the EPOCH and PHASE decltype converters used to do.
+        def eager():
+            return [Stuff(Epoch(int(i)), b, Phase(int(s)))
+                    for i, b, s in self.select()]
+        # When
+        before = min(Timer(eager).repeat(5, 1))
+        after = min(Timer(lambda: to_rows(StuffRow, self.select()))
+                    .repeat(5, 1))
+        # Then
+        self.assertEqual(eager(), to_rows(StuffRow, self.select()))
+        self.assertLess(after, before / 1.5)
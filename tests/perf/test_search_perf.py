@@ -0,0 +1,33 @@
+from timeit import Timer
+from unittest import TestCase
+
+from mind.mind import SEARCH, Epoch, Mind, Phase, QuerySearch
+from tests import setup_context
+
+
+class TestSearchPerf(TestCase):
+    MEM = ":memory:"
+    ROWS = 200_000
+
+    def setUp(self) -> None:
+        self.sesh = setup_context(self, Mind(self.MEM, strict=False))
+        start = Epoch.now()
+        rows = [(start + i, f"note {i} word{i % 1000} and filler",
+                 Phase.ACTIVE if i % 3 else Phase.DONE)
+                for i in range(self.ROWS)]
+        self.sesh.con.executemany(
+            "INSERT INTO stuff (id, body, state, codec, preview) "
+            "VALUES (?, ?, ?, 0, '')", rows)
+        self.sesh.con.executemany(
+            f"INSERT INTO {SEARCH} (rowid, body) VALUES (?, ?)",
+            ((i, b) for i, b, _ in rows))
+        self.sesh.con.commit()
+
+    def test_search_latency(self):
+        # Given a couple of hundred matches among all the notes.
+        query = QuerySearch("word7")
+        # When
+        seconds = Timer(lambda: query.fetchall(self.sesh)).timeit(100) / 100
+        # Then
+        self.assertEqual(len(query.fetchall(self.sesh)), query.limit)
+        self.assertLess(seconds, 0.01)
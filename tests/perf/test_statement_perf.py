@@ -0,0 +1,60 @@
+from timeit import Timer
+from unittest import TestCase
+
+from mind.mind import LOG, STUFF, Epoch, Mind, Order, QueryStuff, Record, \
+    Stuff, insert, stuff_cmd
+from tests import setup_context
+
+
+class TestStatementPerf(TestCase):
+    MEM = ":memory:"
+    CALLS = 100_000
+
+    def setUp(self) -> None:
+        self.sesh = setup_context(self, Mind(self.MEM, strict=False))
+
+    def per_call(self, func) -> float:
+        return Timer(func).timeit(self.CALLS) / self.CALLS
+
+    def test_prebuilt_inserts(self):
+        # Given
+        stuff = Stuff(Epoch.now(), "body")
+        # When
+        before = self.per_call(lambda: insert(STUFF, stuff))
+        after = self.per_call(lambda: self.sesh.inserts[STUFF])
+        # Then
+        self.assertLess(after, before / 5)
+
+    def test_cached_query_cmd(self):
+        # Given
+        query = QueryStuff(tag="foo", after=Epoch(1))
+        # When
+        before = self.per_call(lambda: stuff_cmd(
+            query.order, Order.LATEST, True, True, False))
+        after = self.per_call(query.cmd)
+        # Then
+        self.assertEqual(query.cmd(), stuff_cmd(query.order, Order.LATEST,
+                                                True, True, False))
+        self.assertLess(after, before / 2)
+
+    def test_query_without_tracing(self):
+        # Given
+        cmd = f"SELECT * FROM {LOG} WHERE sn = :sn"
+        params = Record()._asdict()
+        self.sesh.trace = True
+        # When
+        before = self.per_call(lambda: self.sesh.query(cmd, params))
+        self.sesh.trace = False
+        after = self.per_call(lambda: self.sesh.query(cmd, params))
+        # Then
+        self.assertLess(after, before)
+
+    def test_cached_head(self):
+        # Given
+        self.sesh.head()
+        # When
+        before = self.per_call(self.sesh.load_head)
+        after = self.per_call(self.sesh.head)
+        # Then
+        self.assertEqual(self.sesh.head().hash, self.sesh.load_head().hash)
+        self.assertLess(after, before)
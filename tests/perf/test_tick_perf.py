@@ -0,0 +1,39 @@
+from argparse import Namespace
+from contextlib import redirect_stdout
+from io import StringIO
+from tempfile import NamedTemporaryFile
+from timeit import Timer
+from unittest import TestCase
+from unittest.mock import patch
+
+from mind.mind import DURABLE, Mind, Phase, QueryStuff, add_many, do_tick, \
+    update_state
+from tests import setup_context
+
+
+class TestTickPerf(TestCase):
+    profile = DURABLE
+    SINGLE = 100
+    BATCH = 500
+
+    def setUp(self):
+        tmp = setup_context(self, NamedTemporaryFile(suffix='.db'))
+        self.sesh = setup_context(self, Mind(tmp.name, profile=self.profile))
+        setup_context(self, redirect_stdout(StringIO()))
+        setup_context(self, patch("builtins.input", return_value="y"))
+        add_many(self.sesh, ([f"entry {i}"] for i in
+                             range(self.SINGLE + self.BATCH)))
+
+    def test_batched_tick(self):
+        # Given
+        singles = iter(QueryStuff(limit=self.SINGLE).fetchall(self.sesh))
+        # When
+        before = Timer(lambda: update_state(next(singles), self.sesh,
+                                            Phase.DONE)).timeit(self.SINGLE)
+        after = Timer(lambda: do_tick(self.sesh, Namespace(
+            tick=f"1-{self.BATCH}"))).timeit(1)
+        # Then a few hundred items in milliseconds, not one fsync each.
+        self.sesh.verify()
+        self.assertFalse(QueryStuff().fetchall(self.sesh))
+        self.assertLess(after / self.BATCH, before / self.SINGLE / 5)
+        self.assertLess(after, 0.1)
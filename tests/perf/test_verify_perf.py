@@ -1,12 +1,15 @@
 from argparse import Namespace
 from contextlib import redirect_stdout
 from io import StringIO
+from os import cpu_count
 from random import choice
+from tempfile import NamedTemporaryFile
 from timeit import Timer
-from unittest import TestCase
+from unittest import TestCase, skipUnless
 from unittest.mock import patch
 
-from mind.mind import add_content, do_forget, do_tick, Mind
+from mind.mind import BULK_LOAD, READ_ONLY, add_content, do_forget, do_tick, \
+    Mind
 from tests import setup_context
 
 
@@ -28,3 +31,88 @@ class TestVerifyPerf(TestCase):
                 do_tick(self.sesh, Namespace(tick=str(i)))
 
         self.assertLessEqual(Timer(self.sesh.verify).timeit(10), 4)
+
+    def test_verify_from_checkpoint(self):
+        # Given
+        for i in range(2_050):
+            add_content(self.sesh, [f"hello{i} #tag{i % 20}"])
+        # When the first full verify writes checkpoints the next starts there.
+        before = Timer(self.sesh.verify).timeit(1)
+        after = Timer(self.sesh.verify).timeit(1)
+        # Then
+        self.assertEqual(len(self.sesh.checkpoints()), 2)
+        self.assertLess(after, before / 5)
+
+    def test_streamed_verify(self):
+        # Given
+        for i in range(10_000):
+            add_content(self.sesh, [f"hello{i} #tag{i % 20}"])
+        head = self.sesh.head().sn
+
+        def lookups():
+            return [self.sesh.get_full_record(sn) for sn in range(1, head)]
+        # When one lookup per record is what verify used to do.
+        before = Timer(lookups).timeit(1)
+        after = Timer(lambda: list(self.sesh.stream(1, head))).timeit(1)
+        # Then
+        self.sesh.verify_range(head, 1)
+        self.assertLess(after, before)
+
+    @skipUnless((cpu_count() or 1) >= 4, "Needs at least 4 cores.")
+    def test_parallel_audit(self):
+        # Given
+        tmp = setup_context(self, NamedTemporaryFile(suffix=".db"))
+        sesh = setup_context(self, Mind(tmp.name, profile=BULK_LOAD))
+        for i in range(40_000):
+            add_content(sesh, [f"hello{i} #tag{i % 20}"])
+        # When
+        with self.assertLogs(level="INFO"):
+            before = Timer(lambda: sesh.audit(jobs=1)).timeit(1)
+            after = Timer(lambda: sesh.audit(jobs=4)).timeit(1)
+        # Then
+        self.assertLess(after, before / 2)
+
+    def test_strict_reopen(self):
+        # Given
+        tmp = setup_context(self, NamedTemporaryFile(suffix=".db"))
+        with Mind(tmp.name, profile=BULK_LOAD) as sesh:
+            for i in range(20_000):
+                add_content(sesh, [f"hello{i} #tag{i % 20}"])
+
+        def reopen():
+            Mind(tmp.name, strict=True).con.close()
+        # When the first open leaves a verified mark for the next one.
+        before = Timer(reopen).timeit(1)
+        after = Timer(reopen).timeit(1)
+        # Then
+        self.assertLess(after, before / 5)
+
+    def test_background_open(self):
+        # Given
+        tmp = setup_context(self, NamedTemporaryFile(suffix=".db"))
+        with Mind(tmp.name, profile=BULK_LOAD) as sesh:
+            for i in range(20_000):
+                add_content(sesh, [f"hello{i} #tag{i % 20}"])
+
+        def reopen(background: bool):
+            # Read only opens never move the verified mark.
+            Mind(tmp.name, strict=True, profile=READ_ONLY,
+                 background=background).con.close()
+        # When
+        before = Timer(lambda: reopen(False)).timeit(1)
+        after = Timer(lambda: reopen(True)).timeit(1)
+        # Then
+        self.assertLess(after, before / 5)
+
+    def test_flat_spot_checks(self):
+        # Given
+        self.sesh.spot_budget = 1
+        for i in range(1_000):
+            add_content(self.sesh, [f"hello{i} #tag{i % 20}"])
+        small = Timer(self.sesh.spot_check).timeit(20)
+        # When
+        for i in range(1_000, 20_000):
+            add_content(self.sesh, [f"hello{i} #tag{i % 20}"])
+        large = Timer(self.sesh.spot_check).timeit(20)
+        # Then
+        self.assertLess(large, small * 3 + 0.05)
@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
+from sqlite3 import Error
+from tempfile import NamedTemporaryFile
+from timeit import default_timer
+from unittest import TestCase
+
+from mind.mind import DURABLE, Mind, Write, Writer, add_content
+from tests import setup_context
+
+
+class TestWriterPerf(TestCase):
+    profile = DURABLE
+    CLIENTS = 8
+    WRITES = 25
+
+    def setUp(self):
+        self.tmp = setup_context(self, NamedTemporaryFile(suffix='.db'))
+        with Mind(self.tmp.name, profile=self.profile):
+            pass
+
+    def clients(self, write) -> tuple[int, float]:
+        # Each client waits for its write before sending the next, like a
+        # browser waiting on POST /stuff. Returns failures and writes a second.
+        def client(n: int) -> int:
+            failed = 0
+            for i in range(self.WRITES):
+                try:
+                    write([f"client {n} entry {i}"])
+                except Error:
+                    failed += 1
+            return failed
+        start = default_timer()
+        with ThreadPoolExecutor(self.CLIENTS) as pool:
+            failed = sum(pool.map(client, range(self.CLIENTS)))
+        done = self.CLIENTS * self.WRITES - failed
+        return failed, done / (default_timer() - start)
+
+    def test_group_commit(self):
+        # Given a mind opened for each request, as POST /stuff used to.
+        def request(content: list[str]) -> None:
+            with Mind(self.tmp.name, profile=self.profile,
+                      background=True) as mind:
+                add_content(mind, content)
+        writer = Writer(self.tmp.name, self.profile)
+        writer.start()
+        self.addCleanup(writer.stop)
+        # When
+        racing, before = self.clients(request)
+        failed, after = self.clients(
+            lambda content: writer.submit(Write.add(content)).result(10))
+        # Then
+        self.assertEqual(failed, 0)
+        with Mind(self.tmp.name, strict=True) as mind:
+            self.assertEqual(mind.head().sn,
+                             1 + 2 * self.CLIENTS * self.WRITES - racing)
+        self.assertGreater(after, before * 2)
@@ -1,13 +1,16 @@
 import unittest
+from tempfile import NamedTemporaryFile
+from unittest.mock import patch
 
-from flask import Flask
+from flask import Flask, Response
 from flask_login import encode_cookie
 from werkzeug.security import generate_password_hash, check_password_hash
 
 import mind.app
 from mind.app import handle_query, User, handle_login, handle_register, \
-    handle_stuff, load_user, add_token, serve_login
-from mind.mind import Mind
+    handle_stuff, handle_tags, load_user, add_token, serve_login, after_mind
+from mind.mind import Mind, Phase, Writer, add_content, load_stuff, \
+    update_state
 
 
 class TestApp(unittest.TestCase):
@@ -71,25 +74,170 @@ class TestApp(unittest.TestCase):
                 content_type='application/json'):
             resp = handle_stuff()
             self.assertEqual(resp.status_code, 200)
-            self.assertEqual(resp.json, [])
+            self.assertEqual(resp.json,
+                             {'stuff': [], 'after': None, 'before': None})
 
-    def test_tick_stuff(self):
+    def test_add_many_stuff(self):
         with self.app.test_request_context(
-                '/stuff', data='{"tick": {"id": 500, "body": "foo"}}',
+                '/stuff', data='{"add": [["milk #shop"], ["eggs"]]}',
                 content_type='application/json'):
+            # When
             resp = handle_stuff()
-            self.assertEqual(resp.status_code, 200)
-            self.assertEqual({'updated': 'Done: 1970-01-01T00:00 -> foo'},
-                             resp.json)
+        # Then
+        self.assertEqual([(a['stuff'][1], a['tags']) for a in
+                          resp.json['added']],
+                         [("milk", ["shop"]), ("eggs", [])])
+
+    def test_add_through_writer(self):
+        # Given
+        tmp = NamedTemporaryFile(suffix='.db')
+        self.addCleanup(tmp.close)
+        mind.app.writer = Writer(tmp.name)
+        mind.app.writer.start()
+        self.addCleanup(setattr, mind.app, 'writer', None)
+        self.addCleanup(mind.app.writer.stop)
+        with self.app.test_request_context(
+                '/stuff', data='{"add": ["milk #shop"]}',
+                content_type='application/json'):
+            # When
+            resp = handle_stuff()
+        # Then
+        self.assertEqual(resp.json['tags'], ['shop'])
+        with Mind(tmp.name) as mnd:
+            self.assertEqual(mnd.head().stuff, resp.json['stuff'][0])
+
+    def test_add_many_through_writer(self):
+        # Given
+        tmp = NamedTemporaryFile(suffix='.db')
+        self.addCleanup(tmp.close)
+        mind.app.writer = Writer(tmp.name)
+        mind.app.writer.start()
+        self.addCleanup(setattr, mind.app, 'writer', None)
+        self.addCleanup(mind.app.writer.stop)
+        with self.app.test_request_context(
+                '/stuff', data='{"add": [["milk #shop"], ["eggs"]]}',
+                content_type='application/json'):
+            # When
+            resp = handle_stuff()
+        # Then
+        self.assertEqual(len(resp.json['added']), 2)
+        with Mind(tmp.name) as mnd:
+            self.assertEqual(mnd.head().stuff,
+                             resp.json['added'][1]['stuff'][0])
 
-    def test_untick_stuff(self):
+    def test_query_stuff_cursor(self):
+        with self.app.app_context():
+            mnd = Mind(self.MEM)
+            for i in range(5):
+                add_content(mnd, [f"entry {i}"])
+            first = handle_query(mnd, {'num': 2}).json
+            # When
+            resp = handle_query(mnd, {'num': 2, 'after': first['after']})
+        # Then
+        self.assertEqual([s[1] for s in resp.json['stuff']],
+                         ["entry 2", "entry 1"])
+        self.assertEqual(resp.json['before'], f"{resp.json['stuff'][0][0]:x}")
+
+    def test_query_previews(self):
+        with self.app.app_context():
+            mnd = Mind(self.MEM)
+            add_content(mnd, ["first line", "more words" * 200])
+            # When
+            resp = handle_query(mnd, {})
+        # Then packed bodies are listed without unpacking them.
+        self.assertEqual(resp.json['stuff'][0][1], "first line")
+
+    def test_query_search(self):
+        with self.app.app_context():
+            mnd = Mind(self.MEM)
+            for body in ("buy milk #shop", "walk dog", "milk cows"):
+                add_content(mnd, [body])
+            # When
+            resp = handle_query(mnd, {'search': 'milk', 'num': 1})
+            tagged = handle_query(mnd, {'search': 'milk', 'tag': 'shop'})
+        # Then
+        self.assertEqual(len(resp.json['stuff']), 1)
+        self.assertTrue(resp.json['more'])
+        self.assertEqual([s[1] for s in tagged.json['stuff']], ["buy milk"])
+
+    def test_tag_counts(self):
         with self.app.test_request_context(
-                '/stuff', data='{"untick": {"id": 500, "body": "foo"}}',
+                '/tags', data='{"counts": true}',
                 content_type='application/json'):
+            # When
+            resp = handle_tags()
+        # Then
+        self.assertEqual(resp.json, [])
+
+    def test_alert_header(self):
+        with self.app.test_request_context('/stuff'):
+            # Given
+            mind.app.g.mind_alert = "Integrity error at record 3."
+            # When
+            resp = after_mind(Response())
+        # Then
+        self.assertEqual(resp.headers[mind.app.ALERT_HEADER],
+                         "Integrity error at record 3.")
+
+    def test_tick_stuff(self):
+        # Given a packed body, only its id comes from the client.
+        tmp = NamedTemporaryFile(suffix='.db')
+        self.addCleanup(tmp.close)
+        mnd = Mind(tmp.name)
+        stuff, _ = add_content(mnd, ["foo", "more words" * 200])
+        with patch("mind.app.init_mind", return_value=mnd), \
+                self.app.test_request_context(
+                    '/stuff', data=f'{{"tick": {{"id": {int(stuff.id)}}}}}',
+                    content_type='application/json'):
+            # When
             resp = handle_stuff()
-            self.assertEqual(resp.status_code, 200)
-            self.assertEqual({'updated': 'Active: 1970-01-01T00:00 -> foo'},
-                             resp.json)
+        # Then
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual({'updated': f'Done: {stuff}'}, resp.json)
+        with Mind(tmp.name, strict=True) as mnd:
+            self.assertEqual(load_stuff(mnd, stuff.id).state, Phase.DONE)
+
+    def test_untick_stuff(self):
+        # Given
+        tmp = NamedTemporaryFile(suffix='.db')
+        self.addCleanup(tmp.close)
+        mnd = Mind(tmp.name)
+        stuff, _ = add_content(mnd, ["foo"])
+        update_state(stuff, mnd, Phase.DONE)
+        with patch("mind.app.init_mind", return_value=mnd), \
+                self.app.test_request_context(
+                    '/stuff', data=f'{{"untick": {{"id": {int(stuff.id)}}}}}',
+                    content_type='application/json'):
+            # When
+            resp = handle_stuff()
+        # Then
+        self.assertEqual({'updated': f'Active: {stuff}'}, resp.json)
+        with Mind(tmp.name, strict=True) as mnd:
+            self.assertEqual(load_stuff(mnd, stuff.id).state, Phase.ACTIVE)
+
+    def test_tick_done_stuff(self):
+        # Given
+        mnd = Mind(self.MEM)
+        stuff, _ = add_content(mnd, ["foo"])
+        update_state(stuff, mnd, Phase.DONE)
+        with patch("mind.app.init_mind", return_value=mnd), \
+                self.app.test_request_context(
+                    '/stuff', data=f'{{"tick": {{"id": {int(stuff.id)}}}}}',
+                    content_type='application/json'):
+            # When
+            resp, status = handle_stuff()
+        # Then
+        self.assertEqual(status, 409)
+        self.assertEqual(resp.json, {
+            'error': f'Stuff with ID {int(stuff.id)} is not ACTIVE.'})
+
+    def test_tick_missing_stuff(self):
+        with self.app.test_request_context(
+                '/stuff', data='{"tick": {"id": 500}}',
+                content_type='application/json'):
+            resp, status = handle_stuff()
+        self.assertEqual(status, 404)
+        self.assertEqual(resp.json, {'error': 'Stuff with ID 500 not found.'})
 
     def test_really_handle_register(self):
         with self.app.test_request_context(
@@ -1,6 +1,7 @@
+import hashlib
 import unittest
 
-from mind.mind import Change, Record, Stuff, Phase, \
+from mind.mind import Change, Digest, HashAlgo, Record, Stuff, Phase, \
     Sequence, Tag, Epoch, Transition, Tags
 
 E1 = Epoch(1)
@@ -49,3 +50,38 @@ class TestChange(unittest.TestCase):
         # Then
         self.assertEqual(canon, "Change [Record [30,hash],Stuff [f,"
                                 "],Phases [ACTIVE->DONE],Tags []]")
+
+    def test_text_hash(self):
+        # Given
+        stuff = Stuff(Epoch(15), "some body", state=Phase.ACTIVE)
+        change = Change(PARENT, stuff, Transition.ADD, E2, Tags(),
+                        HashAlgo.TEXT_SHA1)
+        # When
+        digest = change.hash()
+        # Then the hashes chained before algo existed still verify.
+        self.assertEqual(digest, hashlib.sha1(
+            change.canonical().encode("utf-8")).hexdigest())
+
+    def test_binary_hashes(self):
+        # Given
+        parent = PARENT._replace(hash=Digest("ab" * 20))
+        stuff = Stuff(Epoch(15), "some body " * 10_000, state=Phase.ACTIVE)
+        tags = Tags((Tag(15, "b"), Tag(15, "a")))
+        # When
+        hashes = {algo: Change(parent, stuff, Transition.ADD, E2, tags,
+                               algo).hash() for algo in HashAlgo}
+        split = Change(parent, stuff, Transition.ADD, E2,
+                       Tags((Tag(15, "b,a"),)), HashAlgo.SHA1).hash()
+        # Then
+        self.assertEqual(len(set(hashes.values())), 3)
+        self.assertTrue(all(len(h) == 40 for h in hashes.values()))
+        self.assertNotEqual(split, hashes[HashAlgo.SHA1])
+
+    def test_encode_in_chunks(self):
+        # Given
+        stuff = Stuff(Epoch(15), "é" * 200_000, state=Phase.ACTIVE)
+        # When
+        parts = list(Change(Record(), stuff, Transition.ADD, E2).encode())
+        # Then
+        self.assertLessEqual(max(len(part) for part in parts), 128 * 1024)
+        self.assertIn("é".encode("utf-8") * 10, b"".join(parts))
@@ -1,7 +1,9 @@
 from datetime import datetime
+from pathlib import Path
+from tempfile import TemporaryDirectory
 import unittest
 
-from mind.mind import Epoch
+from mind.mind import Epoch, Mind
 
 
 class TestEpoch(unittest.TestCase):
@@ -28,3 +30,55 @@ class TestEpoch(unittest.TestCase):
         deserialized = Epoch(now)
         # Then
         self.assertEqual(now, deserialized)
+
+    def test_new_epochs(self):
+        with Mind(":memory:") as sesh:
+            # Given
+            sesh.epoch_batch = 10
+            before = Epoch.now()
+            # When
+            ids = sesh.new_epochs(3) + sesh.new_epochs() + sesh.new_epochs(20)
+        # Then they follow the clock but never repeat.
+        self.assertGreaterEqual(ids[0], before)
+        self.assertListEqual(ids, sorted(set(ids)))
+
+    def test_epochs_between_connections(self):
+        with TemporaryDirectory() as tmp:
+            # Given
+            path = Path(tmp) / "mind.db"
+            with Mind(path) as sesh, Mind(path) as other:
+                # When
+                ids = [sesh.new_epochs(2)]
+                reserved = sesh.reserved
+                ids += [mnd.new_epochs(2) for mnd in (other, sesh) * 3][:-1]
+        # Then each connection takes its own block.
+        flat = [id for pair in ids for id in pair]
+        mine = [id for pair in ids[0::2] for id in pair]
+        self.assertEqual(len(set(flat)), len(flat))
+        self.assertListEqual(mine, sorted(mine))
+        self.assertGreater(ids[1][0], reserved)
+
+    def test_epochs_follow_clock(self):
+        with TemporaryDirectory() as tmp:
+            # Given
+            path = Path(tmp) / "mind.db"
+            ids = []
+            # When
+            for _ in range(50):
+                with Mind(path) as sesh:
+                    ids.append(sesh.new_epochs()[0])
+            # Then each open only took the one id it used.
+            self.assertLessEqual(ids[-1], Epoch.now())
+        self.assertListEqual(ids, sorted(set(ids)))
+
+    def test_epochs_after_last_block(self):
+        with Mind(":memory:") as sesh:
+            # Given a block taken ahead of the clock, as the upgrade seeds.
+            ahead = Epoch.now() + 60_000_000
+            sesh.con.execute("UPDATE epochs SET last = :last",
+                             {"last": ahead})
+            sesh.next_epoch, sesh.reserved = 0, -1
+            # When
+            ids = sesh.new_epochs(2)
+        # Then
+        self.assertListEqual(ids, [ahead + 1, ahead + 2])
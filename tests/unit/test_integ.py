@@ -1,8 +1,12 @@
 from argparse import Namespace
-from contextlib import redirect_stdout
+from contextlib import closing, redirect_stdout
 from pathlib import Path
+from shutil import copyfile
+from tempfile import TemporaryDirectory
 import io
+import os
 import logging
+import sqlite3
 import unittest
 
 from unittest.mock import patch
@@ -14,6 +18,13 @@ class TestInteg(unittest.TestCase):
     """ Test components at higher level, to check that things work together."""
     MEM = ":memory:"
 
+    def copy_schema(self, version: int) -> Path:
+        """Opening a mind upgrades it in place, so work on a copy."""
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        return Path(copyfile(f"tests/data/schema-v{version}.db",
+                             Path(tmp.name) / f"schema-v{version}.db"))
+
     def test_logging_setup(self):
         # Given
         with self.assertLogs(level=logging.DEBUG) as root:
@@ -36,6 +47,56 @@ class TestInteg(unittest.TestCase):
         self.assertIn(" -> # This is how you Markdown", output[0])
         self.assertTrue(output[0].endswith("Tags [markdown, nohello]"))
 
+    def test_spawn_check_elsewhere(self):
+        # Given a relative path from outside the repo.
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(tmp.name)
+        cli.main(["--db", "mind.db", "add", "-t", "hello"])
+        with closing(sqlite3.connect("mind.db")) as con, con:
+            con.execute("UPDATE stuff SET body = 'bad' WHERE body = 'hello'")
+        # When
+        mind.spawn_check("mind.db").wait(30)
+        # Then
+        with mind.Mind("mind.db", background=True) as sesh:
+            self.assertIsNotNone(sesh.alert())
+
+    def test_parallel_verify_relative_db(self):
+        # Given
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(tmp.name)
+        for i in range(5):
+            cli.main(["--db", "rel.db", "add", "-t", f"hello {i}"])
+        # When
+        output = cli.main(["--db", "rel.db", "verify", "--jobs", "2"])
+        # Then
+        self.assertTrue(output[0].startswith("Verified 6/6 records"))
+
+    def test_background_check(self):
+        # Given
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        db = str(Path(tmp.name) / "mind.db")
+        argv = ["--db", db, "--background", "add", "-t", "hello"]
+        with patch("mind.spawn_check") as spawn:
+            cli.main(argv)
+            cli.main(argv)
+            with closing(sqlite3.connect(db)) as con, con:
+                con.execute("UPDATE stuff SET body = 'bad' "
+                            "WHERE body = 'hello'")
+            with self.assertLogs(level=logging.ERROR):
+                checked = cli.main(["--db", db, "check"])
+            # When
+            output = cli.main(argv)
+        # Then
+        self.assertEqual(spawn.call_count, 3)
+        spawn.assert_called_with(db, mind.DURABLE)
+        self.assertListEqual(checked, ["Integrity error at record 2."])
+        self.assertTrue(output[0].startswith("Integrity error at record 2"))
+
     def test_help(self):
         # Given
         argv = ['-h']
@@ -75,18 +136,168 @@ class TestInteg(unittest.TestCase):
         self.assertEqual(output[0][-27:], f" -> {test_input} Tags []")
 
     def test_old_schemas(self):
-        for i in range(1, 6):
-            path = Path(f"tests/data/schema-v{i}.db")
+        for i in range(1, 7):
+            path = self.copy_schema(i)
             with self.subTest(f"Testing old schema: {path}"):
                 # When
-                with self.assertRaises(mind.IntegrityError):
-                    with mind.Mind(path, strict=True) as sesh:
-                        mind.QueryStuff().fetchall(sesh)
+                with mind.Mind(path, strict=True) as sesh:
+                    fetched = mind.QueryStuff().fetchall(sesh)
+                    version = mind.schema_version(sesh.con)
+                # Then
+                self.assertListEqual(fetched, [])
+                self.assertEqual(version, mind.SCHEMA_VERSION)
+
+    def test_detect_schemas(self):
+        for i in range(1, 8):
+            with self.subTest(f"Detecting schema v{i}"):
+                # Given
+                con = sqlite3.connect(self.copy_schema(i))
+                self.addCleanup(con.close)
+                # When / Then
+                self.assertEqual(mind.schema_version(con), i)
+
+    def test_migrate_rows(self):
+        # Given
+        path = self.copy_schema(6)
+        with closing(sqlite3.connect(path)) as con, con:
+            con.executemany("INSERT INTO stuff (id, body, state) "
+                            "VALUES (?, ?, ?)",
+                            [(1633505813950990 + i, f"item {i}", 2 + i % 3)
+                             for i in range(25)])
+            con.executemany("INSERT INTO tags (id, tag) VALUES (?, ?)",
+                            [(1633505813950990 + i, f"tag{i % 2}")
+                             for i in range(0, 25, 3)])
+        # When
+        with patch.object(mind.Mind, "migrate_batch", 10), \
+                self.assertLogs(level=logging.INFO) as logs:
+            with mind.Mind(path, strict=True) as sesh:
+                active = mind.QueryStuff(limit=100).fetchall(sesh)
+                tagged = mind.QueryStuff(tag="tag0").fetchall(sesh)
+                records = sesh.head().sn
+        # Then
+        self.assertEqual(len(active), 9)
+        self.assertListEqual([s.body for s in tagged],
+                             ["item 24", "item 18", "item 12", "item 6",
+                              "item 0"])
+        self.assertEqual(records, 1 + 26 + 17)
+        self.assertIn("Migrated 26/26 rows from schema v6", logs.output[-1])
+
+    def test_migrate_keeps_log(self):
+        # Given
+        path = self.copy_schema(6)
+        with closing(sqlite3.connect(path)) as con:
+            before = con.execute("SELECT * FROM log").fetchall()
+        # When
+        with mind.Mind(path, strict=True) as sesh:
+            kept = sesh.con.execute("SELECT * FROM v6_log").fetchall()
+            tables = mind.legacy_versions(sesh.con)
+        # Then
+        self.assertListEqual(kept, before)
+        self.assertListEqual(tables, [])
+
+    def test_migrate_resume(self):
+        # Given
+        path = self.copy_schema(4)
+        with closing(sqlite3.connect(path)) as con, con:
+            con.executemany("INSERT INTO stuff (id, body, state) "
+                            "VALUES (?, ?, ?)",
+                            [(1633505813950990 + i, f"item {i}", 0)
+                             for i in range(30)])
+        with patch.object(mind.Mind, "migrate_batch", 10), \
+                patch("mind.mind.report_progress",
+                      side_effect=[None, KeyboardInterrupt]):
+            with self.assertRaises(KeyboardInterrupt):
+                mind.Mind(path)
+        # When
+        with mind.Mind(path, strict=True) as sesh:
+            active = mind.QueryStuff(limit=100).fetchall(sesh)
+            tables = mind.legacy_versions(sesh.con)
+        # Then
+        self.assertEqual(len(active), 30)
+        self.assertEqual(len(set(s.id for s in active)), 30)
+        self.assertListEqual(tables, [])
 
     def test_latest_schema(self):
         # Given
-        path = Path("tests/data/schema-v7.db")
+        path = self.copy_schema(7)
         # When
         with mind.Mind(path, strict=True):
             pass
         # Then verify on exit
+
+    def test_upgrade_packs_bodies(self):
+        # Given
+        path = self.copy_schema(7)
+        body = "Long one\n" + "words " * mind.COMPRESS_AT
+        with closing(sqlite3.connect(path)) as con, con:
+            con.execute("INSERT INTO stuff (id, body, state) VALUES (?, ?, ?)",
+                        (1633505813950990, body, 2))
+        # When
+        with mind.Mind(path, strict=True) as sesh:
+            stored = sesh.con.execute(
+                "SELECT codec, preview FROM stuff WHERE id = 1633505813950990"
+            ).fetchone()
+            listed = mind.QueryStuff(full=True).fetchall(sesh)
+        # Then
+        self.assertTupleEqual(stored, (mind.Codec.ZLIB, "Long one"))
+        self.assertIn(body, [s.body for s in listed])
+
+    def test_upgrade_resume(self):
+        # Given rows to rebuild, with a tag repeated across batches.
+        path = self.copy_schema(7)
+        with closing(sqlite3.connect(path)) as con, con:
+            con.executemany("INSERT INTO stuff (id, body, state) "
+                            "VALUES (?, ?, ?)",
+                            [(1633505813950990 + i, f"item {i}", 2)
+                             for i in range(25)])
+            con.executemany("INSERT INTO tags (id, tag) VALUES (?, ?)",
+                            [(1633505813950990 + i % 5, "again")
+                             for i in range(25)])
+        with patch.object(mind.Mind, "migrate_batch", 10), \
+                patch("mind.mind.report_progress",
+                      side_effect=[None, KeyboardInterrupt]):
+            with self.assertRaises(KeyboardInterrupt):
+                mind.Mind(path)
+        # When
+        with patch.object(mind.Mind, "migrate_batch", 10), \
+                self.assertLogs(level=logging.INFO) as logs:
+            with mind.Mind(path, strict=True) as sesh:
+                version = mind.schema_version(sesh.con)
+                items = mind.QueryStuff(limit=100).fetchall(sesh)
+                tagged = mind.QueryStuff(tag="again").fetchall(sesh)
+                tables = sesh.con.execute(
+                    "SELECT name FROM sqlite_master WHERE name GLOB 'new_*'"
+                ).fetchall()
+        # Then
+        self.assertEqual(version, mind.SCHEMA_VERSION)
+        self.assertEqual(len([s for s in items if s.body.startswith("item")]),
+                         25)
+        self.assertEqual(len(tagged), 5)
+        self.assertListEqual(tables, [])
+        self.assertTrue(any("from schema v16" in line
+                            for line in logs.output))
+
+    def test_latest_schema_upgraded(self):
+        # Given
+        path = self.copy_schema(7)
+        # When
+        with mind.Mind(path, strict=True) as sesh:
+            version = mind.schema_version(sesh.con)
+            indexes = [row[0] for row in sesh.con.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' "
+                "AND sql IS NOT NULL")]
+            counts = [sesh.con.execute(f"SELECT COUNT(*) FROM {t}").fetchone()
+                      for t in (mind.STUFF, mind.SEARCH)]
+            hashes = sesh.con.execute("SELECT DISTINCT typeof(hash), "
+                                      "length(hash) FROM log").fetchall()
+            stats = sesh.con.execute("SELECT * FROM tag_stats").fetchall()
+            tags = sesh.con.execute(
+                "SELECT DISTINCT tag_id FROM tags").fetchall()
+        # Then
+        self.assertEqual(version, mind.SCHEMA_VERSION)
+        self.assertIn("stuff_state_id", indexes)
+        self.assertIn("tags_id", indexes)
+        self.assertIn("log_stuff", indexes)
+        self.assertEqual(counts[0], counts[1])
+        self.assertListEqual(hashes, [("blob", 20)])
+        self.assertEqual(len(stats), len(tags))
@@ -3,8 +3,9 @@ import unittest
 
 from mind import mind
 
-INSERT_FOO = "INSERT INTO foo (sn, hash, stuff, stamp, old_state, new_state)" \
-             " VALUES (:sn, :hash, :stuff, :stamp, :old_state, :new_state)"
+INSERT_FOO = "INSERT INTO foo (sn, hash, stuff, stamp, old_state, new_state," \
+             " algo) VALUES (:sn, :hash, :stuff, :stamp, :old_state," \
+             " :new_state, :algo)"
 
 
 class TestLRM(unittest.TestCase):
@@ -16,6 +17,6 @@ class TestLRM(unittest.TestCase):
         self.assertEqual(stmt, INSERT_FOO)
 
     def test_insert_even_if_none(self):
-        rcd = mind.Record(0, None, None, None, None, None)
+        rcd = mind.Record(0, None, None, None, None, None, None)
         stmt = mind.insert("foo", rcd)
         self.assertEqual(stmt, INSERT_FOO)
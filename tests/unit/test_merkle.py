@@ -0,0 +1,157 @@
+from argparse import Namespace
+from pathlib import Path
+from shutil import copyfile
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest import TestCase
+from unittest.mock import patch
+
+from mind.mind import Digest, Mind, Proof, add_content, bag_peaks, \
+    do_proof, do_root, first_difference, merkle_hash
+from tests import setup_context
+
+
+def naive_root(leaves: list[Digest]) -> Digest:
+    peaks, start = [], 0
+    while start < len(leaves):
+        width = 1 << (len(leaves) - start).bit_length() - 1
+        level = leaves[start:start + width]
+        while len(level) > 1:
+            level = [merkle_hash(a, b) for a, b in zip(level[::2],
+                                                       level[1::2])]
+        peaks.append(level[0])
+        start += width
+    return bag_peaks(peaks)
+
+
+class TestMerkle(TestCase):
+    MEM = ":memory:"
+
+    def setUp(self) -> None:
+        self.sesh = setup_context(self, Mind(self.MEM, strict=False))
+
+    def leaves(self) -> list[Digest]:
+        return [Digest(row[0].hex()) for row in
+                self.sesh.con.execute("SELECT hash FROM log ORDER BY sn")]
+
+    def test_grows_with_verify(self):
+        for i in range(1, 40):
+            with self.subTest(i):
+                # Given
+                for _ in range(i % 4):
+                    add_content(self.sesh, [f"hello{i}"])
+                # When
+                self.sesh.verify()
+                # Then
+                self.assertEqual(self.sesh.merkle_size(),
+                                 self.sesh.head().sn)
+                self.assertEqual(self.sesh.merkle_root(),
+                                 naive_root(self.leaves()))
+
+    def test_prove_each_record(self):
+        # Given
+        for i in range(20):
+            add_content(self.sesh, [f"hello{i}"])
+        self.sesh.verify()
+        for sn in range(1, 22):
+            with self.subTest(sn):
+                # When
+                proof = self.sesh.prove(sn)
+                # Then
+                self.assertTrue(Proof.parse(str(proof)).check())
+                self.assertEqual(proof.root, self.sesh.merkle_root())
+
+    def test_bad_proof(self):
+        # Given
+        for i in range(20):
+            add_content(self.sesh, [f"hello{i}"])
+        self.sesh.verify()
+        proof = self.sesh.prove(7)
+        # When
+        moved = proof._replace(sn=8)
+        forged = proof._replace(hash=Digest("00" * 20))
+        # Then
+        self.assertFalse(moved.check())
+        self.assertFalse(forged.check())
+        self.assertIsNone(self.sesh.prove(99))
+
+    def test_do_proof(self):
+        # Given
+        for i in range(5):
+            add_content(self.sesh, [f"hello{i}"])
+        self.sesh.verify()
+        # When
+        proof = do_proof(self.sesh, Namespace(proof=3, check=None))[0]
+        checked = do_proof(self.sesh, Namespace(proof=None, check=proof))
+        # Then
+        self.assertListEqual(checked, ["Record 3 is in this mind."])
+
+    def test_first_difference(self):
+        # Given
+        tmp = setup_context(self, TemporaryDirectory())
+        path, copy = Path(tmp) / "a.db", Path(tmp) / "b.db"
+        with Mind(path) as sesh:
+            for i in range(30):
+                add_content(sesh, [f"hello{i}"])
+        copyfile(path, copy)
+        with Mind(path) as sesh, Mind(copy) as other:
+            add_content(sesh, ["mine"])
+            add_content(other, ["yours"])
+            sesh.verify()
+            other.verify()
+            # When
+            diff = first_difference(sesh, other)
+            output = do_root(sesh, Namespace(compare=str(copy)))
+        # Then
+        self.assertEqual(diff, 32)
+        self.assertEqual(output[1], "Minds differ from record 32.")
+
+    def test_racing_growth(self):
+        # Given a mind whose tree is yet to grow.
+        tmp = setup_context(self, TemporaryDirectory())
+        path = Path(tmp) / "a.db"
+        with Mind(path) as sesh:
+            for i in range(20):
+                add_content(sesh, [f"hello{i}"])
+            sesh.con.execute("DELETE FROM merkle")
+            sesh.con.execute("DELETE FROM marks WHERE name = 'merkle'")
+            sesh.con.commit()
+        first = setup_context(self, Mind(path, background=True))
+        head = first.load_head()
+
+        def grow() -> None:
+            with Mind(path, background=True) as other:
+                other.grow_merkle(head)
+        racer = Thread(target=grow)
+        size = first.merkle_size
+
+        def racing_size() -> int:
+            read = size()
+            racer.start()
+            racer.join(0.5)
+            return read
+        # When the other one grows it between reading the size and writing.
+        with patch.object(first, "merkle_size", side_effect=racing_size):
+            first.grow_merkle(head)
+        racer.join(10)
+        # Then
+        self.assertEqual(first.merkle_size(), head.sn)
+        self.assertEqual(first.merkle_root(), naive_root(
+            [Digest(row[0].hex()) for row in
+             first.con.execute("SELECT hash FROM log ORDER BY sn")]))
+
+    def test_compare_missing_mind(self):
+        # Given
+        tmp = setup_context(self, TemporaryDirectory())
+        missing = Path(tmp) / "missing.db"
+        # When
+        output = do_root(self.sesh, Namespace(compare=str(missing)))
+        # Then
+        self.assertEqual(output[1], f"No mind at {missing}.")
+        self.assertFalse(missing.exists())
+
+    def test_check_bad_proof(self):
+        # When
+        output = do_proof(self.sesh, Namespace(proof=None, check="{nope"))
+        # Then
+        self.assertTrue(output[0].startswith("Not a proof: "))
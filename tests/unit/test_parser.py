@@ -42,3 +42,85 @@ class TestParser(unittest.TestCase):
         # Then
         self.assertEqual(result.cmd, input[0])
         self.assertEqual(result.file, input[2])
+
+    def test_add_per_line(self):
+        # Given
+        input = ["add", "--file", "foo.txt", "--per-line"]
+        # When
+        result = mind.setup(input)
+        # Then
+        self.assertTrue(result.per_line)
+        self.assertFalse(mind.setup(input[:3]).per_line)
+
+    def test_list_after(self):
+        # Given
+        input = ["list", "--after", "5f5e100"]
+        # When
+        result = mind.setup(input)
+        # Then
+        self.assertEqual(result.after, "5f5e100")
+        self.assertIsNone(result.before)
+
+    def test_search(self):
+        # Given
+        input = ["search", "buy", "milk", "--tag", "shop", "--phase", "done"]
+        # When
+        result = mind.setup(input)
+        # Then
+        self.assertListEqual(result.search, ["buy", "milk"])
+        self.assertEqual(result.tag, "shop")
+        self.assertEqual(result.phase, "done")
+
+    def test_verify(self):
+        # When
+        result = mind.setup(["verify", "--jobs", "4"])
+        # Then
+        self.assertEqual(result.cmd, "verify")
+        self.assertEqual(result.jobs, 4)
+        self.assertGreaterEqual(mind.setup(["verify"]).jobs, 1)
+
+    def test_proof(self):
+        # When
+        result = mind.setup(["proof", "42"])
+        # Then
+        self.assertEqual(result.proof, 42)
+        self.assertEqual(mind.setup(["proof", "--check", "{}"]).check, "{}")
+
+    def test_root(self):
+        # When
+        result = mind.setup(["root", "--compare", "other.db"])
+        # Then
+        self.assertEqual(result.cmd, "root")
+        self.assertEqual(result.compare, "other.db")
+
+    def test_background(self):
+        # When
+        result = mind.setup(["--background", "check"])
+        # Then
+        self.assertTrue(result.background)
+        self.assertEqual(result.cmd, "check")
+        self.assertFalse(mind.setup([]).background)
+
+    def test_rehash(self):
+        # When
+        result = mind.setup(["rehash", "--algo", "blake2b"])
+        # Then
+        self.assertEqual(result.algo, "blake2b")
+        self.assertEqual(mind.setup(["rehash"]).algo, "sha1")
+
+    def test_archive(self):
+        # When
+        result = mind.setup(["archive", "--days", "7"])
+        # Then
+        self.assertEqual(result.cmd, "archive")
+        self.assertEqual(result.days, 7)
+        self.assertEqual(mind.setup(["archive"]).days, 30)
+
+    def test_profile(self):
+        # Given
+        input = ["--profile", "fast-wal", "list"]
+        # When
+        result = mind.setup(input)
+        # Then
+        self.assertEqual(result.profile, "fast-wal")
+        self.assertEqual(mind.setup([]).profile, "durable")
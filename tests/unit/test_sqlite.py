@@ -2,18 +2,25 @@ from argparse import Namespace
 from datetime import datetime, UTC
 
 from contextlib import redirect_stdout
+from pathlib import Path
+from tempfile import TemporaryDirectory
 
 import io
 from time import sleep
 import logging
+import os
 import random
+import sqlite3
 import string
 import unittest
 
 from unittest.mock import patch
 
-from mind.mind import Mind, QueryStuff, add_content, \
-    QueryTags, do_list, do_forget, do_tick, do_add, do_show
+from mind.mind import Mind, Order, Phase, QueryStuff, add_content, \
+    QueryTags, do_list, do_forget, do_tick, do_add, do_show, from_cursor, \
+    QueryPositions, parse_item, PROFILES, READ_ONLY, QuerySearch, \
+    do_search, search_terms, Codec, Epoch, do_history, update_state, \
+    QueryTagCounts, do_tags, add_many, DURABLE, FAST_WAL
 from tests import setup_context
 
 
@@ -36,6 +43,248 @@ class TestSQLite(unittest.TestCase):
         cur2 = self.sesh.con.execute("SELECT * FROM tags")
         self.assertEqual(cur2.lastrowid, 1)
 
+    def test_queries_use_indexes(self):
+        # Given
+        plans = [("stuff_state_id", QueryStuff().cmd()),
+                 ("tags_id", QueryStuff(tag="foo").cmd()),
+                 ("tags_id", QueryTags(id=1).cmd()),
+                 ("tag_names_1 (name=?)", QueryStuff(tag="foo").cmd())]
+        for index, cmd in plans:
+            with self.subTest(index):
+                # When
+                plan = self.sesh.con.execute(
+                    f"EXPLAIN QUERY PLAN {cmd}",
+                    {"state": 2, "tag": "foo", "limit": 1, "offset": 0,
+                     "id": 1}).fetchall()
+                # Then
+                self.assertIn(index, " ".join(row[3] for row in plan))
+
+    def test_compact_storage(self):
+        # Given
+        add_content(self.sesh, ["one #shared #a"])
+        add_content(self.sesh, ["two #shared"])
+        # When
+        head = self.sesh.head()
+        stored = self.sesh.con.execute(
+            "SELECT typeof(hash), length(hash) FROM log WHERE sn = :sn",
+            {"sn": head.sn}).fetchone()
+        names = self.sesh.con.execute(
+            "SELECT name FROM tag_names ORDER BY tag_id").fetchall()
+        # Then
+        self.assertRegex(head.hash, "^[0-9a-f]{40}$")
+        self.assertTupleEqual(stored, ("blob", 20))
+        self.assertListEqual(names, [("a",), ("shared",)])
+        self.assertListEqual([s.body for s in QueryStuff(
+            tag="shared").fetchall(self.sesh)], ["two", "one"])
+        self.sesh.verify()
+
+    def test_packed_bodies(self):
+        # Given
+        long = ["First line", "lots of words" * 200]
+        huge = ["Huge", "more words" * 10_000]
+        add_content(self.sesh, long)
+        add_content(self.sesh, huge)
+        add_content(self.sesh, ["short"])
+        # When
+        stored = self.sesh.con.execute(
+            "SELECT codec, typeof(body), preview FROM stuff "
+            "WHERE state = 2 ORDER BY id").fetchall()
+        listed = QueryStuff().fetchall(self.sesh)
+        full = QueryStuff(full=True).fetchall(self.sesh)
+        shown = do_show(self.sesh, Namespace(show="3"))
+        do_tick(self.sesh, Namespace(tick="3"))
+        # Then
+        self.assertListEqual(stored, [(Codec.ZLIB, "blob", "First line"),
+                                      (Codec.LZMA, "blob", "Huge"),
+                                      (Codec.PLAIN, "text", "")])
+        self.assertListEqual([s.body for s in listed],
+                             ["short", "Huge", "First line"])
+        self.assertListEqual([s.body for s in full],
+                             ["short", "\n".join(huge), "\n".join(long)])
+        self.assertEqual(shown[1], "\n".join(long))
+        self.sesh.verify()
+
+    def test_tag_stats(self):
+        # Given
+        for i in range(12):
+            add_content(self.sesh, [f"entry {i} #t{i % 3} #all"])
+        do_tick(self.sesh, Namespace(tick="1-4"))
+        do_forget(self.sesh, Namespace(forget="1"))
+        hidden = QueryStuff(state=Phase.HIDDEN, limit=1).fetchone(self.sesh)
+        update_state(hidden, self.sesh, Phase.ACTIVE)
+        # When
+        counts = QueryTagCounts().execute(self.sesh)
+        latest = QueryTags(id=None, limit=2).execute(self.sesh)
+        # Then
+        self.assertListEqual([str(c) for c in counts],
+                             ["#all (8/12)", "#t0 (3/4)", "#t1 (3/4)",
+                              "#t2 (2/4)"])
+        self.assertListEqual([t.tag for t in latest], ["all", "t2"])
+        self.assertEqual(latest[0].id, counts[0].latest)
+        self.assertListEqual(do_tags(self.sesh, Namespace(num=1))[1:3],
+                             ["-" * 80, " #all (8/12)"])
+
+    def test_archive(self):
+        with TemporaryDirectory() as tmp:
+            # Given
+            path = Path(tmp) / "mind.db"
+            with Mind(path) as sesh:
+                for i in range(10):
+                    add_content(sesh, [f"entry {i} #tag{i % 2}"])
+                do_tick(sesh, Namespace(tick="1,3,5"))
+                do_forget(sesh, Namespace(forget="1-2"))
+                # When
+                moved = sesh.archive(Epoch.now())
+                hot = sesh.con.execute(
+                    "SELECT COUNT(*) FROM main.stuff").fetchone()[0]
+                done = QueryStuff(state=Phase.DONE,
+                                  tag="tag1").fetchall(sesh)
+                sesh.verify()
+            with Mind(path, strict=True) as sesh:
+                forgotten = QueryStuff(state=Phase.HIDDEN).fetchall(sesh)
+                update_state(forgotten[0], sesh, Phase.ACTIVE)
+                active = QueryStuff().fetchall(sesh)
+                history = do_history(sesh, Namespace(page=1, num=20))
+                sesh.verify()
+        # Then
+        self.assertEqual(moved, 6)
+        self.assertEqual(hot, 5)
+        self.assertListEqual([s.body for s in done],
+                             ["entry 9", "entry 7", "entry 5"])
+        self.assertEqual(len(forgotten), 3)
+        self.assertIn(forgotten[0].body, [s.body for s in active])
+        self.assertTrue(history[-1].endswith("EMPTY Tags [ ]"))
+
+    def test_untick_archived_since_open(self):
+        with TemporaryDirectory() as tmp:
+            # Given a mind opened before another one archived.
+            path = Path(tmp) / "mind.db"
+            with Mind(path) as sesh:
+                stuff, _ = add_content(sesh, ["entry"])
+                update_state(stuff, sesh, Phase.DONE)
+            with Mind(path) as early:
+                done = QueryStuff(state=Phase.DONE).fetchall(early)
+                with Mind(path) as sesh:
+                    sesh.archive(Epoch.now())
+                # When
+                update_state(done[0], early, Phase.ACTIVE)
+            # Then
+            with Mind(path, strict=True) as sesh:
+                active = QueryStuff().fetchall(sesh)
+        self.assertEqual([s.body for s in active], ["entry"])
+
+    def test_update_missing_stuff(self):
+        # Given
+        stuff, _ = add_content(self.sesh, ["entry"])
+        head = self.sesh.head()
+        missing = stuff._replace(id=Epoch(stuff.id + 1))
+        # When
+        with self.assertRaises(sqlite3.IntegrityError):
+            update_state(missing, self.sesh, Phase.DONE)
+        # Then
+        self.assertEqual(self.sesh.load_head().sn, head.sn)
+
+    def test_archive_in_memory(self):
+        self.assertEqual(self.sesh.archive(Epoch.now()), 0)
+
+    def test_profiles(self):
+        for name, profile in PROFILES.items():
+            with self.subTest(name), TemporaryDirectory() as tmp:
+                # Given
+                path = Path(tmp) / "mind.db"
+                with Mind(path):
+                    pass
+                # When
+                with Mind(path, profile=name) as sesh:
+                    mode = sesh.con.execute("PRAGMA journal_mode").fetchone()
+                    sync = sesh.con.execute("PRAGMA synchronous").fetchone()
+                # Then
+                if profile.journal_mode:
+                    self.assertEqual(mode[0], profile.journal_mode.lower())
+                self.assertEqual(sync[0], {"OFF": 0, "NORMAL": 1, "FULL": 2}[
+                    profile.synchronous])
+
+    def test_durable_keeps_wal(self):
+        with TemporaryDirectory() as tmp:
+            # Given
+            path = Path(tmp) / "mind.db"
+            with Mind(path, profile=FAST_WAL) as web:
+                # When
+                with self.assertNoLogs(level="WARNING"), \
+                        Mind(path, profile=DURABLE) as sesh:
+                    add_content(sesh, ["durable"])
+                mode = web.con.execute("PRAGMA journal_mode").fetchone()
+        # Then
+        self.assertEqual(mode[0], "wal")
+
+    def test_read_only_profile(self):
+        with TemporaryDirectory() as tmp:
+            # Given
+            path = Path(tmp) / "mind.db"
+            with Mind(path) as sesh:
+                add_content(sesh, ["one"])
+            # When
+            with Mind(path, profile=READ_ONLY) as sesh:
+                fetched = QueryStuff().fetchall(sesh)
+                # Then
+                with self.assertRaises(sqlite3.OperationalError):
+                    add_content(sesh, ["two"])
+        self.assertEqual([s.body for s in fetched], ["one"])
+
+    def test_read_only_relative_path(self):
+        with TemporaryDirectory() as tmp:
+            # Given
+            self.addCleanup(os.chdir, os.getcwd())
+            os.chdir(tmp)
+            with Mind("mind.db") as sesh:
+                add_content(sesh, ["one"])
+                sesh.archive(Epoch.now())
+            # When
+            with Mind("mind.db", profile=READ_ONLY) as sesh:
+                fetched = QueryStuff().fetchall(sesh)
+            with Mind(":memory:", profile=READ_ONLY) as sesh:
+                empty = QueryStuff().fetchall(sesh)
+        # Then
+        self.assertEqual([s.body for s in fetched], ["one"])
+        self.assertEqual(empty, [])
+
+    def test_cached_head(self):
+        # Given
+        statements: list[str] = []
+        self.sesh.con.set_trace_callback(statements.append)
+        self.addCleanup(self.sesh.con.set_trace_callback, None)
+        # When
+        add_content(self.sesh, ["one"])
+        add_content(self.sesh, ["two"])
+        # Then the head was cached when the mind was created.
+        self.assertFalse([s for s in statements if "FROM log" in s])
+        self.assertEqual(self.sesh.head().hash, self.sesh.load_head().hash)
+
+    def test_cached_head_rolls_back(self):
+        # Given
+        head = self.sesh.head()
+        # When
+        with self.assertRaises(sqlite3.IntegrityError):
+            with self.sesh.writing(head._replace(sn=head.sn + 1)):
+                self.sesh.con.execute("INSERT INTO stuff (id) VALUES (1)")
+        # Then
+        self.assertEqual(self.sesh.head(), head)
+
+    def test_head_written_elsewhere(self):
+        with TemporaryDirectory() as tmp:
+            # Given
+            path = Path(tmp) / "mind.db"
+            with Mind(path) as sesh, Mind(path) as other:
+                add_content(sesh, ["one"])
+                other.head()
+                # When
+                add_content(sesh, ["two"])
+                add_content(other, ["three"])
+                # Then
+                self.assertEqual(sesh.head().sn, 4)
+                self.assertEqual(other.head().hash, sesh.load_head().hash)
+                sesh.verify()
+
     def test_verify_empty(self):
         logging.basicConfig(level=logging.DEBUG)
         with Mind(self.MEM, strict=True):
@@ -65,6 +314,85 @@ class TestSQLite(unittest.TestCase):
         self.assertEqual(10, len(fetched))
         self.assertGreater(fetched[0][0], fetched[-1][0])
 
+    def test_bulk_add(self):
+        # Given
+        self.sesh.add_batch = 3
+        add_content(self.sesh, ["first"])
+        items = ([f"entry {i} #t{i % 2}"] for i in range(7))
+        # When
+        added = add_many(self.sesh, items)
+        # Then one chain with unique ids, split over three transactions.
+        self.assertEqual(len({stuff.id for stuff, _ in added}), 7)
+        self.assertEqual(self.sesh.head().sn, 9)
+        self.sesh.verify()
+        self.assertListEqual([str(c) for c in
+                              QueryTagCounts().execute(self.sesh)],
+                             ["#t0 (4/4)", "#t1 (3/3)"])
+        self.assertEqual(len(QuerySearch("entry", limit=9).fetchall(
+            self.sesh)), 7)
+
+    def test_do_add_per_line(self):
+        # Given
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = Path(tmp.name) / "list.txt"
+        path.write_text("milk #shop\n\neggs #shop\nbread\n")
+        args = Namespace(text=None, file=str(path), per_line=True)
+        # When
+        output = do_add(self.sesh, args)
+        # Then
+        self.assertListEqual(output, ["Added 3 stuff."])
+        self.assertListEqual([s.body for s in QueryStuff().fetchall(
+            self.sesh)], ["bread", "eggs", "milk"])
+
+    def test_page_with_cursors(self):
+        # Given
+        for i in range(25):
+            add_content(self.sesh, [f"entry {i}"])
+        first = QueryStuff(limit=10).page(self.sesh)
+        # When
+        second = QueryStuff(limit=10, after=from_cursor(first.after))\
+            .page(self.sesh)
+        third = QueryStuff(limit=10, after=from_cursor(second.after))\
+            .page(self.sesh)
+        back = QueryStuff(limit=10, before=from_cursor(third.before))\
+            .page(self.sesh)
+        # Then
+        self.assertEqual([s.body for s in first.stuff],
+                         [f"entry {i}" for i in range(24, 14, -1)])
+        self.assertIsNone(first.before)
+        self.assertEqual([s.body for s in third.stuff],
+                         [f"entry {i}" for i in range(4, -1, -1)])
+        self.assertIsNone(third.after)
+        self.assertEqual(back, second)
+
+    def test_page_oldest_with_cursor(self):
+        # Given
+        for i in range(5):
+            add_content(self.sesh, [f"entry {i}"])
+        first = QueryStuff(order=Order.OLDEST, limit=2).page(self.sesh)
+        # When
+        second = QueryStuff(order=Order.OLDEST, limit=2,
+                            after=from_cursor(first.after)).page(self.sesh)
+        # Then
+        self.assertEqual([s.body for s in second.stuff],
+                         ["entry 2", "entry 3"])
+        self.assertEqual(second.before, repr(second.stuff[0].id))
+
+    def test_list_after_cursor(self):
+        # Given
+        for i in range(5):
+            add_content(self.sesh, [f"entry {i}"])
+        first = do_list(self.sesh, Namespace(cmd=None, num=2, page=1))
+        cursor = first[-4].split("--after ")[1].rstrip(")")
+        # When
+        output = do_list(self.sesh, Namespace(cmd=None, num=2, page=1,
+                                              after=cursor))
+        # Then
+        self.assertTrue(output[2].startswith("    And before... (--before"))
+        self.assertTrue(output[3].endswith("-> entry 2"))
+        self.assertTrue(output[4].endswith("-> entry 1"))
+
     def test_update_correct_entry(self):
         # Given
         to_tick = "some more stuff!!"
@@ -156,6 +484,101 @@ class TestSQLite(unittest.TestCase):
         self.assertEqual(len(ticked), 3)
         self.assertIn("  Hmm, couldn't find anything here.", listed)
 
+    def test_tick_range_and_list(self):
+        # Given
+        for i in range(50):
+            add_content(self.sesh, [f"entry {i}"])
+        # When
+        ticked = do_tick(self.sesh, Namespace(tick="3,40-41,10"))
+        # Then
+        self.assertListEqual([t.split(" -> ")[1] for t in ticked],
+                             ["entry 47", "entry 10", "entry 9", "entry 40"])
+        self.assertEqual(len(QueryStuff(limit=100).fetchall(self.sesh)), 46)
+
+    def test_tick_range_in_one_transaction(self):
+        # Given
+        add_many(self.sesh, ([f"entry {i}"] for i in range(300)))
+        head = self.sesh.head()
+        # When
+        with patch.object(self.sesh, "head", return_value=head) as reads:
+            ticked = do_tick(self.sesh, Namespace(tick="5-200"))
+        # Then the chain still verifies after one head read.
+        self.assertEqual(reads.call_count, 1)
+        self.assertEqual(len(ticked), 196)
+        self.assertEqual(self.sesh.head().sn, head.sn + 196)
+        self.sesh.verify()
+        self.assertEqual(len(QueryStuff(limit=400).fetchall(self.sesh)), 104)
+
+    def test_forget_by_tag(self):
+        # Given
+        for body in ("beets #shopping", "call boss", "celery #shopping"):
+            add_content(self.sesh, [body])
+        # When
+        forgotten = do_forget(self.sesh, Namespace(forget="#shopping"))
+        missing = do_forget(self.sesh, Namespace(forget="#shopping"))
+        # Then
+        self.assertListEqual([f.split(" -> ")[1] for f in forgotten],
+                             ["celery", "beets"])
+        self.assertListEqual(missing, ["No stuff tagged #shopping."])
+        self.assertListEqual([s.body for s in QueryStuff().fetchall(
+            self.sesh)], ["call boss"])
+        self.sesh.verify()
+
+    def test_positions_in_one_query(self):
+        # Given
+        for i in range(20):
+            add_content(self.sesh, [f"entry {i}"])
+        # When
+        found = QueryPositions([20, 1, 21, 0]).fetch(self.sesh)
+        # Then
+        self.assertListEqual(sorted(found), [1, 20])
+        self.assertEqual(found[1].body, "entry 19")
+        self.assertEqual(found[20].body, "entry 0")
+
+    def test_search(self):
+        # Given
+        add_content(self.sesh, ["buy milk #shop"])
+        add_content(self.sesh, ["milk, more milk"])
+        add_content(self.sesh, ["buy bread #shop"])
+        do_tick(self.sesh, Namespace(tick="1"))
+        # When
+        found = QuerySearch("milk").fetchall(self.sesh)
+        tagged = QuerySearch("buy", tag="shop").fetchall(self.sesh)
+        done = QuerySearch("bre*", state=Phase.DONE).fetchall(self.sesh)
+        # Then
+        self.assertListEqual([s.body for s in found],
+                             ["milk, more milk", "buy milk"])
+        self.assertListEqual([s.body for s in tagged], ["buy milk"])
+        self.assertListEqual([s.body for s in done], ["buy bread"])
+        self.assertListEqual(QuerySearch('" *').fetchall(self.sesh), [])
+
+    def test_search_terms(self):
+        self.assertEqual(search_terms("foo  ba*"), '"foo" "ba"*')
+        self.assertEqual(search_terms('a"b OR -c'), '"a""b" "OR" "-c"')
+        self.assertEqual(search_terms("* "), "")
+
+    def test_do_search(self):
+        # Given
+        for i in range(5):
+            add_content(self.sesh, [f"entry {i}"])
+        args = Namespace(search=["entry"], num=3, page=1, phase="active",
+                         tag=None)
+        # When
+        first = do_search(self.sesh, args)
+        args.page = 2
+        second = do_search(self.sesh, args)
+        # Then
+        self.assertEqual(len(first), 7)
+        self.assertEqual(first[-2], "    And more... (--page 2)")
+        self.assertEqual(len(second), 5)
+
+    def test_parse_item(self):
+        self.assertListEqual(parse_item("1"), [1])
+        self.assertListEqual(parse_item("3,1-3,9"), [3, 1, 2, 9])
+        self.assertListEqual(parse_item("5-4"), [])
+        with self.assertRaises(ValueError):
+            parse_item("1-")
+
     def test_tick_empty_db(self):
         # Given
         args = Namespace(tick="1")
@@ -177,6 +600,18 @@ class TestSQLite(unittest.TestCase):
         self.assertEqual(output[1], "hello")
         self.assertEqual(output[2], "-" * 40)
 
+    def test_show_multiple(self):
+        # Given
+        do_add(self.sesh, Namespace(text="first #one"))
+        do_add(self.sesh, Namespace(text="second #two"))
+        # When
+        output = do_show(self.sesh, Namespace(show="2,3,1"))
+        # Then
+        self.assertEqual(output[1], "first")
+        self.assertEqual(output[3], "Stuff [3] not found.")
+        self.assertTrue(output[4].endswith("Tags [two]"))
+        self.assertEqual(output[5], "second")
+
     def test_show_failure(self):
         # Given
         args = Namespace(show="1")
@@ -7,16 +7,57 @@ class TestTypes(unittest.TestCase):
 
     def test_tag_table(self):
         # When
-        cmd = mind.build_create_table_cmd("tags", mind.Tag)
+        cmd = mind.build_create_table_cmd("tags", mind.TagRef)
         # Then
-        self.assertEqual("CREATE TABLE tags(id EPOCH NOT NULL, "
-                         "tag TEXT NOT NULL)", cmd)
+        self.assertEqual("CREATE TABLE tags(id INTEGER NOT NULL, "
+                         "tag_id INTEGER NOT NULL, PRIMARY KEY (tag_id, id)) "
+                         "WITHOUT ROWID", cmd)
+
+    def test_tag_name_table(self):
+        # When
+        cmd = mind.build_create_table_cmd("tag_names", mind.TagName)
+        # Then
+        self.assertEqual("CREATE TABLE tag_names(tag_id INTEGER NOT NULL, "
+                         "name TEXT NOT NULL, PRIMARY KEY (tag_id), "
+                         "UNIQUE (name))", cmd)
 
     def test_stuff_table(self):
         # When
-        cmd = mind.build_create_table_cmd("stuffs", mind.Stuff)
+        cmd = mind.build_create_table_cmd("stuffs", mind.PackedStuff)
+        # Then
+        self.assertEqual("CREATE TABLE stuffs(id INTEGER NOT NULL, "
+                         "body BLOB NOT NULL, state PHASE NOT NULL CHECK ("
+                         "state BETWEEN 1 AND 4), codec INTEGER NOT NULL "
+                         "CHECK (codec BETWEEN 0 AND 2), preview TEXT NOT "
+                         "NULL, PRIMARY KEY (id))", cmd)
+
+    def test_pack(self):
+        for codec in mind.Codec:
+            with self.subTest(codec.name):
+                # When
+                packed = mind.pack(codec, "body\nbody")
+                # Then
+                self.assertEqual(mind.unpack(codec, packed), "body\nbody")
+        self.assertEqual(mind.codec_for(mind.COMPRESS_AT - 1),
+                         mind.Codec.PLAIN)
+
+    def test_index_cmd(self):
+        # When
+        cmd = mind.build_create_index_cmd("stuff", ("state", "id"))
+        # Then
+        self.assertEqual("CREATE INDEX IF NOT EXISTS stuff_state_id "
+                         "ON stuff(state, id)", cmd)
+
+    def test_row_type(self):
+        # Given
+        raw = (100000000, "body", 3)
+        # When
+        row = mind.to_row(mind.StuffRow, raw)
         # Then
-        self.assertEqual("CREATE TABLE stuffs(id EPOCH NOT NULL, "
-                         "body TEXT NOT NULL, state PHASE NOT NULL CHECK ("
-                         "state BETWEEN 1 AND 4), "
-                         "PRIMARY KEY (id))", cmd)
+        self.assertIsInstance(row, mind.Stuff)
+        self.assertEqual(row[0], 100000000)
+        self.assertEqual(repr(row.id), "5f5e100")
+        self.assertIs(row.state, mind.Phase.DONE)
+        self.assertEqual(row, mind.Stuff(mind.Epoch(100000000), "body",
+                                         mind.Phase.DONE))
+        self.assertEqual(row.canonical(), "Stuff [5f5e100,]")
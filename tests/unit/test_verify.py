@@ -1,10 +1,12 @@
 from argparse import Namespace
 from contextlib import redirect_stdout
 from io import StringIO
+from tempfile import NamedTemporaryFile
 from unittest import skip, TestCase
 from unittest.mock import patch
 
-from mind.mind import Mind, add_content, IntegrityError, do_forget
+from mind.mind import FAILED, VERIFIED, Change, Checker, HashAlgo, Mind, \
+    Record, Sequence, add_content, IntegrityError, do_forget, do_verify
 from tests import setup_context
 
 
@@ -33,6 +35,7 @@ class TestVerify(TestCase):
             add_content(self.sesh, ["hello"])
         self.sesh.con.execute("UPDATE log SET hash=:hash WHERE sn=:sn",
                               {"hash": "bad_hash", "sn": 60})
+        self.sesh.catch_up = 0
         # When
         self.sesh.verify(40)
         # Then no error raised.
@@ -74,7 +77,8 @@ class TestVerify(TestCase):
         # Given
         for i in range(100):
             add_content(self.sesh, [f"hello{i} #tag{i}"])
-        self.sesh.con.execute("UPDATE tags SET tag=:new WHERE tag=:old",
+        self.sesh.con.execute("UPDATE tag_names SET name=:new "
+                              "WHERE name=:old",
                               {"new": "bad tag", "old": "tag50"})
         # When
         with self.assertRaises(IntegrityError):
@@ -84,8 +88,348 @@ class TestVerify(TestCase):
         # Given
         for i in range(100):
             add_content(self.sesh, [f"hello{i} #tag{i}"])
-        self.sesh.con.execute("DELETE FROM tags WHERE tag=:old",
+        self.sesh.con.execute("DELETE FROM tags WHERE tag_id=(SELECT tag_id "
+                              "FROM tag_names WHERE name=:old)",
                               {"old": "tag50"})
         # When
         with self.assertRaises(IntegrityError):
             self.sesh.verify()
+
+    def test_verify_writes_checkpoints(self):
+        # Given
+        self.sesh.checkpoint_every = 10
+        for i in range(35):
+            add_content(self.sesh, [f"hello{i}"])
+        # When
+        self.sesh.verify()
+        # Then
+        self.assertListEqual([point.sn for point in self.sesh.checkpoints()],
+                             [10, 20, 30])
+
+    def test_verify_starts_at_checkpoint(self):
+        # Given
+        self.sesh.checkpoint_every = 10
+        for i in range(35):
+            add_content(self.sesh, [f"hello{i}"])
+        self.sesh.verify()
+        self.sesh.con.execute("UPDATE stuff SET body=:body WHERE body=:orig",
+                              {"body": "bad body", "orig": "hello5"})
+        # When
+        self.sesh.verify()
+        # Then the full audit still finds it.
+        self.assertEqual(self.sesh.audit(), 7)
+
+    def test_quick_verify_catches_up(self):
+        # Given more new records than a quick verify checks.
+        self.sesh.catch_up = 20
+        for i in range(45):
+            add_content(self.sesh, [f"hello{i}"])
+        # When
+        self.sesh.verify(10)
+        first = self.sesh.mark(VERIFIED).sn
+        self.sesh.verify(10)
+        self.sesh.verify(10)
+        # Then
+        self.assertEqual(first, 21)
+        self.assertEqual(self.sesh.mark(VERIFIED).sn, 46)
+        self.assertEqual(self.sesh.merkle_size(), 46)
+
+    def test_verify_bad_checkpoint(self):
+        # Given
+        self.sesh.checkpoint_every = 10
+        for i in range(35):
+            add_content(self.sesh, [f"hello{i}"])
+        self.sesh.verify()
+        self.sesh.con.execute("UPDATE checkpoints SET hash=zeroblob(20) "
+                              "WHERE sn=20")
+        # When / Then
+        with self.assertRaises(IntegrityError):
+            self.sesh.verify()
+
+    def test_audit_finds_first_bad_record(self):
+        # Given
+        self.sesh.checkpoint_every = 10
+        for i in range(100):
+            add_content(self.sesh, [f"hello{i} #tag{i}"])
+        self.sesh.verify()
+        self.sesh.con.execute("UPDATE log SET hash=zeroblob(20) "
+                              "WHERE sn IN (43, 81)")
+        # When
+        first = self.sesh.audit()
+        # Then
+        self.assertEqual(first, 43)
+
+    def rechain(self, body: str) -> None:
+        # Changes a body and hashes every later record again to match.
+        self.sesh.con.execute("UPDATE stuff SET body=:body WHERE body=:orig",
+                              {"body": "bad body", "orig": body})
+        sn = self.sesh.con.execute("SELECT log.sn FROM log JOIN stuff ON "
+                                   "log.stuff = stuff.id WHERE body = "
+                                   "'bad body'").fetchone()[0]
+        records = list(self.sesh.stream(sn - 1, self.sesh.head().sn))
+        parent = records[0][0]
+        for record, stuff, tags in records[1:]:
+            parent = Change(parent, stuff, record.act(), record.stamp, tags,
+                            record.algo).record()
+            self.sesh.con.execute("UPDATE log SET hash=:hash WHERE sn=:sn",
+                                  {"hash": parent.hash, "sn": parent.sn})
+        self.sesh.cached = None
+
+    def test_audit_rechained_records(self):
+        # Given
+        self.sesh.checkpoint_every = 10
+        for i in range(40):
+            add_content(self.sesh, [f"hello{i}"])
+        self.sesh.verify()
+        self.rechain("hello14")
+        # When
+        failed = self.sesh.audit()
+        # Then the checkpoints at 20 and 30 no longer match.
+        self.assertGreater(failed, 10)
+        self.assertLessEqual(failed, 20)
+
+    def test_audit_rechained_head(self):
+        # Given the only diverged checkpoint is the head.
+        self.sesh.checkpoint_every = 5
+        for i in range(9):
+            add_content(self.sesh, [f"hello{i}"])
+        self.sesh.verify()
+        self.rechain("hello6")
+        self.sesh.set_mark(FAILED, Record(Sequence(8)))
+        # When
+        failed = self.sesh.audit()
+        # Then
+        self.assertEqual(failed, 6)
+        self.assertIsNotNone(self.sesh.mark(FAILED))
+
+    def test_audit_clean_chain(self):
+        # Given
+        for i in range(30):
+            add_content(self.sesh, [f"hello{i}"])
+        # When / Then
+        self.assertIsNone(self.sesh.audit())
+
+    def test_verify_missing_record(self):
+        # Given
+        for i in range(20):
+            add_content(self.sesh, [f"hello{i}"])
+        self.sesh.con.execute("DELETE FROM log WHERE sn=12")
+        # When / Then
+        with self.assertRaises(IntegrityError):
+            self.sesh.verify()
+        self.assertEqual(self.sesh.audit(), 12)
+
+    def test_verify_missing_anchor(self):
+        # Given
+        for i in range(20):
+            add_content(self.sesh, [f"hello{i}"])
+        self.sesh.con.execute("DELETE FROM log WHERE sn=11")
+        # When / Then
+        with self.assertRaises(IntegrityError):
+            self.sesh.verify(10)
+
+    def test_parallel_audit(self):
+        # Given
+        tmp = setup_context(self, NamedTemporaryFile(suffix=".db"))
+        sesh = setup_context(self, Mind(tmp.name))
+        sesh.audit_chunk = 10
+        for i in range(60):
+            add_content(sesh, [f"hello{i}"])
+        sesh.con.execute("UPDATE stuff SET body=:body WHERE body=:orig",
+                         {"body": "bad body", "orig": "hello33"})
+        sesh.con.commit()
+        # When
+        failed = sesh.audit(jobs=2)
+        # Then
+        self.assertEqual(failed, 35)
+        self.assertEqual(sesh.audit(jobs=1), 35)
+
+    def test_parallel_audit_bad_tail(self):
+        # Given a bad record that verify_on_open would also find.
+        tmp = setup_context(self, NamedTemporaryFile(suffix=".db"))
+        sesh = setup_context(self, Mind(tmp.name))
+        sesh.audit_chunk = 10
+        for i in range(60):
+            add_content(sesh, [f"hello{i}"])
+        sesh.con.execute("UPDATE stuff SET body=:body WHERE body=:orig",
+                         {"body": "bad body", "orig": "hello55"})
+        sesh.con.commit()
+        # When
+        failed = sesh.audit(jobs=2)
+        # Then
+        self.assertEqual(failed, 57)
+
+    def test_do_verify(self):
+        # Given
+        for i in range(30):
+            add_content(self.sesh, [f"hello{i}"])
+        # When
+        with self.assertLogs(level="INFO"):
+            good = do_verify(self.sesh, Namespace(jobs=1))
+        self.sesh.con.execute("UPDATE log SET hash=zeroblob(20) WHERE sn=9")
+        bad = do_verify(self.sesh, Namespace(jobs=1))
+        # Then
+        self.assertRegex(good[0], r"^Verified 31/31 records")
+        self.assertListEqual(bad, ["Integrity error at record 9."])
+
+    def test_verify_from_mark(self):
+        # Given
+        for i in range(30):
+            add_content(self.sesh, [f"hello{i}"])
+        self.sesh.verify()
+        self.sesh.con.execute("UPDATE stuff SET body=:body WHERE body=:orig",
+                              {"body": "bad body", "orig": "hello5"})
+        for i in range(5):
+            add_content(self.sesh, [f"again{i}"])
+        # When only the records since the mark are checked.
+        self.sesh.verify()
+        # Then
+        self.assertEqual(self.sesh.mark("verified").sn, 36)
+
+    def test_verify_stale_mark(self):
+        # Given
+        for i in range(30):
+            add_content(self.sesh, [f"hello{i}"])
+        self.sesh.verify()
+        self.sesh.con.execute("UPDATE marks SET hash=zeroblob(20)")
+        # When
+        with self.assertLogs(level="WARNING"):
+            self.sesh.verify(10)
+        # Then the full check put the mark back.
+        self.assertEqual(self.sesh.mark("verified").hash,
+                         self.sesh.head().hash)
+
+    def test_check_keeps_failure(self):
+        # Given
+        for i in range(10):
+            add_content(self.sesh, [f"hello{i}"])
+        self.sesh.con.execute("UPDATE stuff SET body=:body WHERE body=:orig",
+                              {"body": "bad body", "orig": "hello8"})
+        # When
+        with self.assertLogs(level="ERROR"):
+            failed = self.sesh.check()
+        alert = self.sesh.alert()
+        self.sesh.con.execute("UPDATE stuff SET body=:orig WHERE body=:body",
+                              {"body": "bad body", "orig": "hello8"})
+        with self.assertLogs(level="INFO"):
+            self.sesh.audit()
+        # Then
+        self.assertEqual(failed, 10)
+        self.assertTrue(alert.startswith("Integrity error at record 10,"))
+        self.assertIsNone(self.sesh.alert())
+
+    def test_checker_thread(self):
+        # Given
+        tmp = setup_context(self, NamedTemporaryFile(suffix=".db"))
+        with Mind(tmp.name) as sesh:
+            for i in range(10):
+                add_content(sesh, [f"hello{i}"])
+            sesh.con.execute("UPDATE log SET hash=zeroblob(20) WHERE sn=11")
+            sesh.con.commit()
+        checker = Checker(tmp.name)
+        # When
+        with self.assertLogs(level="ERROR"):
+            checker.start()
+            checker.request()
+            self.assertTrue(checker.checked.wait(10))
+        # Then
+        with Mind(tmp.name, background=True) as sesh:
+            self.assertIsNotNone(sesh.alert())
+
+    def test_spot_check_deep_record(self):
+        # Given
+        for i in range(100):
+            add_content(self.sesh, [f"hello{i}"])
+        self.sesh.con.execute("UPDATE stuff SET body=:body WHERE body=:orig",
+                              {"body": "bad body", "orig": "hello20"})
+        self.sesh.spot_checks = 100
+        self.sesh.spot_budget = 10
+        self.sesh.catch_up = 0
+        # When / Then
+        self.sesh.verify(10)
+        with self.assertRaises(IntegrityError):
+            self.sesh.spot_check()
+
+    def test_spot_check_budget(self):
+        # Given
+        for i in range(100):
+            add_content(self.sesh, [f"hello{i}"])
+        self.sesh.spot_budget = 0
+        # When
+        checks = self.sesh.spot_check()
+        # Then
+        self.assertEqual(checks, 1)
+
+    def test_spot_coverage(self):
+        # Given
+        for i in range(100):
+            add_content(self.sesh, [f"hello{i}"])
+        self.sesh.spot_checks = 20
+        self.sesh.spot_budget = 10
+        # When
+        self.sesh.spot_check()
+        self.sesh.spot_check()
+        coverage = self.sesh.coverage()
+        # Then
+        self.assertEqual((coverage.checks, coverage.days, coverage.size),
+                         (40, 1, 101))
+        self.assertAlmostEqual(coverage.ratio(), 1 - (100 / 101) ** 40)
+        self.assertRegex(str(coverage), r"^Spot checked 40 records over 1 "
+                                        r"days, about 3\d\.\d% of 101")
+
+    def test_spot_checks_saved_with_marks(self):
+        # Given
+        tmp = setup_context(self, NamedTemporaryFile(suffix=".db"))
+        with Mind(tmp.name) as sesh:
+            for i in range(30):
+                add_content(sesh, [f"hello{i}"])
+            sesh.verify()
+            add_content(sesh, ["new"])
+        other = setup_context(self, Mind(tmp.name, background=True))
+        # When
+        with Mind(tmp.name) as sesh:
+            checks = sesh.coverage().checks
+        version = other.query("PRAGMA data_version", ()).fetchone()
+        with Mind(tmp.name) as sesh:
+            pending = sesh.spotted
+        # Then the open that marked the new record saved its checks too.
+        self.assertGreater(checks, 0)
+        self.assertEqual(other.coverage().checks, checks)
+        self.assertEqual(other.query("PRAGMA data_version", ()).fetchone(),
+                         version)
+        self.assertTrue(pending)
+
+    def test_rehash(self):
+        # Given
+        for i in range(30):
+            add_content(self.sesh, [f"hello{i} #tag{i % 3}"])
+        do_forget(self.sesh, Namespace(forget="3"))
+        self.sesh.checkpoint_every = 10
+        self.sesh.verify()
+        # When
+        done = self.sesh.rehash(HashAlgo.BLAKE2B)
+        add_content(self.sesh, ["after #tag1"])
+        # Then
+        algos = self.sesh.con.execute("SELECT DISTINCT algo FROM log")
+        self.assertEqual(done, 32)
+        self.assertListEqual(algos.fetchall(), [(HashAlgo.BLAKE2B,)])
+        self.sesh.verify()
+        self.assertIsNone(self.sesh.audit())
+        self.assertTrue(self.sesh.prove(20).check())
+        self.assertEqual(self.sesh.checkpoints()[0].hash,
+                         self.sesh.log_hash(10))
+
+    def test_rehash_bad_chain(self):
+        # Given
+        for i in range(30):
+            add_content(self.sesh, [f"hello{i}"])
+        self.sesh.con.execute("UPDATE stuff SET body=:body WHERE body=:orig",
+                              {"body": "bad body", "orig": "hello20"})
+        self.sesh.con.commit()
+        before = self.sesh.con.execute("SELECT * FROM log").fetchall()
+        # When
+        with self.assertRaises(IntegrityError):
+            self.sesh.rehash(HashAlgo.BLAKE2B)
+        # Then
+        self.assertListEqual(
+            self.sesh.con.execute("SELECT * FROM log").fetchall(), before)
@@ -0,0 +1,105 @@
+from sqlite3 import Error, IntegrityError
+from tempfile import NamedTemporaryFile
+from unittest import TestCase
+from unittest.mock import patch
+
+from mind.mind import Mind, Phase, Write, Writer, add_content, commit_writes
+from tests import setup_context
+
+
+class TestWriter(TestCase):
+    MEM = ":memory:"
+
+    def setUp(self) -> None:
+        self.sesh = setup_context(self, Mind(self.MEM, strict=False))
+
+    def test_group_commit(self):
+        # Given
+        first, _ = add_content(self.sesh, ["first"])
+        writes = [Write.add([f"entry {i} #tag"]) for i in range(5)]
+        writes.append(Write.update(first, Phase.DONE))
+        # When
+        commit_writes(self.sesh, writes)
+        # Then
+        results = [write.done.result(0) for write in writes]
+        self.assertEqual(len({stuff.id for stuff, _ in results[:5]}), 5)
+        self.assertEqual(results[5], f"Done: {first}")
+        self.assertEqual(self.sesh.head().sn, 8)
+        self.sesh.verify()
+
+    def test_bad_write_fails_alone(self):
+        # Given
+        first, _ = add_content(self.sesh, ["first"])
+        self.sesh.con.execute(
+            "CREATE TEMP TRIGGER stuck BEFORE UPDATE ON stuff WHEN new.id = "
+            f"{int(first.id)} BEGIN SELECT RAISE(ABORT, 'stuck'); END")
+        writes = [Write.add(["one"]), Write.update(first, Phase.DONE),
+                  Write.update(first._replace(state=Phase.DONE), Phase.DONE),
+                  Write.add(["two"])]
+        # When
+        commit_writes(self.sesh, writes)
+        # Then
+        self.assertIsInstance(writes[1].done.exception(0), IntegrityError)
+        self.assertIsInstance(writes[2].done.exception(0), ValueError)
+        self.assertEqual([writes[i].done.result(0)[0].body for i in (0, 3)],
+                         ["one", "two"])
+        self.assertEqual(self.sesh.head().sn, 4)
+        self.sesh.verify()
+
+    def test_same_tick_twice(self):
+        # Given
+        first, _ = add_content(self.sesh, ["first"])
+        writes = [Write.update(first, Phase.DONE) for _ in range(2)]
+        # When
+        commit_writes(self.sesh, writes)
+        stale = Write.update(first, Phase.DONE)
+        commit_writes(self.sesh, [stale])
+        # Then only one of them is logged.
+        self.assertEqual(writes[0].done.result(0), f"Done: {first}")
+        self.assertIsInstance(writes[1].done.exception(0), ValueError)
+        self.assertIsInstance(stale.done.exception(0), ValueError)
+        self.assertEqual(self.sesh.head().sn, 3)
+        self.sesh.verify()
+
+    def test_bulk_write(self):
+        # Given
+        writes = [Write.add(["one"]), Write.many([["two #x"], ["three"]]),
+                  Write.add(["four"])]
+        # When
+        commit_writes(self.sesh, writes)
+        # Then
+        self.assertEqual([stuff.body for stuff, _ in writes[1].done.result(0)],
+                         ["two", "three"])
+        self.assertEqual(self.sesh.head().sn, 5)
+        self.sesh.verify()
+
+    def test_writer_thread(self):
+        # Given
+        tmp = setup_context(self, NamedTemporaryFile(suffix=".db"))
+        writer = Writer(tmp.name)
+        futures = [writer.submit(Write.add([f"entry {i}"]))
+                   for i in range(50)]
+        # When
+        with patch("mind.mind.commit_writes", wraps=commit_writes) as groups:
+            writer.start()
+            added = [future.result(10) for future in futures]
+            writer.stop()
+        # Then the writes queued up before it started commit together.
+        self.assertEqual(groups.call_count, 1)
+        self.assertEqual([stuff.body for stuff, _ in added],
+                         [f"entry {i}" for i in range(50)])
+        with Mind(tmp.name, strict=True) as sesh:
+            self.assertEqual(sesh.head().sn, 51)
+
+    def test_writer_cannot_open(self):
+        # Given
+        writer = Writer("/no/such/dir/mind.db")
+        queued = writer.submit(Write.add(["queued"]))
+        # When
+        with self.assertLogs(level="ERROR"):
+            writer.start()
+            writer.join(10)
+        # Then every write fails rather than waiting for a timeout.
+        self.assertIsInstance(queued.exception(0), Error)
+        self.assertIsInstance(writer.submit(Write.add(["late"])).exception(0),
+                              Error)